@@ -0,0 +1,89 @@
+from datetime import datetime, timezone
+from typing import Dict, Optional, Tuple
+import numpy as np
+
+SECONDS_PER_HOUR = 3600
+HOURS_PER_DAY = 24
+TREND_DAYS = 30
+WEEKDAY_NAMES = ["Mon", "Tue", "Wed", "Thu", "Fri", "Sat", "Sun"]
+SPARK_CHARS = "▁▂▃▄▅▆▇█"
+
+
+def hour_segments(starts, durations) -> Tuple[np.ndarray, np.ndarray]:
+    """Split shifts into per-hour pieces without a Python-level loop.
+
+    ``starts`` are clock-in times as UTC epoch seconds and ``durations``
+    are shift lengths in seconds. Returns two parallel arrays: the absolute
+    hour index (epoch seconds // 3600) of every piece and the seconds of
+    the shift that fall inside that hour.
+    """
+    starts = np.asarray(starts, dtype=np.int64)
+    durations = np.asarray(durations, dtype=np.int64)
+    keep = durations > 0
+    starts, ends = starts[keep], starts[keep] + durations[keep]
+
+    first = starts // SECONDS_PER_HOUR
+    counts = (ends - 1) // SECONDS_PER_HOUR - first + 1
+    offsets = np.arange(counts.sum()) - np.repeat(np.cumsum(counts) - counts, counts)
+    hours = np.repeat(first, counts) + offsets
+
+    piece_start = np.maximum(np.repeat(starts, counts), hours * SECONDS_PER_HOUR)
+    piece_end = np.minimum(np.repeat(ends, counts), (hours + 1) * SECONDS_PER_HOUR)
+    return hours, piece_end - piece_start
+
+
+def _streaks(days: np.ndarray, today: int) -> Tuple[int, int]:
+    # ``days`` is the sorted array of unique day indices with any work.
+    if days.size == 0:
+        return 0, 0
+
+    breaks = np.flatnonzero(np.diff(days) != 1)
+    run_ends = np.append(breaks, days.size - 1)
+    run_starts = np.insert(breaks + 1, 0, 0)
+    run_lengths = run_ends - run_starts + 1
+
+    longest = int(run_lengths.max())
+    current = int(run_lengths[-1]) if days[-1] >= today - 1 else 0
+    return current, longest
+
+
+def compute_user_stats(starts, durations, now: Optional[datetime] = None) -> Dict:
+    """Aggregate a user's completed shifts into the /mystats numbers."""
+    now = now or datetime.now(timezone.utc)
+    today = int(now.timestamp()) // (SECONDS_PER_HOUR * HOURS_PER_DAY)
+
+    durations = np.asarray(durations, dtype=np.int64)
+    hours, seconds = hour_segments(starts, durations)
+    days = hours // HOURS_PER_DAY
+
+    by_weekday = np.bincount((days + 3) % 7, weights=seconds, minlength=7)
+    by_hour = np.bincount(hours % HOURS_PER_DAY, weights=seconds, minlength=HOURS_PER_DAY)
+
+    recent = days > today - TREND_DAYS
+    trend = np.bincount(
+        days[recent] - (today - TREND_DAYS + 1), weights=seconds[recent], minlength=TREND_DAYS
+    )
+
+    current_streak, longest_streak = _streaks(np.unique(days), today)
+
+    return {
+        'shift_count': int(durations.size),
+        'total_seconds': int(durations.sum()),
+        'average_seconds': int(durations.mean()) if durations.size else 0,
+        'longest_seconds': int(durations.max()) if durations.size else 0,
+        'current_streak': current_streak,
+        'longest_streak': longest_streak,
+        'weekday_seconds': by_weekday.astype(np.int64).tolist(),
+        'hour_seconds': by_hour.astype(np.int64).tolist(),
+        'trend_seconds': trend.astype(np.int64).tolist(),
+    }
+
+
+def sparkline(values) -> str:
+    values = np.asarray(values, dtype=np.float64)
+    peak = values.max() if values.size else 0
+    if peak <= 0:
+        return SPARK_CHARS[0] * values.size
+    levels = np.ceil(values / peak * (len(SPARK_CHARS) - 1)).astype(int)
+    return ''.join(SPARK_CHARS[level] for level in levels)
+
@@ -0,0 +1,210 @@
+"""Ban ledger benchmark: bulk sync from a stub Open Cloud and local lookups.
+
+Creates a scratch database on the server in DATABASE_URL and starts a
+local stub of the Open Cloud user-restrictions list (paginated like the
+real one) and of the users endpoint. It syncs --bans restrictions into the
+bans table, then checks that a second sync:
+  - lifts bans that disappeared from Roblox
+  - lifts bans that Roblox now shows as inactive
+  - leaves alone a ban the bot recorded while the sync was running
+Finally it times the /ban_status and /bans queries and prints their plans.
+Exits non-zero on a failed check; the scratch database is dropped afterwards.
+
+    DATABASE_URL=postgresql://... python benchmarks/bench_bans.py --bans 20000
+"""
+import argparse
+import asyncio
+import os
+import statistics
+import sys
+import time
+from datetime import datetime, timedelta, timezone
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from aiohttp import web  # noqa: E402
+
+import roblox_bans  # noqa: E402
+from benchmarks.bench_partitions import admin, database_url  # noqa: E402
+from database import ShiftDatabase  # noqa: E402
+
+BENCH_DB = 'shift_bench_bans'
+UNIVERSE_ID = '4242'
+ROBLOX_ID_BASE = 2_000_000
+MODERATORS = 8
+
+
+class OpenCloudStub:
+    def __init__(self, bans):
+        now = datetime.now(timezone.utc)
+        self.requests = 0
+        # Awaited before serving the first page of a listing.
+        self.on_first_page = None
+        self.restrictions = {}
+        for n in range(bans):
+            user_id = ROBLOX_ID_BASE + n
+            restriction = {
+                'active': True,
+                # Nanosecond precision, as Open Cloud sends it.
+                'startTime': (now - timedelta(days=n % 90)).strftime('%Y-%m-%dT%H:%M:%S.123456789Z'),
+                'displayReason': f"Exploiting ({n})",
+            }
+            # Every third ban is permanent.
+            if n % 3:
+                restriction['duration'] = f"{86400 * (1 + n % 30)}s"
+            self.restrictions[user_id] = {
+                'path': f"universes/{UNIVERSE_ID}/user-restrictions/{user_id}",
+                'user': f"users/{user_id}",
+                'gameJoinRestriction': restriction,
+            }
+
+    async def list_restrictions(self, request):
+        self.requests += 1
+        if request.headers.get('x-api-key') != 'bench-key':
+            return web.json_response({'message': 'Invalid API Key'}, status=401)
+        size = min(int(request.query.get('maxPageSize', 10)), roblox_bans.RESTRICTIONS_PAGE_SIZE)
+        offset = int(request.query.get('pageToken', 0))
+        if offset == 0 and self.on_first_page:
+            await self.on_first_page()
+        entries = list(self.restrictions.values())[offset:offset + size]
+        body = {'userRestrictions': entries}
+        if offset + size < len(self.restrictions):
+            body['nextPageToken'] = str(offset + size)
+        return web.json_response(body)
+
+    async def users(self, request):
+        user_ids = (await request.json())['userIds']
+        assert len(user_ids) <= roblox_bans.USERNAME_BATCH_SIZE
+        return web.json_response({'data': [
+            {'id': user_id, 'name': f"Player{user_id}", 'displayName': f"Player{user_id}"} for user_id in user_ids
+        ]})
+
+
+def timed(fn, repeat=50):
+    samples = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        fn()
+        samples.append((time.perf_counter() - started) * 1000)
+    return statistics.median(samples)
+
+
+def explain(db, query, params):
+    conn = db.get_connection()
+    try:
+        cursor = conn.cursor()
+        cursor.execute('EXPLAIN ' + query, params)
+        return [row[0] for row in cursor.fetchall()]
+    finally:
+        cursor.close()
+        db.return_connection(conn)
+
+
+async def run(bans, port, base_url):
+    admin(base_url, f'DROP DATABASE IF EXISTS {BENCH_DB}', f'CREATE DATABASE {BENCH_DB}')
+    os.environ['DATABASE_URL'] = database_url(base_url, BENCH_DB)
+    db = ShiftDatabase()
+    db.apply_migrations()
+
+    stub = OpenCloudStub(bans)
+    app = web.Application()
+    app.router.add_get(f"/cloud/v2/universes/{UNIVERSE_ID}/user-restrictions", stub.list_restrictions)
+    app.router.add_post('/v1/users', stub.users)
+    runner = web.AppRunner(app)
+    await runner.setup()
+    await web.TCPSite(runner, '127.0.0.1', port).start()
+    roblox_bans.OPEN_CLOUD_URL = f"http://127.0.0.1:{port}/cloud/v2"
+    roblox_bans.USERS_URL = f"http://127.0.0.1:{port}/v1/users"
+
+    failures = []
+
+    def check(condition, message):
+        print(f"  {'ok  ' if condition else 'FAIL'} {message}")
+        if not condition:
+            failures.append(message)
+
+    try:
+        print(f"first sync of {bans} bans")
+        started = time.perf_counter()
+        result = await roblox_bans.sync_bans(db, UNIVERSE_ID, 'bench-key')
+        elapsed = time.perf_counter() - started
+        check(result['added'] == bans and result['lifted'] == 0, f"added {result['added']}, lifted {result['lifted']}")
+        check(stub.requests == -(-bans // roblox_bans.RESTRICTIONS_PAGE_SIZE), f"{stub.requests} page(s)")
+        sample = db.get_ban(roblox_username=f"player{ROBLOX_ID_BASE + 1}")
+        check(sample is not None and sample['expires_at'] - sample['banned_at'] == timedelta(days=2),
+              "usernames resolved, expiry from startTime + duration")
+        print(f"  {elapsed:.2f}s")
+
+        # Attribute some bans to moderators, as /ban_player would have.
+        conn = db.get_connection()
+        try:
+            cursor = conn.cursor()
+            cursor.execute('''
+                UPDATE bans SET moderator_id = 'mod-' || (roblox_user_id %% %s), moderator_name = 'Mod ' || (roblox_user_id %% %s)
+                WHERE roblox_user_id %% 2 = 0
+            ''', (MODERATORS, MODERATORS))
+            cursor.execute('ANALYZE bans')
+            conn.commit()
+        finally:
+            cursor.close()
+            db.return_connection(conn)
+
+        print("second sync: 10 removed on Roblox, 5 shown inactive, 1 banned by the bot mid-sync")
+        for n in range(10):
+            del stub.restrictions[ROBLOX_ID_BASE + n]
+        for n in range(10, 15):
+            stub.restrictions[ROBLOX_ID_BASE + n]['gameJoinRestriction']['active'] = False
+        fresh_id = ROBLOX_ID_BASE + bans + 1
+
+        async def ban_mid_sync():
+            # The bot bans someone after the sync has started reading.
+            await asyncio.to_thread(db.record_ban, fresh_id, 'FreshBan', 'Spam', 'mod-1', 'Mod 1', None)
+
+        stub.on_first_page = ban_mid_sync
+        result = await roblox_bans.sync_bans(db, UNIVERSE_ID, 'bench-key')
+        check(result['lifted'] == 10, f"lifted {result['lifted']} missing ban(s)")
+        inactive = db.get_ban(roblox_user_id=ROBLOX_ID_BASE + 10)
+        check(not inactive['active'] and inactive['unbanned_by'] == 'Roblox', "inactive restriction recorded as unbanned")
+        fresh = db.get_ban(roblox_user_id=fresh_id)
+        check(fresh['active'] and fresh['source'] == 'bot', "ban recorded during the sync kept")
+
+        print("queries")
+        name = f"player{ROBLOX_ID_BASE + bans // 2}"
+        status_ms = timed(lambda: db.get_ban(roblox_username=name))
+        page_ms = timed(lambda: db.get_active_bans())
+        deep_ms = timed(lambda: db.get_active_bans(offset=bans // 2))
+        mod_ms = timed(lambda: db.get_active_bans('mod-2'))
+        rows, total = db.get_active_bans()
+        check(len(rows) == 15 and rows[0]['expires_at'] is not None, f"{total} active bans, soonest expiry first")
+        print(f"  /ban_status by name  {status_ms:.2f} ms")
+        print(f"  /bans page 1         {page_ms:.2f} ms")
+        print(f"  /bans middle page    {deep_ms:.2f} ms")
+        print(f"  /bans moderator      {mod_ms:.2f} ms")
+        for label, query, params in [
+            ('/ban_status', 'SELECT * FROM bans WHERE LOWER(roblox_username) = LOWER(%s)', (name,)),
+            ('/bans moderator', '''SELECT * FROM bans WHERE moderator_id = %s AND active = TRUE
+                                   AND (expires_at IS NULL OR expires_at > NOW() AT TIME ZONE 'utc')
+                                   ORDER BY banned_at DESC LIMIT 15''', ('mod-2',)),
+        ]:
+            plan = explain(db, query, params)
+            print(f"  {label}: {plan[0].strip()}")
+            check(any('Index' in line for line in plan), f"{label} uses an index")
+    finally:
+        await runner.cleanup()
+        if db.connection_pool is not None:
+            db.connection_pool.closeall()
+        admin(base_url, f'DROP DATABASE IF EXISTS {BENCH_DB}')
+    return failures
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--bans', type=int, default=20000, help='restrictions on the stub universe (default: 20000)')
+    parser.add_argument('--port', type=int, default=8768, help='local port for the stub (default: 8768)')
+    args = parser.parse_args()
+    base_url = os.getenv('DATABASE_URL')
+    if not base_url:
+        sys.exit("DATABASE_URL is required")
+    problems = asyncio.run(run(args.bans, args.port, base_url))
+    if problems:
+        sys.exit("FAILED: " + "; ".join(problems))
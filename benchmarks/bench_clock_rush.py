@@ -0,0 +1,106 @@
+"""Clock-in rush benchmark: per-click commits vs. the group-commit batcher.
+
+Simulates N users pressing Clock In at the same moment, then Clock Out,
+against the database in DATABASE_URL, and prints commits per second and
+latency percentiles for both write paths.
+
+    DATABASE_URL=postgresql://... python benchmarks/bench_clock_rush.py --clicks 100
+
+Rows are written under synthetic ``bench-rush-*`` user IDs and deleted
+afterwards.
+"""
+import argparse
+import asyncio
+import os
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from database import ShiftDatabase  # noqa: E402
+from write_batcher import ShiftWriteBatcher  # noqa: E402
+
+USER_PREFIX = 'bench-rush-'
+
+
+def percentile(values, pct):
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, max(0, round(pct / 100 * len(ordered)) - 1))
+    return ordered[index]
+
+
+async def rush(clicks, action):
+    start = time.perf_counter()
+    latencies = []
+
+    async def click(i):
+        await action(f"{USER_PREFIX}{i}")
+        latencies.append((time.perf_counter() - start) * 1000)
+
+    await asyncio.gather(*(click(i) for i in range(clicks)))
+    return time.perf_counter() - start, latencies
+
+
+def report(label, clicks, commits, elapsed, latencies):
+    print(
+        f"{label:<28} {clicks:>6} clicks {commits:>6} commits "
+        f"{commits / elapsed:>9.1f} commits/s {clicks / elapsed:>9.1f} clicks/s "
+        f"p50 {statistics.median(latencies):>8.1f} ms  p99 {percentile(latencies, 99):>8.1f} ms"
+    )
+
+
+async def main(clicks, window):
+    db = ShiftDatabase()
+    db.apply_migrations()
+
+    def cleanup():
+        conn = db.get_connection()
+        try:
+            cursor = conn.cursor()
+            cursor.execute("DELETE FROM shifts WHERE user_id LIKE %s", (USER_PREFIX + '%',))
+            cursor.execute("DELETE FROM users WHERE user_id LIKE %s", (USER_PREFIX + '%',))
+            conn.commit()
+            cursor.close()
+        finally:
+            db.return_connection(conn)
+
+    cleanup()
+    try:
+        # Before: each handler called db.clock_in / db.clock_out inline on
+        # the event loop, one connection checkout and one commit per click.
+        async def inline_in(user_id):
+            db.clock_in(user_id, user_id)
+
+        async def inline_out(user_id):
+            db.clock_out(user_id)
+
+        elapsed, latencies = await rush(clicks, inline_in)
+        report('before: clock_in', clicks, clicks, elapsed, latencies)
+        elapsed, latencies = await rush(clicks, inline_out)
+        report('before: clock_out', clicks, clicks, elapsed, latencies)
+
+        # After: the same clicks through the group-commit batcher.
+        batcher = ShiftWriteBatcher(db, window=window)
+
+        async def batched_in(user_id):
+            await batcher.clock_in(user_id, user_id)
+
+        async def batched_out(user_id):
+            await batcher.clock_out(user_id)
+
+        for label, action in (('after: clock_in', batched_in), ('after: clock_out', batched_out)):
+            batches_before = batcher.stats['batches']
+            elapsed, latencies = await rush(clicks, action)
+            report(label, clicks, batcher.stats['batches'] - batches_before, elapsed, latencies)
+    finally:
+        cleanup()
+        db.close()
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--clicks', type=int, default=100, help='simultaneous clicks (default: 100)')
+    parser.add_argument('--window', type=float, default=0.005, help='batch window in seconds (default: 0.005)')
+    args = parser.parse_args()
+    asyncio.run(main(args.clicks, args.window))
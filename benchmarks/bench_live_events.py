@@ -0,0 +1,155 @@
+"""Live event stream benchmark: hundreds of SSE subscribers on /api/events.
+
+Starts the web server with a LiveEventBus on a local port and opens
+--subscribers streams. A few of them (--slow) stop reading to simulate
+clients stuck on a bad connection. It then publishes --events clock
+events at --rate per second and reports:
+  - delivery latency from publish to receipt
+  - the time publish() itself takes
+  - queue depths and how many slow subscribers were cut off
+
+Exits non-zero if a reading subscriber missed or reordered an event, or
+if a reading subscriber was cut off.
+
+    python benchmarks/bench_live_events.py --subscribers 500
+"""
+import argparse
+import asyncio
+import json
+import os
+import socket
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault('LOG_LEVEL', 'ERROR')
+os.environ.pop('DASHBOARD_API_TOKEN', None)
+
+import aiohttp  # noqa: E402
+
+from live_events import LiveEventBus  # noqa: E402
+from log_config import setup_logging  # noqa: E402
+from web_server import start_web_server  # noqa: E402
+
+CONNECT_BATCH = 50
+
+
+def percentile(values, pct):
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, max(0, round(pct / 100 * len(ordered)) - 1))
+    return ordered[index]
+
+
+class Reader:
+    def __init__(self):
+        self.latencies = []
+        self.sequence = []
+
+
+async def read_stream(response, reader, events):
+    async for line in response.content:
+        if line.startswith(b'data: '):
+            data = json.loads(line[6:])
+            reader.latencies.append((time.perf_counter() - data['sent']) * 1000)
+            reader.sequence.append(data['n'])
+            if data['n'] == events - 1:
+                return
+
+
+async def open_stalled(port):
+    # A bare socket that sends the request and never reads the response.
+    loop = asyncio.get_running_loop()
+    sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, 4096)
+    sock.setblocking(False)
+    await loop.sock_connect(sock, ('127.0.0.1', port))
+    await loop.sock_sendall(sock, b"GET /api/events HTTP/1.1\r\nHost: localhost\r\n\r\n")
+    return sock
+
+
+def shrink_server_buffers(runner, sockets):
+    # Loopback send buffers autotune to megabytes, which would take far
+    # more traffic to fill than a real stuck client needs. Pin the server
+    # side of the stalled connections to a few KB so they back up quickly.
+    ports = {sock.getsockname()[1] for sock in sockets}
+    for handler in runner.server.connections:
+        transport = handler.transport
+        if transport is not None and transport.get_extra_info('peername')[1] in ports:
+            transport.get_extra_info('socket').setsockopt(socket.SOL_SOCKET, socket.SO_SNDBUF, 4096)
+
+
+async def run(subscribers, slow, events, rate, port, queue_size):
+    setup_logging()
+    bus = LiveEventBus(queue_size=queue_size, max_subscribers=subscribers + 1)
+    runner = await start_web_server(port=port, live_events=bus)
+    url = f"http://127.0.0.1:{port}/api/events"
+
+    connector = aiohttp.TCPConnector(limit=0)
+    timeout = aiohttp.ClientTimeout(total=None, sock_read=None)
+    async with aiohttp.ClientSession(connector=connector, timeout=timeout) as session:
+        stalled = [await open_stalled(port) for _ in range(slow)]
+        responses = []
+        for offset in range(0, subscribers - slow, CONNECT_BATCH):
+            batch = range(offset, min(offset + CONNECT_BATCH, subscribers - slow))
+            responses += await asyncio.gather(*(session.get(url) for _ in batch))
+        while len(bus.subscribers) < subscribers:
+            await asyncio.sleep(0.01)
+        shrink_server_buffers(runner, stalled)
+
+        readers = [Reader() for _ in responses]
+        tasks = [asyncio.create_task(read_stream(response, reader, events))
+                 for response, reader in zip(responses, readers)]
+
+        # Roughly the size of a real event with a long username.
+        padding = 'x' * 200
+        publish_us = []
+        started = time.perf_counter()
+        for n in range(events):
+            before = time.perf_counter()
+            bus.publish('clock_in', {'n': n, 'sent': before, 'user_id': str(n % 97), 'padding': padding})
+            publish_us.append((time.perf_counter() - before) * 1_000_000)
+            await asyncio.sleep(max(0.0, started + (n + 1) / rate - time.perf_counter()))
+        published_in = time.perf_counter() - started
+
+        await asyncio.wait_for(asyncio.gather(*tasks), timeout=30)
+        stats = bus.summary()
+        for response in responses:
+            response.close()
+        for sock in stalled:
+            sock.close()
+    await runner.cleanup()
+
+    fast = readers
+    latencies = [latency for reader in fast for latency in reader.latencies]
+    complete = sum(1 for reader in fast if reader.sequence == list(range(events)))
+    print(f"{subscribers} subscribers ({slow} stalled), {events} events at {rate}/s "
+          f"in {published_in:.2f}s, queue size {queue_size}\n")
+    print(f"delivery latency   p50 {statistics.median(latencies):.2f} ms · p99 {percentile(latencies, 99):.2f} ms · "
+          f"max {max(latencies):.2f} ms over {len(latencies)} deliveries")
+    print(f"publish() cost     p50 {statistics.median(publish_us):.0f} µs · p99 {percentile(publish_us, 99):.0f} µs · "
+          f"max {max(publish_us):.0f} µs")
+    print(f"reading clients    {complete}/{len(fast)} received every event in order")
+    print(f"stalled clients    {stats['dropped_subscribers']}/{slow} cut off for lag")
+    print(f"queues             peak depth {stats['max_queue_depth']}, {stats['enqueued']} frames enqueued")
+
+    failures = []
+    if complete != len(fast):
+        failures.append(f"{len(fast) - complete} reading subscriber(s) missed or reordered events")
+    if stats['dropped_subscribers'] > slow:
+        failures.append("reading subscribers were dropped")
+    return failures
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--subscribers', type=int, default=500, help='concurrent SSE clients (default: 500)')
+    parser.add_argument('--slow', type=int, default=10, help='clients that never read (default: 10)')
+    parser.add_argument('--events', type=int, default=600, help='events to publish (default: 600)')
+    parser.add_argument('--rate', type=float, default=30, help='events per second (default: 30)')
+    parser.add_argument('--queue-size', type=int, default=100, help='per-subscriber queue bound (default: 100)')
+    parser.add_argument('--port', type=int, default=8765, help='local port for the test server (default: 8765)')
+    args = parser.parse_args()
+    problems = asyncio.run(run(args.subscribers, args.slow, args.events, args.rate, args.port, args.queue_size))
+    if problems:
+        sys.exit("FAILED: " + "; ".join(problems))
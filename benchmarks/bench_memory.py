@@ -0,0 +1,174 @@
+"""Memory per cached record: discord.py's member cache vs. the bot's own caches.
+
+Builds --members discord.Member objects the way the gateway's member
+chunks do, then warms a MemberProfileCache from them. It also fills the
+stats and derived-view caches. Each is measured with tracemalloc. The
+per-entry estimates the LRUs are sized from (PROFILE_BYTES,
+STATS_ENTRY_BYTES, DERIVED_ENTRY_BYTES) must hold, the LRUs must stay
+at their bound, and MemoryReporter must attribute the memory to the
+right subsystems. Exits non-zero on a failed check. Needs no database
+or Discord connection.
+
+    python benchmarks/bench_memory.py --members 20000
+"""
+import argparse
+import gc
+import os
+import sys
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import discord  # noqa: E402
+from discord.ext import commands  # noqa: E402
+
+import memory  # noqa: E402
+from analytics import compute_user_stats  # noqa: E402
+from caches import DERIVED_ENTRY_BYTES, STATS_ENTRY_BYTES, ApiCache, CachedJson, StatsCache  # noqa: E402
+from member_cache import PROFILE_BYTES, MemberProfileCache  # noqa: E402
+from memory import MemoryReporter, cache_entries  # noqa: E402
+
+USER_ID_BASE = 300_000_000_000_000_000
+ROLE_IDS = [str(USER_ID_BASE + n) for n in range(1, 4)]
+
+
+def traced_bytes(build):
+    # Bytes still allocated after build() returns (its result is kept).
+    gc.collect()
+    before = tracemalloc.take_snapshot()
+    result = build()
+    gc.collect()
+    after = tracemalloc.take_snapshot()
+    return result, sum(stat.size_diff for stat in after.compare_to(before, 'filename'))
+
+
+def gateway_member(n):
+    # Shaped like a GUILD_MEMBERS_CHUNK entry, with typical name lengths.
+    return {
+        'user': {
+            'id': str(USER_ID_BASE + n),
+            'username': f"staffer_{n:06d}",
+            'discriminator': '0',
+            'global_name': f"Staff Member {n}",
+            'avatar': f"{n:032x}",
+        },
+        'roles': ROLE_IDS[:1 + n % 3],
+        'joined_at': '2024-01-01T00:00:00+00:00',
+        'nick': None,
+        'deaf': False,
+        'mute': False,
+        'flags': 0,
+    }
+
+
+def budget_sizes(share):
+    previous = memory.CACHE_SHARE
+    memory.CACHE_SHARE = share
+    try:
+        return (cache_entries(0.5, PROFILE_BYTES), cache_entries(0.15, STATS_ENTRY_BYTES),
+                cache_entries(0.15, DERIVED_ENTRY_BYTES))
+    finally:
+        memory.CACHE_SHARE = previous
+
+
+def run(members, shifts):
+    failures = []
+
+    def check(condition, message):
+        print(f"  {'ok  ' if condition else 'FAIL'} {message}")
+        if not condition:
+            failures.append(message)
+
+    tracemalloc.start()
+    intents = discord.Intents.default()
+    intents.members = True
+    state = commands.Bot(command_prefix="!", intents=intents)._connection
+    guild = discord.Guild(data={
+        'id': str(USER_ID_BASE),
+        'name': 'bench',
+        'member_count': members,
+        'roles': [{'id': str(USER_ID_BASE), 'name': '@everyone', 'permissions': '0', 'position': 0,
+                   'color': 0, 'hoist': False, 'managed': False, 'mentionable': False}],
+    }, state=state)
+
+    def chunk():
+        for n in range(members):
+            guild._add_member(discord.Member(data=gateway_member(n), guild=guild, state=state))
+
+    _, discord_bytes = traced_bytes(chunk)
+
+    profiles = MemberProfileCache(maxsize=members)
+    _, profile_bytes = traced_bytes(lambda: profiles.warm(guild.members) and None)
+
+    now = time.time()
+    starts = [int(now) - day * 86400 - 3600 * (day % 9) for day in range(shifts, 0, -1)]
+    durations = [3600 + (day * 977) % 14400 for day in range(shifts)]
+    stats = StatsCache(maxsize=1000)
+    _, stats_bytes = traced_bytes(lambda: [
+        stats.set(str(n), 'today', compute_user_stats(starts, durations)) for n in range(1000)
+    ] and None)
+
+    api_cache = ApiCache(max_derived=1000)
+    totals = CachedJson({'users': [
+        {'user_id': str(USER_ID_BASE + n), 'username': f"staffer_{n:06d}", 'total_seconds': n * 3600}
+        for n in range(1000)
+    ]})
+    _, derived_bytes = traced_bytes(lambda: [
+        api_cache.derive(f'user:{n}', [totals], lambda payload, n=n: {
+            **payload['users'][n], 'clocked_in_since': None, 'warning_count': 0,
+        })
+        for n in range(1000)
+    ] and None)
+
+    reporter = MemoryReporter()
+    reporter.register('discord_members', lambda: len(guild.members))
+    reporter.register('member_profiles', lambda: len(profiles))
+    report = reporter.report(top=5)
+    tracemalloc.stop()
+
+    per_member = discord_bytes / members
+    per_profile = profile_bytes / members
+    per_stats = stats_bytes / 1000
+    per_derived = derived_bytes / 1000
+    subsystems = {entry['name']: entry['mb'] for entry in report['subsystems']}
+    normal, low = budget_sizes(0.25), budget_sizes(0.08)
+
+    print(f"\n{members} members, {shifts} shifts of history per /mystats entry\n")
+    print(f"{'record':<26}{'bytes':>8}{'estimate':>10}")
+    print(f"{'discord.py Member + User':<26}{per_member:>8.0f}{'':>10}")
+    print(f"{'MemberProfile':<26}{per_profile:>8.0f}{PROFILE_BYTES:>10}")
+    print(f"{'/mystats entry':<26}{per_stats:>8.0f}{STATS_ENTRY_BYTES:>10}")
+    print(f"{'derived API view':<26}{per_derived:>8.0f}{DERIVED_ENTRY_BYTES:>10}")
+    print(f"\nLRU sizes for a {memory.MEMORY_BUDGET_MB} MB budget (profiles, stats, derived):")
+    print(f"  normal      {normal[0]:>7} {normal[1]:>6} {normal[2]:>6}")
+    print(f"  low-memory  {low[0]:>7} {low[1]:>6} {low[2]:>6}")
+    print(f"\nRSS {report['rss_mb']} MB, {report['traced_mb']} MB traced, report took {report['snapshot_ms']} ms")
+    print("  " + ", ".join(f"{name} {mb} MB" for name, mb in list(subsystems.items())[:6]) + "\n")
+
+    check(per_profile <= PROFILE_BYTES, f"a profile fits PROFILE_BYTES ({per_profile:.0f} <= {PROFILE_BYTES})")
+    check(per_profile < per_member / 2, "a profile is under half the size of discord.py's member")
+    check(per_stats <= STATS_ENTRY_BYTES, f"a /mystats entry fits STATS_ENTRY_BYTES ({per_stats:.0f})")
+    check(per_derived <= DERIVED_ENTRY_BYTES, f"a derived view fits DERIVED_ENTRY_BYTES ({per_derived:.0f})")
+
+    bounded = MemberProfileCache(maxsize=100)
+    bounded.warm(guild.members)
+    check(len(bounded) == 100 and bounded.summary()['evictions'] == members - 100,
+          "profile LRU holds its bound and counts evictions")
+    check(bounded.get(USER_ID_BASE + members - 1) is not None and bounded.get(USER_ID_BASE) is None,
+          "least recently used profiles are the ones evicted")
+    check(subsystems.get('discord', 0) > 0 and subsystems.get('member_cache', 0) > 0,
+          "memory report attributes discord.py and member_cache allocations")
+    check(report['caches'] == {'discord_members': members, 'member_profiles': members},
+          "memory report includes registered cache sizes")
+    return failures
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--members', type=int, default=20000, help='guild members to cache (default: 20000)')
+    parser.add_argument('--shifts', type=int, default=200, help='shifts behind each /mystats entry (default: 200)')
+    args = parser.parse_args()
+    problems = run(args.members, args.shifts)
+    if problems:
+        sys.exit("FAILED: " + "; ".join(problems))
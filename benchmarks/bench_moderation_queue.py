@@ -0,0 +1,157 @@
+"""Moderation job queue benchmark: two workers draining one Postgres queue.
+
+Creates a scratch database on the server in DATABASE_URL and runs two
+ModerationQueue instances against it, as two bot processes would. It
+enqueues --jobs jobs whose handlers take --latency ms, like a Discord or
+Roblox API call. Some of the jobs are set up to:
+  - fail twice before succeeding
+  - fail permanently
+  - reuse an idempotency key
+One job is also claimed by a "crashed" worker that never finishes it.
+
+It reports how long enqueue takes (all a command now waits for) and the
+drain throughput. Exits non-zero unless every job ran to completion
+exactly once or was dead-lettered as expected. The scratch database is
+dropped afterwards.
+
+    DATABASE_URL=postgresql://... python benchmarks/bench_moderation_queue.py --jobs 500
+"""
+import argparse
+import asyncio
+import collections
+import os
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import moderation_queue  # noqa: E402
+from benchmarks.bench_partitions import admin, database_url  # noqa: E402
+from database import ShiftDatabase  # noqa: E402
+from moderation_queue import ModerationQueue, PermanentJobError  # noqa: E402
+
+BENCH_DB = 'shift_bench_moderation'
+
+
+def percentile(values, pct):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, max(0, round(pct / 100 * len(ordered)) - 1))]
+
+
+async def run(jobs, latency, concurrency, base_url):
+    admin(base_url, f'DROP DATABASE IF EXISTS {BENCH_DB}', f'CREATE DATABASE {BENCH_DB}')
+    os.environ['DATABASE_URL'] = database_url(base_url, BENCH_DB)
+    # Retries in milliseconds rather than seconds, so the run stays short.
+    moderation_queue.RETRY_BASE = 0.05
+
+    executions = collections.Counter()
+    successes = collections.Counter()
+    dead = []
+
+    async def handler(payload):
+        n = payload['n']
+        executions[n] += 1
+        await asyncio.sleep(latency / 1000)
+        if n % 10 == 3 and executions[n] <= 2:
+            raise ConnectionError("simulated outage")
+        if n % 50 == 7:
+            raise PermanentJobError("simulated missing permission")
+        successes[n] += 1
+
+    async def on_dead_letter(job, error):
+        dead.append(job['payload']['n'])
+
+    db = ShiftDatabase()
+    db.apply_migrations()
+    workers = []
+    for _ in range(2):
+        # Each "process" gets its own pool, like separate bot instances.
+        queue = ModerationQueue(ShiftDatabase(), concurrency=concurrency, lease_seconds=2, poll_interval=0.5)
+        queue.register('test', handler, max_attempts=4)
+        queue.on_dead_letter = on_dead_letter
+        workers.append(queue)
+
+    failures = []
+
+    def check(condition, message):
+        print(f"  {'ok  ' if condition else 'FAIL'} {message}")
+        if not condition:
+            failures.append(message)
+
+    try:
+        # A worker that claims one job and dies before finishing it.
+        await workers[0].enqueue('test', {'n': -1}, 'crashed')
+        crashed = db.claim_moderation_jobs(1, 1.0)
+        check(len(crashed) == 1 and crashed[0]['payload']['n'] == -1, "crashed worker holds a lease")
+
+        for queue in workers:
+            queue.start()
+
+        enqueue_ms = []
+        started = time.perf_counter()
+        for n in range(jobs):
+            before = time.perf_counter()
+            await workers[n % 2].enqueue('test', {'n': n}, f"job:{n}")
+            enqueue_ms.append((time.perf_counter() - before) * 1000)
+        duplicates = [not await workers[0].enqueue('test', {'n': n}, f"job:{n}") for n in range(0, jobs, 25)]
+
+        expected_dead = {n for n in range(jobs) if n % 50 == 7}
+        expected_done = set(range(jobs)) - expected_dead | {-1}
+        while (set(successes) | set(dead)) != expected_done | expected_dead:
+            await asyncio.sleep(0.05)
+            if time.perf_counter() - started > 120:
+                break
+        drained_in = time.perf_counter() - started
+        await asyncio.sleep(0.5)
+    finally:
+        for queue in workers:
+            await queue.stop(timeout=5)
+            queue.db.close()
+
+    conn = db.get_connection()
+    try:
+        cursor = conn.cursor()
+        cursor.execute('SELECT COUNT(*) FILTER (WHERE completed_at IS NULL), COUNT(*) FROM moderation_jobs')
+        pending, kept = cursor.fetchone()
+        cursor.execute('SELECT COUNT(*) FROM moderation_dead_letters')
+        dead_letters = cursor.fetchone()[0]
+        cursor.close()
+    finally:
+        db.return_connection(conn)
+        db.close()
+        admin(base_url, f'DROP DATABASE IF EXISTS {BENCH_DB}')
+
+    print(f"\n{jobs} jobs at {latency} ms each, 2 workers x {concurrency} concurrent\n")
+    print(f"enqueue        p50 {statistics.median(enqueue_ms):.2f} ms · p99 {percentile(enqueue_ms, 99):.2f} ms")
+    print(f"drained in     {drained_in:.2f}s = {jobs / drained_in:.0f} jobs/s "
+          f"(inline and one at a time: {jobs * latency / 1000:.1f}s)")
+    for index, queue in enumerate(workers):
+        stats = queue.summary()
+        print(f"worker {index}       {stats['completed']} done · {stats['retried']} retried · "
+              f"{stats['dead_lettered']} dead-lettered")
+    print()
+
+    check(all(duplicates), f"{len(duplicates)} repeated idempotency keys not enqueued again")
+    check(all(successes[n] == 1 for n in expected_done), "every job succeeded exactly once")
+    check(successes[-1] == 1, "job abandoned by the crashed worker ran after its lease expired")
+    check(sorted(dead) == sorted(expected_dead) and dead_letters == len(expected_dead),
+          f"{len(dead)} permanent failures dead-lettered")
+    check(all(executions[n] == 3 for n in range(jobs) if n % 10 == 3 and n not in expected_dead),
+          "transient failures retried until they succeeded")
+    check(pending == 0 and kept == len(expected_done), f"{pending} job(s) left pending, {kept} kept for their keys")
+    return failures
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--jobs', type=int, default=500, help='jobs to enqueue (default: 500)')
+    parser.add_argument('--latency', type=float, default=50, help='ms each job takes (default: 50)')
+    parser.add_argument('--concurrency', type=int, default=4, help='jobs in flight per worker (default: 4)')
+    args = parser.parse_args()
+    base_url = os.getenv('DATABASE_URL')
+    if not base_url:
+        sys.exit("DATABASE_URL is required")
+    problems = asyncio.run(run(args.jobs, args.latency, args.concurrency, base_url))
+    if problems:
+        sys.exit("FAILED: " + "; ".join(problems))
@@ -0,0 +1,218 @@
+"""Partitioning benchmark: one flat shifts table vs. monthly partitions.
+
+Creates two scratch databases on the server in DATABASE_URL, loads the
+same synthetic history into both (--rows shifts spread over --months
+months), then upgrades one of them through the partitioning migration and
+times the hot read paths on each: the leaderboard, a per-user total, the
+active-user list, a one-month export of old history and an export of the
+last week. The partitioned database is then archived down to
+--keep-months of live partitions and timed again.
+
+    DATABASE_URL=postgresql://... python benchmarks/bench_partitions.py --rows 1000000
+
+The flat database stays on the pre-partitioning schema (plus an empty
+shift_archive_totals table so the same queries run on both). Both scratch
+databases are dropped afterwards.
+"""
+import argparse
+import os
+import statistics
+import sys
+import time
+from datetime import datetime, timedelta
+from urllib.parse import urlsplit, urlunsplit
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import psycopg2  # noqa: E402
+import psycopg2.pool  # noqa: E402
+
+import migrate  # noqa: E402
+from database import ShiftDatabase, TimedConnection  # noqa: E402
+
+FLAT_DB = 'shift_bench_flat'
+PARTITIONED_DB = 'shift_bench_partitioned'
+# Last migration before shifts was partitioned.
+FLAT_SCHEMA_VERSION = 3
+
+
+def database_url(base_url, name):
+    parts = urlsplit(base_url)
+    return urlunsplit(parts._replace(path=f"/{name}"))
+
+
+def admin(base_url, *statements):
+    conn = psycopg2.connect(base_url)
+    conn.autocommit = True
+    try:
+        cursor = conn.cursor()
+        for statement in statements:
+            cursor.execute(statement)
+    finally:
+        conn.close()
+
+
+def load_history(url, rows, months, users, active):
+    conn = psycopg2.connect(url)
+    try:
+        migrate.run_migrations(conn, target=FLAT_SCHEMA_VERSION)
+        cursor = conn.cursor()
+        # Same seed for both databases, so they hold identical rows.
+        cursor.execute('SELECT setseed(0.42)')
+        cursor.execute('''
+            INSERT INTO shifts (user_id, username, clock_in_time, clock_out_time, duration_seconds, is_active)
+            SELECT 'user-' || u, 'user-' || u, t, t + d * INTERVAL '1 second', d, FALSE
+            FROM (
+                SELECT (random() * (%s - 1))::int AS u,
+                       (NOW() AT TIME ZONE 'utc') - random() * (%s * INTERVAL '1 month') AS t,
+                       1800 + (random() * 28800)::int AS d
+                FROM generate_series(1, %s)
+            ) generated
+        ''', (users, months, rows))
+        cursor.execute('''
+            INSERT INTO shifts (user_id, username, clock_in_time, is_active)
+            SELECT 'user-' || u, 'user-' || u, (NOW() AT TIME ZONE 'utc') - u * INTERVAL '7 minutes', TRUE
+            FROM generate_series(0, %s - 1) u
+        ''', (active,))
+        conn.commit()
+    finally:
+        conn.close()
+
+
+def open_flat(url):
+    # Stays at FLAT_SCHEMA_VERSION: apply_migrations() is never called on
+    # this one.
+    conn = psycopg2.connect(url)
+    try:
+        cursor = conn.cursor()
+        cursor.execute('''
+            CREATE TABLE shift_archive_totals (
+                month DATE NOT NULL,
+                user_id TEXT NOT NULL,
+                shift_count INTEGER NOT NULL,
+                total_seconds BIGINT NOT NULL,
+                PRIMARY KEY (month, user_id)
+            )
+        ''')
+        cursor.execute('''
+            CREATE TABLE users AS
+            SELECT DISTINCT ON (user_id) user_id, username FROM shifts ORDER BY user_id, clock_in_time DESC
+        ''')
+        cursor.execute('ALTER TABLE users ADD PRIMARY KEY (user_id)')
+        cursor.execute('ANALYZE')
+        conn.commit()
+    finally:
+        conn.close()
+    db = ShiftDatabase()
+    db.database_url = url
+    db.connection_pool = psycopg2.pool.ThreadedConnectionPool(1, 4, url, connection_factory=TimedConnection)
+    return db
+
+
+def open_partitioned(url):
+    db = ShiftDatabase()
+    db.database_url = url
+    started = time.perf_counter()
+    db.apply_migrations()
+    migrated = time.perf_counter() - started
+    conn = db.get_connection()
+    try:
+        cursor = conn.cursor()
+        cursor.execute('ANALYZE')
+        conn.commit()
+        cursor.close()
+    finally:
+        db.return_connection(conn)
+    return db, migrated
+
+
+def export(db, start, end):
+    return sum(len(batch) for batch in db.iter_shifts(start, end))
+
+
+def time_queries(db, repeats):
+    now = datetime.utcnow()
+    month_start = (now - timedelta(days=180)).replace(day=1, hour=0, minute=0, second=0, microsecond=0)
+    month_end = (month_start + timedelta(days=32)).replace(day=1)
+    queries = [
+        ('leaderboard top 10', lambda: db.get_leaderboard(10)),
+        ('user total', lambda: db.get_user_total_time('user-7')),
+        ('active users', lambda: [row['user_id'] for row in db.get_active_users()]),
+        ('export 1 old month', lambda: export(db, month_start, month_end)),
+        ('export last 7 days', lambda: export(db, now - timedelta(days=7), now)),
+    ]
+    results = {}
+    for name, query in queries:
+        samples = []
+        for _ in range(repeats):
+            started = time.perf_counter()
+            result = query()
+            samples.append((time.perf_counter() - started) * 1000)
+        results[name] = (statistics.median(samples), result)
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--rows', type=int, default=1_000_000, help='completed shifts to load (default: 1000000)')
+    parser.add_argument('--months', type=int, default=36, help='months of history to spread them over (default: 36)')
+    parser.add_argument('--users', type=int, default=500, help='distinct users (default: 500)')
+    parser.add_argument('--active', type=int, default=40, help='users clocked in right now (default: 40)')
+    parser.add_argument('--keep-months', type=int, default=12,
+                        help='live partitions to keep when archiving (default: 12)')
+    parser.add_argument('--repeats', type=int, default=5, help='runs per query, median reported (default: 5)')
+    args = parser.parse_args()
+
+    base_url = os.environ.get('DATABASE_URL')
+    if not base_url:
+        sys.exit('DATABASE_URL is required')
+    flat_url = database_url(base_url, FLAT_DB)
+    partitioned_url = database_url(base_url, PARTITIONED_DB)
+
+    admin(base_url, *(f'DROP DATABASE IF EXISTS {name}' for name in (FLAT_DB, PARTITIONED_DB)),
+          *(f'CREATE DATABASE {name}' for name in (FLAT_DB, PARTITIONED_DB)))
+    flat = partitioned = None
+    try:
+        print(f"Loading {args.rows} shifts over {args.months} months for {args.users} users into both databases...")
+        for url in (flat_url, partitioned_url):
+            load_history(url, args.rows, args.months, args.users, args.active)
+
+        flat = open_flat(flat_url)
+        partitioned, migrated = open_partitioned(partitioned_url)
+        print(f"Partitioning migration: {migrated:.1f}s, {len(partitioned.get_shift_partitions())} partitions\n")
+
+        flat_results = time_queries(flat, args.repeats)
+        partitioned_results = time_queries(partitioned, args.repeats)
+
+        started = time.perf_counter()
+        archived = partitioned.archive_shift_partitions(args.keep_months)
+        archive_seconds = time.perf_counter() - started
+        conn = partitioned.get_connection()
+        try:
+            cursor = conn.cursor()
+            cursor.execute('ANALYZE')
+            conn.commit()
+            cursor.close()
+        finally:
+            partitioned.return_connection(conn)
+        archived_results = time_queries(partitioned, args.repeats)
+
+        print(f"{'query':<20} {'flat ms':>9} {'partitioned ms':>15} {'archived ms':>12} {'rows':>8}")
+        for name, (flat_ms, result) in flat_results.items():
+            rows = len(result) if isinstance(result, list) else result
+            print(f"{name:<20} {flat_ms:>9.1f} {partitioned_results[name][0]:>15.1f} "
+                  f"{archived_results[name][0]:>12.1f} {rows:>8}")
+        print(f"\nArchived {len(archived)} partitions in {archive_seconds:.1f}s, keeping {args.keep_months} months live")
+        # Archived months drop out of exports but must still count towards totals.
+        for name in ('leaderboard top 10', 'user total', 'active users'):
+            if archived_results[name][1] != flat_results[name][1]:
+                print(f"MISMATCH: {name} differs between the flat and archived layouts")
+    finally:
+        for db in (flat, partitioned):
+            if db is not None:
+                db.close()
+        admin(base_url, *(f'DROP DATABASE IF EXISTS {name}' for name in (FLAT_DB, PARTITIONED_DB)))
+
+
+if __name__ == '__main__':
+    main()
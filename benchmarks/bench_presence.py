@@ -0,0 +1,137 @@
+"""Roblox presence poller against a local stub of the presence endpoint.
+
+Starts an aiohttp stub of POST /v1/presence/users on a local port, which
+rejects batches over the endpoint's limit, and points a PresencePoller at
+it with --users synthetic clocked-in staff. Runs a few scripted cycles
+and exits non-zero on a failed check:
+  - steady state: one request per batch, interval backs off
+  - someone joins the experience: on_change fires, interval resets
+  - the stub answers 429: the poller waits out Retry-After
+
+    python benchmarks/bench_presence.py --users 230
+"""
+import argparse
+import asyncio
+import math
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from aiohttp import web  # noqa: E402
+
+import roblox_presence  # noqa: E402
+from roblox_presence import PresencePoller  # noqa: E402
+
+UNIVERSE_ID = 4242
+ROBLOX_ID_BASE = 1_000_000
+
+
+class PresenceStub:
+    def __init__(self, batch_limit):
+        self.batch_limit = batch_limit
+        self.requests = 0
+        self.largest_batch = 0
+        self.rate_limit = False
+        # Roblox user ID -> (userPresenceType, universeId)
+        self.states = {}
+
+    async def handle(self, request):
+        self.requests += 1
+        if self.rate_limit:
+            return web.json_response({'errors': [{'message': 'Too many requests'}]}, status=429,
+                                     headers={'Retry-After': '42'})
+        user_ids = (await request.json())['userIds']
+        self.largest_batch = max(self.largest_batch, len(user_ids))
+        if len(user_ids) > self.batch_limit:
+            return web.json_response({'errors': [{'message': 'Too many user ids'}]}, status=400)
+        return web.json_response({'userPresences': [
+            {
+                'userPresenceType': self.states.get(user_id, (1, None))[0],
+                'universeId': self.states.get(user_id, (1, None))[1],
+                'lastLocation': 'Website',
+                'userId': user_id,
+            }
+            for user_id in user_ids
+        ]})
+
+
+async def run(users, port):
+    stub = PresenceStub(roblox_presence.PRESENCE_BATCH_SIZE)
+    app = web.Application()
+    app.router.add_post('/v1/presence/users', stub.handle)
+    runner = web.AppRunner(app)
+    await runner.setup()
+    await web.TCPSite(runner, '127.0.0.1', port).start()
+
+    links = {str(900 + n): ROBLOX_ID_BASE + n for n in range(users)}
+    changes = []
+
+    async def on_change():
+        changes.append(time.monotonic())
+
+    poller = PresencePoller(lambda: links, on_change=on_change,
+                            presence_url=f"http://127.0.0.1:{port}/v1/presence/users")
+    poller.universe_id = UNIVERSE_ID
+    failures = []
+
+    def check(condition, message):
+        print(f"  {'ok  ' if condition else 'FAIL'} {message}")
+        if not condition:
+            failures.append(message)
+
+    try:
+        expected_requests = math.ceil(users / roblox_presence.PRESENCE_BATCH_SIZE)
+
+        print("first poll")
+        started = time.perf_counter()
+        delay = await poller.poll()
+        elapsed = (time.perf_counter() - started) * 1000
+        check(stub.requests == expected_requests, f"{users} users took {stub.requests} request(s), expected {expected_requests}")
+        check(stub.largest_batch <= roblox_presence.PRESENCE_BATCH_SIZE, f"largest batch {stub.largest_batch}")
+        check(len(poller.presence) == users and len(changes) == 1, "every user cached, board refreshed once")
+        print(f"  poll took {elapsed:.1f} ms, next in {delay:.0f}s")
+
+        print("steady state")
+        delays = [await poller.poll() for _ in range(3)]
+        check(delays == sorted(delays) and delays[-1] > delays[0], f"interval backs off: {[round(d) for d in delays]}")
+        check(len(changes) == 1, "no refresh while nothing changes")
+
+        print("two users join the experience, one another game")
+        stub.states[ROBLOX_ID_BASE] = (2, UNIVERSE_ID)
+        stub.states[ROBLOX_ID_BASE + 1] = (2, UNIVERSE_ID)
+        stub.states[ROBLOX_ID_BASE + 2] = (2, 999)
+        delay = await poller.poll()
+        check(len(changes) == 2, "board refreshed")
+        check(delay == roblox_presence.MIN_INTERVAL, f"interval reset to {delay:.0f}s")
+        states = poller.summary()['states']
+        check(states.get('in_experience') == 2 and states.get('in_other_game') == 1, f"states {states}")
+
+        print("rate limited")
+        stub.rate_limit = True
+        delay = await poller.poll()
+        check(delay >= 42, f"waits out Retry-After: next in {delay:.0f}s")
+        check(poller.summary()['states'].get('in_experience') == 2, "keeps the last known presence")
+        stub.rate_limit = False
+        await poller.poll()
+        check(poller.summary()['backoff'] == 0, "backoff cleared after a good poll")
+
+        print("everyone clocks out")
+        links.clear()
+        delay = await poller.poll()
+        check(not poller.presence and delay == roblox_presence.IDLE_INTERVAL, f"idle, next in {delay:.0f}s")
+    finally:
+        await poller.stop()
+        await runner.cleanup()
+    return failures
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--users', type=int, default=230, help='clocked-in users with linked accounts (default: 230)')
+    parser.add_argument('--port', type=int, default=8767, help='local port for the stub (default: 8767)')
+    args = parser.parse_args()
+    problems = asyncio.run(run(args.users, args.port))
+    if problems:
+        sys.exit("FAILED: " + "; ".join(problems))
@@ -0,0 +1,175 @@
+"""Graceful shutdown: SIGTERM while users are clicking, nothing lost.
+
+Drives the real handlers in main.py the way load_test.py does. Discord
+REST calls are fakes that sleep for --rest-latency seconds. Each of
+--users users clocks in, and main.shutdown() starts while those clicks
+and their side effects (role, log post, shift board) are still in
+flight. A few clock-ins are also left in the local journal, as if
+Postgres had been down when they happened. The script checks that:
+  - clicks already running finish, and later ones get the restart reply
+  - every accepted clock-in is in Postgres, journaled ones included
+  - every side effect ran before Discord was closed
+  - /health answers 503 while draining
+Prints the drain time and exits non-zero on a failed check. Synthetic
+users and their shifts are deleted afterwards.
+
+    DATABASE_URL=postgresql://... python benchmarks/bench_shutdown.py --users 50
+"""
+import argparse
+import asyncio
+import os
+import shutil
+import socket
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault('LOG_LEVEL', 'WARNING')
+os.environ['JOURNAL_DIR'] = tempfile.mkdtemp(prefix='shift-bot-shutdown-journal-')
+
+import aiohttp  # noqa: E402
+import discord  # noqa: E402
+
+import main  # noqa: E402
+from benchmarks.load_test import (  # noqa: E402
+    LOGS_CHANNEL_ID, SHIFT_CHANNEL_ID, SHIFT_MESSAGE_ID, SHIFT_ROLE_ID, USER_ID_BASE,
+    FakeChannel, FakeGuild, FakeInteraction, FakeMember, FakeRest,
+)
+from database import ShiftDatabase  # noqa: E402
+from journal import EventJournal  # noqa: E402
+from web_server import start_web_server  # noqa: E402
+
+JOURNALED_USERS = 5
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+def delete_users(db, user_ids):
+    conn = db.get_connection()
+    try:
+        cursor = conn.cursor()
+        cursor.execute("DELETE FROM shifts WHERE user_id = ANY(%s)", (user_ids,))
+        cursor.execute("DELETE FROM users WHERE user_id = ANY(%s)", (user_ids,))
+        conn.commit()
+        cursor.close()
+    finally:
+        db.return_connection(conn)
+
+
+def active_user_ids(db, user_ids):
+    conn = db.get_connection()
+    try:
+        cursor = conn.cursor()
+        cursor.execute("SELECT user_id FROM shifts WHERE is_active AND user_id = ANY(%s)", (user_ids,))
+        found = {row[0] for row in cursor.fetchall()}
+        cursor.close()
+        return found
+    finally:
+        db.return_connection(conn)
+
+
+async def run(users, rest_latency):
+    failures = []
+
+    def check(condition, message):
+        print(f"  {'ok  ' if condition else 'FAIL'} {message}")
+        if not condition:
+            failures.append(message)
+
+    rest = FakeRest(rest_latency)
+    channel = FakeChannel(rest)
+    guild = FakeGuild()
+    main.bot.get_channel = lambda channel_id: channel
+    main.SHIFT_ROLE_ID = SHIFT_ROLE_ID
+    main.LOGS_CHANNEL_ID = LOGS_CHANNEL_ID
+    main.SHIFT_CHANNEL_ID = SHIFT_CHANNEL_ID
+    main.SHIFT_MESSAGE_ID = SHIFT_MESSAGE_ID
+
+    all_ids = [str(USER_ID_BASE + n) for n in range(users + JOURNALED_USERS + 1)]
+    checker = ShiftDatabase()
+    checker.apply_migrations()
+    delete_users(checker, all_ids)
+
+    port = free_port()
+    web_task = asyncio.create_task(start_web_server(port=port))
+    await web_task
+    main.shift_events.start()
+
+    view = main.ShiftButtons()
+    members = [FakeMember(USER_ID_BASE + n, guild, rest) for n in range(users)]
+    # Clock-ins made while Postgres was unreachable, still only in the journal.
+    for n in range(users, users + JOURNALED_USERS):
+        await main.journal.append('clock_in', str(USER_ID_BASE + n), f"load-{n}")
+
+    health = []
+
+    async def poll_health():
+        async with aiohttp.ClientSession() as session:
+            while True:
+                try:
+                    async with session.get(f'http://127.0.0.1:{port}/health') as resp:
+                        health.append(resp.status)
+                except aiohttp.ClientError:
+                    return
+                await asyncio.sleep(0.01)
+
+    poller = asyncio.create_task(poll_health())
+    clicks = [asyncio.create_task(view.clock_in_button.callback(FakeInteraction(member, guild, rest)))
+              for member in members]
+    # Let the clicks get going, then deploy.
+    await asyncio.sleep(rest_latency / 2)
+    in_flight = main.perf_monitor.in_flight
+    started = time.perf_counter()
+    shutting_down = asyncio.create_task(main.shutdown(web_task))
+    await asyncio.sleep(0)
+
+    late = FakeInteraction(FakeMember(USER_ID_BASE + users + JOURNALED_USERS, guild, rest), guild, rest)
+    late.type = discord.InteractionType.component
+    late_allowed = await view.interaction_check(late)
+    await shutting_down
+    drain_seconds = time.perf_counter() - started
+    await asyncio.gather(*clicks)
+    await asyncio.gather(poller, return_exceptions=True)
+
+    accepted = {str(USER_ID_BASE + n) for n in range(users + JOURNALED_USERS)}
+    stored = active_user_ids(checker, all_ids)
+    events = main.shift_events.summary()
+    # What the next start would find; main.journal itself is closed.
+    next_start = EventJournal(os.environ['JOURNAL_DIR'])
+    journal_left = next_start.has_pending()
+    next_start.close()
+    delete_users(checker, all_ids)
+    checker.close()
+    shutil.rmtree(os.environ['JOURNAL_DIR'], ignore_errors=True)
+
+    print(f"\n{users} clock-ins with {rest_latency * 1000:.0f} ms REST calls, {in_flight} in flight at SIGTERM, "
+          f"{JOURNALED_USERS} journaled\n")
+    print(f"drained and closed in {drain_seconds * 1000:.0f} ms "
+          f"(SHUTDOWN_TIMEOUT {main.SHUTDOWN_TIMEOUT:.0f}s), {rest.calls} fake REST calls\n")
+
+    check(in_flight > 0, "shutdown started with clicks still running")
+    check(not late_allowed and late.response.is_done(), "a click after SIGTERM got the restart reply")
+    check(main.perf_monitor.in_flight == 0, "every running click finished")
+    check(stored == accepted, f"{len(stored)}/{len(accepted)} accepted clock-ins in Postgres, journal included")
+    check(not journal_left, "journal empty after shutdown")
+    check(all(entry['queued'] == 0 and entry['failed'] == 0 for entry in events),
+          "clock event side effects all ran before Discord was closed")
+    check(503 in health, "/health answered 503 while draining")
+    check(drain_seconds < main.SHUTDOWN_TIMEOUT, "finished inside SHUTDOWN_TIMEOUT")
+    return failures
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--users', type=int, default=50, help='users clocking in at SIGTERM (default: 50)')
+    parser.add_argument('--rest-latency', type=float, default=0.05,
+                        help='seconds each fake Discord REST call takes (default: 0.05)')
+    args = parser.parse_args()
+    problems = asyncio.run(run(args.users, args.rest_latency))
+    if problems:
+        sys.exit("FAILED: " + "; ".join(problems))
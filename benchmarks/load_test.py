@@ -0,0 +1,296 @@
+"""Load test: concurrent users driving the shift buttons, /mystats and /leaderboard.
+
+Each virtual user runs clock in -> /mystats -> clock out -> /leaderboard in
+a loop against the real handlers in main.py and the database in
+DATABASE_URL. Discord is replaced by fake interactions whose REST calls
+just sleep for --rest-latency seconds. Prints throughput, latency
+percentiles and DB statements/round trips per interaction for each handler.
+
+    DATABASE_URL=postgresql://... python benchmarks/load_test.py --users 50 --rounds 5
+
+With --check, every interaction runs under ``db.assert_max_queries`` with
+the budgets in QUERY_BUDGETS and the run fails on the first handler that
+goes over, so an N+1 regression shows up as a failure rather than a
+slower number.
+
+Synthetic users and their shifts are deleted afterwards.
+"""
+import argparse
+import asyncio
+import os
+import statistics
+import sys
+import tempfile
+import time
+from collections import defaultdict
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault('LOG_LEVEL', 'WARNING')
+os.environ.setdefault('JOURNAL_DIR', os.path.join(tempfile.gettempdir(), 'shift-bot-load-test-journal'))
+
+import main  # noqa: E402
+from psycopg2.extras import execute_values  # noqa: E402
+from database import QueryBudgetExceeded  # noqa: E402
+
+USER_ID_BASE = 990_000_000_000_000_000
+SHIFT_ROLE_ID = 1
+LOGS_CHANNEL_ID = 2
+SHIFT_CHANNEL_ID = 3
+SHIFT_MESSAGE_ID = 4
+
+# Most statements each handler may issue per interaction. A clock in/out
+# counts the group-commit batch it started: other users' writes ride along,
+# and a window holding both clock-ins and clock-outs takes an INSERT and an
+# UPDATE. The shift board refresh runs later on its shift_events worker and
+# isn't charged to the click.
+QUERY_BUDGETS = {
+    'clock_in': 2,
+    'mystats': 1,
+    'clock_out': 2,
+    'leaderboard': 1,
+}
+
+
+class FakeRest:
+    """Stands in for Discord: every call sleeps for the configured latency."""
+
+    def __init__(self, latency):
+        self.latency = latency
+        self.calls = 0
+
+    async def call(self):
+        self.calls += 1
+        await asyncio.sleep(self.latency)
+
+
+class FakeRole:
+    def __init__(self, role_id):
+        self.id = role_id
+        self.mention = f"<@&{role_id}>"
+
+
+class FakeAsset:
+    url = "https://cdn.discordapp.com/embed/avatars/0.png"
+
+
+class FakePermissions:
+    administrator = True
+
+
+class FakeMember:
+    def __init__(self, member_id, guild, rest):
+        self.id = member_id
+        self.guild = guild
+        self.name = f"load-{member_id - USER_ID_BASE}"
+        self.display_name = self.name
+        self.mention = f"<@{member_id}>"
+        self.display_avatar = FakeAsset()
+        self.guild_permissions = FakePermissions()
+        self.roles = []
+        self._rest = rest
+
+    def __str__(self):
+        return self.name
+
+    async def add_roles(self, *roles, **kwargs):
+        await self._rest.call()
+
+    async def remove_roles(self, *roles, **kwargs):
+        await self._rest.call()
+
+
+class FakeGuild:
+    def __init__(self):
+        self.role = FakeRole(SHIFT_ROLE_ID)
+
+    def get_role(self, role_id):
+        return self.role if role_id == SHIFT_ROLE_ID else None
+
+
+class FakeResponse:
+    def __init__(self, rest):
+        self._rest = rest
+        self._done = False
+
+    def is_done(self):
+        return self._done
+
+    async def send_message(self, *args, **kwargs):
+        self._done = True
+        await self._rest.call()
+
+    async def defer(self, *args, **kwargs):
+        self._done = True
+        await self._rest.call()
+
+
+class FakeFollowup:
+    def __init__(self, rest):
+        self._rest = rest
+
+    async def send(self, *args, **kwargs):
+        await self._rest.call()
+
+
+class FakeInteraction:
+    _next_id = 1
+
+    def __init__(self, user, guild, rest):
+        self.id = FakeInteraction._next_id
+        FakeInteraction._next_id += 1
+        self.user = user
+        self.guild = guild
+        self.response = FakeResponse(rest)
+        self.followup = FakeFollowup(rest)
+
+
+class FakeMessage:
+    def __init__(self, rest):
+        self._rest = rest
+
+    async def edit(self, **kwargs):
+        await self._rest.call()
+
+
+class FakeChannel:
+    def __init__(self, rest):
+        self._rest = rest
+
+    async def send(self, *args, **kwargs):
+        await self._rest.call()
+
+    def get_partial_message(self, message_id):
+        return FakeMessage(self._rest)
+
+
+def percentile(values, pct):
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, max(0, round(pct / 100 * len(ordered)) - 1))
+    return ordered[index]
+
+
+def seed_history(user_ids, shifts_per_user):
+    now = datetime.utcnow()
+    rows = []
+    for user_id in user_ids:
+        for i in range(shifts_per_user):
+            start = now - timedelta(days=i + 1, hours=(i * 7) % 12)
+            duration = 3600 + (i * 977) % 14400
+            rows.append((str(user_id), start, start + timedelta(seconds=duration), duration, False))
+
+    conn = main.db.get_connection()
+    try:
+        cursor = conn.cursor()
+        execute_values(cursor, '''
+            INSERT INTO shifts (user_id, clock_in_time, clock_out_time, duration_seconds, is_active)
+            VALUES %s
+        ''', rows, page_size=1000)
+        execute_values(cursor, '''
+            INSERT INTO users (user_id, username) VALUES %s
+            ON CONFLICT (user_id) DO NOTHING
+        ''', [(str(user_id), f"load-{user_id - USER_ID_BASE}") for user_id in user_ids])
+        conn.commit()
+        cursor.close()
+    finally:
+        main.db.return_connection(conn)
+
+
+def cleanup(user_ids):
+    conn = main.db.get_connection()
+    try:
+        cursor = conn.cursor()
+        cursor.execute("DELETE FROM shifts WHERE user_id = ANY(%s)", ([str(uid) for uid in user_ids],))
+        cursor.execute("DELETE FROM users WHERE user_id = ANY(%s)", ([str(uid) for uid in user_ids],))
+        conn.commit()
+        cursor.close()
+    finally:
+        main.db.return_connection(conn)
+
+
+async def run(users, rounds, rest_latency, history, check):
+    rest = FakeRest(rest_latency)
+    channel = FakeChannel(rest)
+    guild = FakeGuild()
+    main.bot.get_channel = lambda channel_id: channel
+    main.SHIFT_ROLE_ID = SHIFT_ROLE_ID
+    main.LOGS_CHANNEL_ID = LOGS_CHANNEL_ID
+    main.SHIFT_CHANNEL_ID = SHIFT_CHANNEL_ID
+    main.SHIFT_MESSAGE_ID = SHIFT_MESSAGE_ID
+    # What setup_hook does before the bot takes any clicks.
+    main.db.apply_migrations()
+
+    view = main.ShiftButtons()
+    steps = [
+        ('clock_in', lambda i: view.clock_in_button.callback(i)),
+        ('mystats', lambda i: main.mystats.callback(i)),
+        ('clock_out', lambda i: view.clock_out_button.callback(i)),
+        ('leaderboard', lambda i: main.leaderboard.callback(i, top=10)),
+    ]
+
+    user_ids = [USER_ID_BASE + n for n in range(users)]
+    members = [FakeMember(user_id, guild, rest) for user_id in user_ids]
+    latencies = defaultdict(list)
+    statements = defaultdict(list)
+    round_trips = defaultdict(list)
+
+    async def virtual_user(member):
+        for _ in range(rounds):
+            for name, step in steps:
+                if check:
+                    counting = main.db.assert_max_queries(QUERY_BUDGETS[name], label=name)
+                else:
+                    counting = main.db.count_queries(label=name)
+                started = time.perf_counter()
+                with counting as counter:
+                    await step(FakeInteraction(member, guild, rest))
+                latencies[name].append((time.perf_counter() - started) * 1000)
+                statements[name].append(counter.statements)
+                round_trips[name].append(counter.round_trips)
+
+    cleanup(user_ids)
+    seed_history(user_ids, history)
+    main.shift_events.start()
+    try:
+        started = time.perf_counter()
+        await asyncio.gather(*(virtual_user(member) for member in members))
+        elapsed = time.perf_counter() - started
+        # Roles, logs and board refreshes finish after the replies.
+        await main.shift_events.join()
+        drained = time.perf_counter() - started - elapsed
+    finally:
+        await main.shift_events.stop()
+        cleanup(user_ids)
+
+    total = sum(len(values) for values in latencies.values())
+    print(f"{users} users x {rounds} rounds, {history} past shifts each, "
+          f"REST latency {rest_latency * 1000:.0f} ms")
+    print(f"{total} interactions in {elapsed:.2f}s = {total / elapsed:.1f} interactions/s, "
+          f"{rest.calls} fake REST calls, side effects drained {drained * 1000:.0f} ms later\n")
+    print(f"{'handler':<12} {'count':>6} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8} "
+          f"{'stmts avg':>10} {'stmts max':>10} {'budget':>7} {'trips avg':>10}")
+    for name, _ in steps:
+        values = latencies[name]
+        print(
+            f"{name:<12} {len(values):>6} {statistics.median(values):>8.1f} "
+            f"{percentile(values, 95):>8.1f} {percentile(values, 99):>8.1f} "
+            f"{statistics.mean(statements[name]):>10.2f} {max(statements[name]):>10} "
+            f"{QUERY_BUDGETS[name]:>7} {statistics.mean(round_trips[name]):>10.2f}"
+        )
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--users', type=int, default=25, help='concurrent virtual users (default: 25)')
+    parser.add_argument('--rounds', type=int, default=4, help='scenario repetitions per user (default: 4)')
+    parser.add_argument('--rest-latency', type=float, default=0.05,
+                        help='seconds each fake Discord REST call takes (default: 0.05)')
+    parser.add_argument('--history', type=int, default=200, help='past shifts seeded per user (default: 200)')
+    parser.add_argument('--check', action='store_true', help='fail if a handler exceeds its query budget')
+    args = parser.parse_args()
+    try:
+        asyncio.run(run(args.users, args.rounds, args.rest_latency, args.history, args.check))
+    except QueryBudgetExceeded as e:
+        sys.exit(f"Query budget exceeded: {e}")
+    finally:
+        main.db.close()
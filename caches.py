@@ -0,0 +1,178 @@
+import asyncio
+import gzip
+import hashlib
+import json
+import logging
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Hashable, Optional, Sequence
+
+from memory import cache_entries
+
+logger = logging.getLogger(__name__)
+
+# Rebuild a snapshot at least this often even if nothing invalidated it,
+# in case a write path doesn't.
+API_CACHE_MAX_AGE = 300.0
+# Size of one entry, for sizing the LRUs from the memory budget (measured
+# with benchmarks/bench_memory.py): a /mystats result (three lists of ints),
+# and a derived API view for one user (JSON body, gzipped copy and ETags).
+STATS_ENTRY_BYTES = 4096
+DERIVED_ENTRY_BYTES = 1024
+MAX_STATS_ENTRIES = cache_entries(0.15, STATS_ENTRY_BYTES)
+MAX_DERIVED_ENTRIES = cache_entries(0.15, DERIVED_ENTRY_BYTES)
+
+
+class LRUCache:
+    """A mapping bounded to ``maxsize`` entries; the least recently read or written goes first."""
+
+    def __init__(self, maxsize: int):
+        self.maxsize = maxsize
+        self.evictions = 0
+        self._data: OrderedDict = OrderedDict()
+
+    def __len__(self):
+        return len(self._data)
+
+    def __contains__(self, key: Hashable) -> bool:
+        return key in self._data
+
+    def get(self, key: Hashable, default: Any = None) -> Any:
+        try:
+            self._data.move_to_end(key)
+        except KeyError:
+            return default
+        return self._data[key]
+
+    def set(self, key: Hashable, value: Any):
+        self._data[key] = value
+        self._data.move_to_end(key)
+        while len(self._data) > self.maxsize:
+            self._data.popitem(last=False)
+            self.evictions += 1
+
+    def pop(self, key: Hashable, default: Any = None) -> Any:
+        return self._data.pop(key, default)
+
+    def clear(self):
+        self._data.clear()
+
+
+class StatsCache:
+    """Per-user stats, valid until the user's next clock-out or the UTC day rolls over."""
+
+    def __init__(self, maxsize: int = MAX_STATS_ENTRIES):
+        self._entries = LRUCache(maxsize)
+
+    def __len__(self):
+        return len(self._entries)
+
+    def get(self, user_id: str, day: str) -> Optional[Dict]:
+        entry = self._entries.get(user_id)
+        if entry and entry[0] == day:
+            return entry[1]
+        return None
+
+    def set(self, user_id: str, day: str, stats: Dict):
+        self._entries.set(user_id, (day, stats))
+
+    def invalidate(self, user_id: str):
+        self._entries.pop(user_id, None)
+
+    def clear(self):
+        self._entries.clear()
+
+
+class CachedJson:
+    """A payload serialized and gzipped once, with an ETag per encoding."""
+
+    __slots__ = ('payload', 'body', 'gzipped', 'etag', 'gzip_etag', 'built_at', 'generation', 'sources')
+
+    def __init__(self, payload: Any, generation: int = 0, sources: str = ''):
+        self.payload = payload
+        self.body = json.dumps(payload, separators=(',', ':'), default=str).encode('utf-8')
+        self.gzipped = gzip.compress(self.body, compresslevel=6)
+        digest = hashlib.sha1(self.body).hexdigest()[:20]
+        # Content-derived, so a rebuild that finds nothing changed keeps the
+        # same ETag and pollers keep getting 304s.
+        self.etag = f'"{digest}"'
+        self.gzip_etag = f'"{digest}-gz"'
+        self.built_at = time.monotonic()
+        self.generation = generation
+        self.sources = sources
+
+
+class ApiCache:
+    """JSON snapshots for the dashboard API.
+
+    Each named resource has a loader (a blocking DB read, run in a thread).
+    Its result is serialized once and served until a write path calls
+    ``invalidate`` or ``max_age`` passes, so polling costs no queries. If a
+    rebuild fails, the previous snapshot keeps being served.
+    """
+
+    def __init__(self, max_age: float = API_CACHE_MAX_AGE, max_derived: int = MAX_DERIVED_ENTRIES):
+        self.max_age = max_age
+        self._loaders: Dict[str, Callable[[], Any]] = {}
+        self._entries: Dict[str, CachedJson] = {}
+        self._generations: Dict[str, int] = {}
+        self._locks: Dict[str, asyncio.Lock] = {}
+        # Derived views are keyed by query parameters (limits, user IDs).
+        self._derived = LRUCache(max_derived)
+
+    def __len__(self):
+        return len(self._entries) + len(self._derived)
+
+    def register(self, name: str, loader: Callable[[], Any]):
+        self._loaders[name] = loader
+        self._generations.setdefault(name, 0)
+
+    def invalidate(self, *names: str):
+        for name in names or tuple(self._generations):
+            self._generations[name] = self._generations.get(name, 0) + 1
+
+    def _is_fresh(self, name: str, entry: Optional[CachedJson]) -> bool:
+        return (
+            entry is not None
+            and entry.generation == self._generations[name]
+            and time.monotonic() - entry.built_at < self.max_age
+        )
+
+    async def get(self, name: str) -> CachedJson:
+        entry = self._entries.get(name)
+        if self._is_fresh(name, entry):
+            return entry
+
+        lock = self._locks.setdefault(name, asyncio.Lock())
+        async with lock:
+            # Concurrent pollers wait for the one rebuild instead of each
+            # running the query.
+            entry = self._entries.get(name)
+            if self._is_fresh(name, entry):
+                return entry
+
+            generation = self._generations[name]
+            try:
+                payload = await asyncio.to_thread(self._loaders[name])
+            except Exception as e:
+                if entry is None:
+                    raise
+                logger.warning(f"Serving stale {name} snapshot, rebuild failed: {e}")
+                return entry
+
+            # An invalidation that lands mid-rebuild bumps the generation
+            # again, so this entry is already stale and the next get reloads.
+            entry = CachedJson(payload, generation)
+            self._entries[name] = entry
+            return entry
+
+    def derive(self, key: str, sources: Sequence[CachedJson], build: Callable[..., Any]) -> CachedJson:
+        """A view computed from other snapshots' payloads, rebuilt only when one of them changes."""
+        source_tags = ','.join(source.etag for source in sources)
+        entry = self._derived.get(key)
+        if entry is not None and entry.sources == source_tags:
+            return entry
+
+        entry = CachedJson(build(*(source.payload for source in sources)), sources=source_tags)
+        self._derived.set(key, entry)
+        return entry
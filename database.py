@@ -1,80 +1,230 @@
 import psycopg2
 from psycopg2 import pool
-from psycopg2.extras import RealDictCursor
+from psycopg2.extras import Json, RealDictCursor, execute_values
+import migrate
 import os
-from datetime import datetime
-from typing import Optional, List, Dict
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from datetime import datetime, timedelta
+from itertools import islice
+from typing import Optional, List, Dict, Iterator, Tuple, Callable
+
+# Monthly partitions of shifts are named shifts_YYYY_MM; see migration 0004.
+PARTITION_FORMAT = "shifts_%Y_%m"
+ARCHIVED_PARTITION_FORMAT = "shifts_archived_%Y_%m"
+
+
+def _add_months(month, months: int):
+    index = month.year * 12 + month.month - 1 + months
+    return month.replace(year=index // 12, month=index % 12 + 1, day=1)
+
+
+# Upserts the clocking-in user's name in the same statement as the shift
+# insert. The WHERE skips the write (and the dead tuple) when the name
+# hasn't changed, which is nearly always.
+_UPSERT_USER = '''
+    INSERT INTO users (user_id, username)
+    SELECT user_id, username FROM new_users
+    ON CONFLICT (user_id) DO UPDATE
+    SET username = EXCLUDED.username, updated_at = NOW() AT TIME ZONE 'utc'
+    WHERE users.username IS DISTINCT FROM EXCLUDED.username
+'''
+
+
+# Seconds to wait for a new connection before giving up.
+CONNECT_TIMEOUT = int(os.getenv('DB_CONNECT_TIMEOUT', '5'))
+
+# Connections in the pool. Export downloads, moderation workers and API
+# cache rebuilds each hold one for a while, on top of the to_thread callers.
+POOL_SIZE = int(os.getenv('DB_POOL_SIZE', '20'))
+# Seconds get_connection() waits for a free connection when all are in use.
+POOL_TIMEOUT = float(os.getenv('DB_POOL_TIMEOUT', '10'))
+
+# Errors meaning the database could not be reached, as opposed to a bad query.
+# PoolExhausted is not one of them: Postgres is fine, we're just busy.
+CONNECTION_ERRORS = (psycopg2.OperationalError, psycopg2.InterfaceError)
+
+
+class _TimedCursorMixin:
+    # Reports every execute() to the owning connection's statement hooks.
+    def execute(self, query, vars=None):
+        start = time.perf_counter()
+        try:
+            return super().execute(query, vars)
+        finally:
+            elapsed = time.perf_counter() - start
+            for hook in self.connection.statement_hooks:
+                hook(query, elapsed)
+
+
+class TimedCursor(_TimedCursorMixin, psycopg2.extensions.cursor):
+    pass
+
+
+class TimedRealDictCursor(_TimedCursorMixin, RealDictCursor):
+    pass
+
+
+_TIMED_CURSORS = {
+    None: TimedCursor,
+    psycopg2.extensions.cursor: TimedCursor,
+    RealDictCursor: TimedRealDictCursor,
+}
+
+
+class TimedConnection(psycopg2.extensions.connection):
+    statement_hooks: List[Callable[[str, float], None]] = []
+
+    def cursor(self, *args, **kwargs):
+        factory = kwargs.get('cursor_factory')
+        kwargs['cursor_factory'] = _TIMED_CURSORS.get(factory, factory)
+        return super().cursor(*args, **kwargs)
+
+    def _timed(self, command, method):
+        start = time.perf_counter()
+        try:
+            return method()
+        finally:
+            elapsed = time.perf_counter() - start
+            for hook in self.statement_hooks:
+                hook(command, elapsed)
+
+    def commit(self):
+        return self._timed('COMMIT', super().commit)
+
+    def rollback(self):
+        return self._timed('ROLLBACK', super().rollback)
+
+
+class QueryBudgetExceeded(AssertionError):
+    pass
+
+
+class PoolExhausted(Exception):
+    """Every pooled connection stayed in use for POOL_TIMEOUT seconds."""
+
+
+class QueryCounter:
+    """Statements and round trips issued inside a ``ShiftDatabase.count_queries`` block.
+
+    Counts follow the block's context, including work it hands to
+    ``asyncio.to_thread``. Every execute, commit and rollback is a round
+    trip; only the SQL statements themselves count as statements.
+    """
+
+    def __init__(self, label: Optional[str] = None):
+        self.label = label
+        self.statements = 0
+        self.round_trips = 0
+        self.queries: List[str] = []
+
+    def record(self, query):
+        self.round_trips += 1
+        if query in ('COMMIT', 'ROLLBACK'):
+            return
+        text = query.decode('utf-8', 'replace') if isinstance(query, bytes) else str(query)
+        text = ' '.join(text.split())
+        self.statements += max(1, sum(1 for part in text.split(';') if part.strip()))
+        self.queries.append(text)
+
+
+_query_counters: ContextVar[Tuple[QueryCounter, ...]] = ContextVar('query_counters', default=())
+
+
+def _count_statement(query, seconds):
+    for counter in _query_counters.get():
+        counter.record(query)
+
 
 class ShiftDatabase:
     def __init__(self):
         self.database_url = os.getenv("DATABASE_URL")
+        
+        # Called as hook(query, seconds) after every statement, commit and
+        # rollback; see perf.py and count_queries.
+        self.statement_hooks: List[Callable[[str, float], None]] = [_count_statement]
+        
+        # Opened on first use, so importing the bot doesn't wait on Postgres.
+        self.connection_pool = None
+        self._pool_lock = threading.Lock()
+        # psycopg2's pool raises at once when it is empty; this makes
+        # get_connection() wait its turn instead.
+        self._pool_slots = threading.BoundedSemaphore(POOL_SIZE)
+    
+    @contextmanager
+    def count_queries(self, label: Optional[str] = None) -> Iterator[QueryCounter]:
+        counter = QueryCounter(label)
+        token = _query_counters.set(_query_counters.get() + (counter,))
+        try:
+            yield counter
+        finally:
+            _query_counters.reset(token)
+    
+    @contextmanager
+    def assert_max_queries(self, limit: int, label: Optional[str] = None) -> Iterator[QueryCounter]:
+        # Raises QueryBudgetExceeded if the block issues more than ``limit`` statements.
+        with self.count_queries(label) as counter:
+            yield counter
+        if counter.statements > limit:
+            issued = "\n".join(f"  {query[:200]}" for query in counter.queries)
+            raise QueryBudgetExceeded(
+                f"{label or 'block'} issued {counter.statements} statement(s), limit is {limit}:\n{issued}"
+            )
+    
+    def apply_migrations(self) -> Optional[List[migrate.Migration]]:
+        """Bring the schema up to date on a connection of its own.
+
+        Call once at startup, from a worker thread, before the pool is
+        used. Migrations like CREATE INDEX CONCURRENTLY can take minutes,
+        and they must not run under ``_pool_lock``, where every
+        ``get_connection()`` would wait on them.
+        """
         if not self.database_url:
             raise ValueError("DATABASE_URL environment variable is required")
-        
-        self.connection_pool = psycopg2.pool.SimpleConnectionPool(
-            1, 10, self.database_url
+        conn = psycopg2.connect(
+            self.database_url, connection_factory=TimedConnection, connect_timeout=CONNECT_TIMEOUT
         )
-        
-        self.init_database()
+        try:
+            conn.statement_hooks = self.statement_hooks
+            return migrate.ensure_schema(conn)
+        finally:
+            conn.close()
+    
+    def _open_pool(self):
+        with self._pool_lock:
+            if self.connection_pool is not None:
+                return
+            if not self.database_url:
+                raise ValueError("DATABASE_URL environment variable is required")
+            
+            # Threaded pool: exports and journal replay run queries from worker threads.
+            # connect_timeout bounds each connect when the host is unreachable
+            # (e.g. packets dropped), instead of waiting on the TCP timeout.
+            self.connection_pool = psycopg2.pool.ThreadedConnectionPool(
+                1, POOL_SIZE, self.database_url, connection_factory=TimedConnection,
+                connect_timeout=CONNECT_TIMEOUT,
+            )
     
     def get_connection(self):
-        return self.connection_pool.getconn()
+        if self.connection_pool is None:
+            self._open_pool()
+        if not self._pool_slots.acquire(timeout=POOL_TIMEOUT):
+            raise PoolExhausted(f"No database connection free after {POOL_TIMEOUT:g}s")
+        try:
+            conn = self.connection_pool.getconn()
+        except Exception:
+            self._pool_slots.release()
+            raise
+        conn.statement_hooks = self.statement_hooks
+        return conn
     
     def return_connection(self, conn):
-        self.connection_pool.putconn(conn)
-    
-    def init_database(self):
-        conn = self.get_connection()
         try:
-            cursor = conn.cursor()
-            
-            cursor.execute('''
-                CREATE TABLE IF NOT EXISTS shifts (
-                    id SERIAL PRIMARY KEY,
-                    user_id TEXT NOT NULL,
-                    username TEXT NOT NULL,
-                    clock_in_time TIMESTAMP NOT NULL,
-                    clock_out_time TIMESTAMP,
-                    duration_seconds INTEGER,
-                    is_active BOOLEAN DEFAULT TRUE
-                )
-            ''')
-            
-            cursor.execute('''
-                CREATE INDEX IF NOT EXISTS idx_user_id ON shifts(user_id)
-            ''')
-            
-            cursor.execute('''
-                CREATE INDEX IF NOT EXISTS idx_is_active ON shifts(is_active)
-            ''')
-            
-            cursor.execute('''
-                CREATE TABLE IF NOT EXISTS config (
-                    key TEXT PRIMARY KEY,
-                    value TEXT NOT NULL
-                )
-            ''')
-            
-            cursor.execute('''
-                CREATE TABLE IF NOT EXISTS warnings (
-                    id SERIAL PRIMARY KEY,
-                    user_id TEXT NOT NULL,
-                    username TEXT NOT NULL,
-                    moderator_id TEXT NOT NULL,
-                    moderator_name TEXT NOT NULL,
-                    reason TEXT NOT NULL,
-                    timestamp TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP
-                )
-            ''')
-            
-            cursor.execute('''
-                CREATE INDEX IF NOT EXISTS idx_warnings_user_id ON warnings(user_id)
-            ''')
-            
-            conn.commit()
+            self.connection_pool.putconn(conn)
         finally:
-            cursor.close()
-            self.return_connection(conn)
+            self._pool_slots.release()
     
     def clock_in(self, user_id: str, username: str) -> bool:
         if self.is_clocked_in(user_id):
@@ -83,10 +233,12 @@ class ShiftDatabase:
         conn = self.get_connection()
         try:
             cursor = conn.cursor()
-            cursor.execute('''
-                INSERT INTO shifts (user_id, username, clock_in_time, is_active)
-                VALUES (%s, %s, %s, TRUE)
-            ''', (user_id, username, datetime.utcnow()))
+            cursor.execute(f'''
+                WITH new_users (user_id, username) AS (VALUES (%s, %s)),
+                named AS ({_UPSERT_USER})
+                INSERT INTO shifts (user_id, clock_in_time, is_active)
+                VALUES (%s, %s, TRUE)
+            ''', (user_id, username, user_id, datetime.utcnow()))
             conn.commit()
             return True
         finally:
@@ -113,11 +265,12 @@ class ShiftDatabase:
             clock_out_dt = datetime.utcnow()
             duration = int((clock_out_dt - clock_in_time).total_seconds())
             
+            # clock_in_time lets Postgres go straight to the shift's partition.
             cursor.execute('''
                 UPDATE shifts
                 SET clock_out_time = %s, duration_seconds = %s, is_active = FALSE
-                WHERE id = %s
-            ''', (clock_out_dt, duration, shift_id))
+                WHERE id = %s AND clock_in_time = %s
+            ''', (clock_out_dt, duration, shift_id, clock_in_time))
             
             conn.commit()
             return duration
@@ -125,6 +278,132 @@ class ShiftDatabase:
             cursor.close()
             self.return_connection(conn)
     
+    def get_active_clock_in(self, user_id: str) -> Optional[datetime]:
+        conn = self.get_connection()
+        try:
+            cursor = conn.cursor()
+            cursor.execute('''
+                SELECT clock_in_time FROM shifts
+                WHERE user_id = %s AND is_active = TRUE
+                ORDER BY id DESC
+                LIMIT 1
+            ''', (user_id,))
+            
+            result = cursor.fetchone()
+            return result[0] if result else None
+        finally:
+            cursor.close()
+            self.return_connection(conn)
+    
+    def apply_journal_event(self, event: Dict):
+        # Replays a clock event recorded while the database was unreachable.
+        # Safe to apply more than once: a clock-in is skipped if the user is
+        # already on shift or a shift already covers that moment, and a
+        # clock-out only closes a shift that started before it.
+        at = datetime.fromisoformat(event['at'])
+        conn = self.get_connection()
+        try:
+            cursor = conn.cursor()
+            if event['type'] == 'clock_in':
+                cursor.execute(f'''
+                    WITH new_users (user_id, username) AS (VALUES (%s, %s)),
+                    named AS ({_UPSERT_USER})
+                    INSERT INTO shifts (user_id, clock_in_time, is_active)
+                    SELECT %s, %s, TRUE
+                    WHERE NOT EXISTS (
+                        SELECT 1 FROM shifts
+                        WHERE user_id = %s
+                          AND (is_active = TRUE OR (clock_in_time <= %s AND clock_out_time >= %s))
+                    )
+                ''', (event['user_id'], event['username'], event['user_id'], at, event['user_id'], at, at))
+            elif event['type'] == 'clock_out':
+                cursor.execute('''
+                    UPDATE shifts
+                    SET clock_out_time = %s,
+                        duration_seconds = FLOOR(EXTRACT(EPOCH FROM (%s - clock_in_time)))::INTEGER,
+                        is_active = FALSE
+                    WHERE user_id = %s AND is_active = TRUE AND clock_in_time <= %s
+                ''', (at, at, event['user_id'], at))
+            conn.commit()
+        finally:
+            cursor.close()
+            self.return_connection(conn)
+    
+    def apply_shift_batch(self, ops: List[tuple]) -> List:
+        # Applies queued ('clock_in', user_id, username, at) and
+        # ('clock_out', user_id, None, at) writes in one transaction. Ops are
+        # split into waves where each user appears once, so a clock in
+        # followed by a clock out in the same batch still applies in order.
+        # Returns, per op, clock_in's bool or clock_out's (duration, user's
+        # new total seconds) / None.
+        results = [None] * len(ops)
+        waves = []
+        for index, op in enumerate(ops):
+            for wave in waves:
+                if op[1] not in wave:
+                    wave[op[1]] = index
+                    break
+            else:
+                waves.append({op[1]: index})
+        
+        conn = self.get_connection()
+        try:
+            cursor = conn.cursor()
+            for wave in waves:
+                clock_ins = [ops[i] for i in wave.values() if ops[i][0] == 'clock_in']
+                clock_outs = [ops[i] for i in wave.values() if ops[i][0] == 'clock_out']
+                
+                if clock_ins:
+                    rows = execute_values(cursor, f'''
+                        WITH v (user_id, username, clock_in_time) AS (VALUES %s),
+                        new_users AS (SELECT user_id, username FROM v),
+                        named AS ({_UPSERT_USER})
+                        INSERT INTO shifts (user_id, clock_in_time, is_active)
+                        SELECT v.user_id, v.clock_in_time, TRUE
+                        FROM v
+                        WHERE NOT EXISTS (
+                            SELECT 1 FROM shifts s WHERE s.user_id = v.user_id AND s.is_active = TRUE
+                        )
+                        RETURNING user_id
+                    ''', [(op[1], op[2], op[3]) for op in clock_ins],
+                        template='(%s, %s, %s::TIMESTAMP)', fetch=True)
+                    inserted = {row[0] for row in rows}
+                    for op in clock_ins:
+                        results[wave[op[1]]] = op[1] in inserted
+                
+                if clock_outs:
+                    # The subqueries see the tables as they were before this
+                    # UPDATE, so the new total is the old completed total
+                    # (live plus archived) plus this shift.
+                    rows = execute_values(cursor, '''
+                        UPDATE shifts s
+                        SET clock_out_time = v.clock_out_time,
+                            duration_seconds = FLOOR(EXTRACT(EPOCH FROM (v.clock_out_time - s.clock_in_time)))::INTEGER,
+                            is_active = FALSE
+                        FROM (VALUES %s) AS v(user_id, clock_out_time)
+                        WHERE s.user_id = v.user_id AND s.is_active = TRUE
+                        RETURNING s.user_id, s.duration_seconds, s.duration_seconds + (
+                            SELECT COALESCE(SUM(t.duration_seconds), 0) FROM shifts t
+                            WHERE t.user_id = s.user_id AND t.is_active = FALSE AND t.duration_seconds IS NOT NULL
+                        ) + (
+                            SELECT COALESCE(SUM(a.total_seconds), 0) FROM shift_archive_totals a
+                            WHERE a.user_id = s.user_id
+                        )
+                    ''', [(op[1], op[3]) for op in clock_outs],
+                        template='(%s, %s::TIMESTAMP)', fetch=True)
+                    closed = {user_id: (duration, int(total)) for user_id, duration, total in rows}
+                    for op in clock_outs:
+                        results[wave[op[1]]] = closed.get(op[1])
+            
+            conn.commit()
+            return results
+        except Exception:
+            conn.rollback()
+            raise
+        finally:
+            cursor.close()
+            self.return_connection(conn)
+    
     def is_clocked_in(self, user_id: str) -> bool:
         conn = self.get_connection()
         try:
@@ -144,10 +423,11 @@ class ShiftDatabase:
         try:
             cursor = conn.cursor(cursor_factory=RealDictCursor)
             cursor.execute('''
-                SELECT user_id, username, clock_in_time
-                FROM shifts
-                WHERE is_active = TRUE
-                ORDER BY clock_in_time ASC
+                SELECT s.user_id, COALESCE(u.username, s.user_id) AS username, s.clock_in_time
+                FROM shifts s
+                LEFT JOIN users u ON u.user_id = s.user_id
+                WHERE s.is_active = TRUE
+                ORDER BY s.clock_in_time ASC
             ''')
             
             results = []
@@ -163,17 +443,66 @@ class ShiftDatabase:
             cursor.close()
             self.return_connection(conn)
     
-    def get_leaderboard(self, limit: int = 10) -> List[Dict]:
+    def close_stale_shifts(self, max_seconds: int) -> List[Dict]:
+        # Finds and closes every shift open longer than ``max_seconds`` in
+        # one statement, capping its duration at ``max_seconds``.
         conn = self.get_connection()
         try:
             cursor = conn.cursor(cursor_factory=RealDictCursor)
             cursor.execute('''
-                SELECT user_id, username, SUM(duration_seconds) as total_seconds
-                FROM shifts
-                WHERE is_active = FALSE AND duration_seconds IS NOT NULL
-                GROUP BY user_id, username
-                ORDER BY total_seconds DESC
-                LIMIT %s
+                WITH closed AS (
+                    UPDATE shifts
+                    SET clock_out_time = clock_in_time + make_interval(secs => %s),
+                        duration_seconds = %s,
+                        is_active = FALSE
+                    WHERE is_active = TRUE AND clock_in_time < %s
+                    RETURNING user_id, clock_in_time
+                )
+                SELECT c.user_id, COALESCE(u.username, c.user_id) AS username, c.clock_in_time
+                FROM closed c
+                LEFT JOIN users u ON u.user_id = c.user_id
+            ''', (max_seconds, max_seconds, datetime.utcnow() - timedelta(seconds=max_seconds)))
+            
+            results = []
+            for row in cursor.fetchall():
+                results.append({
+                    'user_id': row['user_id'],
+                    'username': row['username'],
+                    'clock_in_time': row['clock_in_time'].isoformat()
+                })
+            
+            conn.commit()
+            return results
+        finally:
+            cursor.close()
+            self.return_connection(conn)
+    
+    def get_leaderboard(self, limit: Optional[int] = 10) -> List[Dict]:
+        # limit=None returns every user's total.
+        conn = self.get_connection()
+        try:
+            cursor = conn.cursor(cursor_factory=RealDictCursor)
+            # Live shifts plus the summaries of archived partitions.
+            cursor.execute('''
+                SELECT totals.user_id, COALESCE(u.username, totals.user_id) AS username, totals.total_seconds
+                FROM (
+                    SELECT user_id, SUM(seconds) AS total_seconds
+                    FROM (
+                        SELECT user_id, SUM(duration_seconds) AS seconds
+                        FROM shifts
+                        WHERE is_active = FALSE AND duration_seconds IS NOT NULL
+                        GROUP BY user_id
+                        UNION ALL
+                        SELECT user_id, SUM(total_seconds) AS seconds
+                        FROM shift_archive_totals
+                        GROUP BY user_id
+                    ) by_source
+                    GROUP BY user_id
+                    ORDER BY total_seconds DESC
+                    LIMIT %s
+                ) totals
+                LEFT JOIN users u ON u.user_id = totals.user_id
+                ORDER BY totals.total_seconds DESC
             ''', (limit,))
             
             results = []
@@ -189,21 +518,465 @@ class ShiftDatabase:
             cursor.close()
             self.return_connection(conn)
     
-    def get_user_total_time(self, user_id: str) -> int:
+    def rename_users(self, usernames: Dict[str, str]) -> int:
+        # Applies Discord username changes to users who already have a row;
+        # members who have never clocked in aren't added. Returns rows changed.
+        if not usernames:
+            return 0
+        conn = self.get_connection()
+        try:
+            cursor = conn.cursor()
+            changed = execute_values(cursor, '''
+                UPDATE users u
+                SET username = v.username, updated_at = NOW() AT TIME ZONE 'utc'
+                FROM (VALUES %s) AS v(user_id, username)
+                WHERE u.user_id = v.user_id AND u.username IS DISTINCT FROM v.username
+                RETURNING u.user_id
+            ''', list(usernames.items()), page_size=1000, fetch=True)
+            conn.commit()
+            return len(changed)
+        finally:
+            cursor.close()
+            self.return_connection(conn)
+    
+    def get_team_total_since(self, since: datetime) -> int:
+        # Completed shifts that started since ``since``; only the partitions
+        # from that month on are scanned.
         conn = self.get_connection()
         try:
             cursor = conn.cursor()
             cursor.execute('''
                 SELECT COALESCE(SUM(duration_seconds), 0)
                 FROM shifts
-                WHERE user_id = %s AND is_active = FALSE AND duration_seconds IS NOT NULL
-            ''', (user_id,))
+                WHERE is_active = FALSE AND clock_in_time >= %s
+            ''', (since,))
             
             return int(cursor.fetchone()[0])
         finally:
             cursor.close()
             self.return_connection(conn)
     
+    def get_user_total_time(self, user_id: str) -> int:
+        conn = self.get_connection()
+        try:
+            cursor = conn.cursor()
+            cursor.execute('''
+                SELECT
+                    (SELECT COALESCE(SUM(duration_seconds), 0)
+                     FROM shifts
+                     WHERE user_id = %s AND is_active = FALSE AND duration_seconds IS NOT NULL)
+                  + (SELECT COALESCE(SUM(total_seconds), 0)
+                     FROM shift_archive_totals
+                     WHERE user_id = %s)
+            ''', (user_id, user_id))
+            
+            return int(cursor.fetchone()[0])
+        finally:
+            cursor.close()
+            self.return_connection(conn)
+    
+    def get_user_shift_history(self, user_id: str) -> Dict:
+        # Live shifts as two parallel arrays (clock-in epochs, durations) so
+        # the whole history arrives as a single columnar batch, plus whether
+        # the user is clocked in right now and their archived totals, so
+        # /mystats needs no second query.
+        conn = self.get_connection()
+        try:
+            cursor = conn.cursor()
+            cursor.execute('''
+                SELECT
+                    COALESCE(array_agg(EXTRACT(EPOCH FROM clock_in_time)::BIGINT ORDER BY clock_in_time)
+                        FILTER (WHERE is_active = FALSE AND duration_seconds IS NOT NULL), '{}'),
+                    COALESCE(array_agg(duration_seconds ORDER BY clock_in_time)
+                        FILTER (WHERE is_active = FALSE AND duration_seconds IS NOT NULL), '{}'),
+                    COALESCE(bool_or(is_active), FALSE),
+                    (SELECT COALESCE(SUM(shift_count), 0) FROM shift_archive_totals WHERE user_id = %s),
+                    (SELECT COALESCE(SUM(total_seconds), 0) FROM shift_archive_totals WHERE user_id = %s)
+                FROM shifts
+                WHERE user_id = %s
+            ''', (user_id, user_id, user_id))
+
+            starts, durations, clocked_in, archived_shifts, archived_seconds = cursor.fetchone()
+            return {
+                'starts': starts,
+                'durations': durations,
+                'clocked_in': clocked_in,
+                'archived_shifts': int(archived_shifts),
+                'archived_seconds': int(archived_seconds),
+            }
+        finally:
+            cursor.close()
+            self.return_connection(conn)
+
+    def get_team_shift_history(self, since: datetime, until: datetime) -> Tuple[List[int], List[int]]:
+        # Shifts that may overlap [since, until), as parallel arrays. Active
+        # shifts count up to ``until``; a day of lookback catches overnight
+        # shifts that started before the window.
+        conn = self.get_connection()
+        try:
+            cursor = conn.cursor()
+            cursor.execute('''
+                SELECT
+                    COALESCE(array_agg(EXTRACT(EPOCH FROM clock_in_time)::BIGINT), '{}'),
+                    COALESCE(array_agg(
+                        CASE WHEN is_active
+                            THEN GREATEST(EXTRACT(EPOCH FROM (%s - clock_in_time))::INTEGER, 0)
+                            ELSE duration_seconds
+                        END
+                    ), '{}')
+                FROM shifts
+                WHERE clock_in_time >= %s - INTERVAL '1 day' AND clock_in_time < %s
+                  AND (is_active = TRUE OR duration_seconds IS NOT NULL)
+            ''', (until, since, until))
+
+            starts, durations = cursor.fetchone()
+            return starts, durations
+        finally:
+            cursor.close()
+            self.return_connection(conn)
+
+    def iter_shifts(self, start: datetime, end: datetime, batch_size: int = 2000) -> Iterator[List[tuple]]:
+        # Named cursor = server-side cursor: only one batch of rows is ever
+        # held in memory, however much history is being exported.
+        conn = self.get_connection()
+        cursor = conn.cursor(name='export_shifts')
+        cursor.itersize = batch_size
+        try:
+            cursor.execute('''
+                SELECT s.id, s.user_id, COALESCE(u.username, s.user_id), s.clock_in_time, s.clock_out_time,
+                       s.duration_seconds, s.is_active
+                FROM shifts s
+                LEFT JOIN users u ON u.user_id = s.user_id
+                WHERE s.clock_in_time >= %s AND s.clock_in_time < %s
+                ORDER BY s.clock_in_time ASC, s.id ASC
+            ''', (start, end))
+
+            while True:
+                rows = list(islice(cursor, batch_size))
+                if not rows:
+                    break
+                yield rows
+        finally:
+            cursor.close()
+            conn.rollback()
+            self.return_connection(conn)
+
+    def get_shift_partitions(self) -> List[str]:
+        conn = self.get_connection()
+        try:
+            cursor = conn.cursor()
+            cursor.execute('''
+                SELECT c.relname
+                FROM pg_inherits i
+                JOIN pg_class c ON c.oid = i.inhrelid
+                WHERE i.inhparent = 'shifts'::regclass
+                ORDER BY c.relname
+            ''')
+            
+            return [row[0] for row in cursor.fetchall()]
+        finally:
+            cursor.close()
+            self.return_connection(conn)
+    
+    def ensure_shift_partitions(self, months_ahead: int = 3) -> List[str]:
+        # Creates any missing monthly partitions from this month through
+        # ``months_ahead`` months ahead; returns the names created.
+        existing = set(self.get_shift_partitions())
+        this_month = datetime.utcnow().date().replace(day=1)
+        
+        conn = self.get_connection()
+        try:
+            cursor = conn.cursor()
+            created = []
+            for offset in range(months_ahead + 1):
+                month = _add_months(this_month, offset)
+                name = month.strftime(PARTITION_FORMAT)
+                if name in existing:
+                    continue
+                cursor.execute(
+                    f'CREATE TABLE IF NOT EXISTS "{name}" PARTITION OF shifts FOR VALUES FROM (%s) TO (%s)',
+                    (month, _add_months(month, 1))
+                )
+                created.append(name)
+            
+            conn.commit()
+            return created
+        except Exception:
+            conn.rollback()
+            raise
+        finally:
+            cursor.close()
+            self.return_connection(conn)
+    
+    def archive_shift_partitions(self, keep_months: int) -> List[str]:
+        # Folds every monthly partition older than ``keep_months`` months into
+        # shift_archive_totals and detaches it, oldest first. Detached tables
+        # are kept as shifts_archived_YYYY_MM (reattachable, droppable).
+        # Partitions that still hold an active shift are left alone.
+        cutoff = _add_months(datetime.utcnow().date().replace(day=1), -keep_months)
+        candidates = []
+        for name in self.get_shift_partitions():
+            try:
+                month = datetime.strptime(name, PARTITION_FORMAT).date()
+            except ValueError:
+                continue
+            if month < cutoff:
+                candidates.append((month, name))
+        
+        conn = self.get_connection()
+        try:
+            cursor = conn.cursor()
+            archived = []
+            for month, name in candidates:
+                cursor.execute(f'SELECT EXISTS (SELECT 1 FROM "{name}" WHERE is_active = TRUE)')
+                if cursor.fetchone()[0]:
+                    conn.rollback()
+                    continue
+                
+                # DETACH briefly locks all of shifts; give up rather than queue
+                # behind a long query and stall every clock in behind us.
+                cursor.execute("SET LOCAL lock_timeout = '5s'")
+                cursor.execute(f'''
+                    INSERT INTO shift_archive_totals (month, user_id, shift_count, total_seconds)
+                    SELECT %s, user_id, COUNT(*), SUM(duration_seconds)
+                    FROM "{name}"
+                    WHERE is_active = FALSE AND duration_seconds IS NOT NULL
+                    GROUP BY user_id
+                    ON CONFLICT (month, user_id) DO UPDATE
+                    SET shift_count = shift_archive_totals.shift_count + EXCLUDED.shift_count,
+                        total_seconds = shift_archive_totals.total_seconds + EXCLUDED.total_seconds
+                ''', (month,))
+                cursor.execute(f'ALTER TABLE shifts DETACH PARTITION "{name}"')
+                cursor.execute(f'ALTER TABLE "{name}" RENAME TO "{month.strftime(ARCHIVED_PARTITION_FORMAT)}"')
+                conn.commit()
+                archived.append(name)
+            
+            return archived
+        except Exception:
+            conn.rollback()
+            raise
+        finally:
+            cursor.close()
+            self.return_connection(conn)
+    
+    def link_roblox_account(self, discord_user_id: str, roblox_user_id: int, roblox_username: str) -> bool:
+        # False if that Roblox account is already linked to someone else.
+        conn = self.get_connection()
+        try:
+            cursor = conn.cursor()
+            cursor.execute('''
+                INSERT INTO roblox_links (discord_user_id, roblox_user_id, roblox_username)
+                VALUES (%s, %s, %s)
+                ON CONFLICT (discord_user_id) DO UPDATE
+                SET roblox_user_id = EXCLUDED.roblox_user_id,
+                    roblox_username = EXCLUDED.roblox_username,
+                    linked_at = NOW() AT TIME ZONE 'utc'
+            ''', (discord_user_id, roblox_user_id, roblox_username))
+            conn.commit()
+            return True
+        except psycopg2.errors.UniqueViolation:
+            conn.rollback()
+            return False
+        finally:
+            cursor.close()
+            self.return_connection(conn)
+    
+    def unlink_roblox_account(self, discord_user_id: str) -> bool:
+        conn = self.get_connection()
+        try:
+            cursor = conn.cursor()
+            cursor.execute('DELETE FROM roblox_links WHERE discord_user_id = %s', (discord_user_id,))
+            conn.commit()
+            return cursor.rowcount > 0
+        finally:
+            cursor.close()
+            self.return_connection(conn)
+    
+    def get_active_roblox_links(self) -> Dict[str, int]:
+        # Discord user ID -> Roblox user ID for everyone clocked in with a linked account.
+        conn = self.get_connection()
+        try:
+            cursor = conn.cursor()
+            cursor.execute('''
+                SELECT s.user_id, l.roblox_user_id
+                FROM shifts s
+                JOIN roblox_links l ON l.discord_user_id = s.user_id
+                WHERE s.is_active = TRUE
+            ''')
+            
+            return {user_id: roblox_user_id for user_id, roblox_user_id in cursor.fetchall()}
+        finally:
+            cursor.close()
+            self.return_connection(conn)
+    
+    def record_ban(self, roblox_user_id: int, roblox_username: str, reason: str,
+                   moderator_id: str, moderator_name: str, duration_seconds: Optional[int] = None):
+        # duration_seconds None means permanent.
+        conn = self.get_connection()
+        try:
+            cursor = conn.cursor()
+            cursor.execute('''
+                INSERT INTO bans (roblox_user_id, roblox_username, active, reason, moderator_id, moderator_name,
+                                  banned_at, expires_at, source)
+                VALUES (%s, %s, TRUE, %s, %s, %s, NOW() AT TIME ZONE 'utc',
+                        NOW() AT TIME ZONE 'utc' + %s::INTEGER * INTERVAL '1 second', 'bot')
+                ON CONFLICT (roblox_user_id) DO UPDATE
+                SET roblox_username = EXCLUDED.roblox_username,
+                    active = TRUE,
+                    reason = EXCLUDED.reason,
+                    moderator_id = EXCLUDED.moderator_id,
+                    moderator_name = EXCLUDED.moderator_name,
+                    banned_at = EXCLUDED.banned_at,
+                    expires_at = EXCLUDED.expires_at,
+                    unbanned_at = NULL,
+                    unbanned_by = NULL,
+                    source = 'bot'
+            ''', (roblox_user_id, roblox_username, reason, moderator_id, moderator_name, duration_seconds))
+            conn.commit()
+        finally:
+            cursor.close()
+            self.return_connection(conn)
+    
+    def record_unban(self, roblox_user_id: int, roblox_username: str, moderator_name: str):
+        conn = self.get_connection()
+        try:
+            cursor = conn.cursor()
+            cursor.execute('''
+                INSERT INTO bans (roblox_user_id, roblox_username, active, unbanned_at, unbanned_by, source)
+                VALUES (%s, %s, FALSE, NOW() AT TIME ZONE 'utc', %s, 'bot')
+                ON CONFLICT (roblox_user_id) DO UPDATE
+                SET roblox_username = EXCLUDED.roblox_username,
+                    active = FALSE,
+                    unbanned_at = EXCLUDED.unbanned_at,
+                    unbanned_by = EXCLUDED.unbanned_by,
+                    source = 'bot'
+            ''', (roblox_user_id, roblox_username, moderator_name))
+            conn.commit()
+        finally:
+            cursor.close()
+            self.return_connection(conn)
+    
+    def sync_bans(self, restrictions: List[tuple], started_at: datetime) -> Dict:
+        # Reconciles the ledger with the universe's full user-restrictions
+        # list: (roblox_user_id, active, reason, banned_at, expires_at) rows,
+        # fetched from Roblox starting at started_at (naive UTC). Rows the
+        # bot wrote after that are newer than the list and are left alone.
+        # Returns how many bans were new, how many local bans Roblox no
+        # longer has (lifted), and the user IDs still missing a username.
+        conn = self.get_connection()
+        try:
+            cursor = conn.cursor()
+            rows = []
+            if restrictions:
+                rows = execute_values(cursor, '''
+                    INSERT INTO bans AS b (roblox_user_id, active, reason, banned_at, expires_at, source, synced_at,
+                                           unbanned_at, unbanned_by)
+                    SELECT v.roblox_user_id, v.active, v.reason, v.banned_at, v.expires_at, 'sync', v.synced_at,
+                           CASE WHEN v.active THEN NULL ELSE v.synced_at END,
+                           CASE WHEN v.active THEN NULL ELSE 'Roblox' END
+                    FROM (VALUES %s) AS v(roblox_user_id, active, reason, banned_at, expires_at, synced_at)
+                    ON CONFLICT (roblox_user_id) DO UPDATE
+                    SET active = EXCLUDED.active,
+                        reason = COALESCE(EXCLUDED.reason, b.reason),
+                        banned_at = COALESCE(EXCLUDED.banned_at, b.banned_at),
+                        expires_at = EXCLUDED.expires_at,
+                        -- A ban or unban made outside the bot: nobody here did it.
+                        moderator_id = CASE WHEN b.active = EXCLUDED.active THEN b.moderator_id END,
+                        moderator_name = CASE WHEN b.active = EXCLUDED.active THEN b.moderator_name END,
+                        unbanned_at = CASE WHEN b.active = EXCLUDED.active THEN b.unbanned_at ELSE EXCLUDED.unbanned_at END,
+                        unbanned_by = CASE WHEN b.active = EXCLUDED.active THEN b.unbanned_by ELSE EXCLUDED.unbanned_by END,
+                        source = CASE WHEN b.active = EXCLUDED.active THEN b.source ELSE 'sync' END,
+                        synced_at = EXCLUDED.synced_at
+                    WHERE COALESCE(b.unbanned_at, b.banned_at, '-infinity') < EXCLUDED.synced_at
+                    RETURNING b.roblox_user_id, (b.xmax = 0) AS inserted, b.roblox_username IS NULL AS unnamed
+                ''', [(*restriction, started_at) for restriction in restrictions],
+                    template='(%s::BIGINT, %s, %s, %s::TIMESTAMP, %s::TIMESTAMP, %s::TIMESTAMP)', fetch=True)
+            
+            cursor.execute('''
+                UPDATE bans
+                SET active = FALSE, unbanned_at = %s, unbanned_by = 'Roblox', source = 'sync', synced_at = %s
+                WHERE active = TRUE
+                  AND synced_at IS DISTINCT FROM %s
+                  AND COALESCE(banned_at, '-infinity') < %s
+                RETURNING roblox_user_id
+            ''', (started_at, started_at, started_at, started_at))
+            lifted = cursor.rowcount
+            conn.commit()
+            
+            return {
+                'fetched': len(restrictions),
+                'added': sum(1 for row in rows if row[1]),
+                'lifted': lifted,
+                'unnamed': [row[0] for row in rows if row[2]],
+            }
+        except Exception:
+            conn.rollback()
+            raise
+        finally:
+            cursor.close()
+            self.return_connection(conn)
+    
+    def set_ban_usernames(self, usernames: Dict[int, str]):
+        if not usernames:
+            return
+        conn = self.get_connection()
+        try:
+            cursor = conn.cursor()
+            execute_values(cursor, '''
+                UPDATE bans b SET roblox_username = v.roblox_username
+                FROM (VALUES %s) AS v(roblox_user_id, roblox_username)
+                WHERE b.roblox_user_id = v.roblox_user_id
+            ''', list(usernames.items()), template='(%s::BIGINT, %s)')
+            conn.commit()
+        finally:
+            cursor.close()
+            self.return_connection(conn)
+    
+    def get_ban(self, roblox_user_id: Optional[int] = None, roblox_username: Optional[str] = None) -> Optional[Dict]:
+        conn = self.get_connection()
+        try:
+            cursor = conn.cursor(cursor_factory=RealDictCursor)
+            if roblox_user_id is not None:
+                cursor.execute('SELECT * FROM bans WHERE roblox_user_id = %s', (roblox_user_id,))
+            else:
+                cursor.execute('SELECT * FROM bans WHERE LOWER(roblox_username) = LOWER(%s)', (roblox_username,))
+            
+            row = cursor.fetchone()
+            return dict(row) if row else None
+        finally:
+            cursor.close()
+            self.return_connection(conn)
+    
+    def get_active_bans(self, moderator_id: Optional[str] = None, limit: int = 15, offset: int = 0) -> Tuple[List[Dict], int]:
+        # Bans in force (not lifted, not expired), soonest-expiring first, or
+        # newest first for one moderator. Returns a page and the total.
+        conn = self.get_connection()
+        try:
+            cursor = conn.cursor(cursor_factory=RealDictCursor)
+            if moderator_id is None:
+                cursor.execute('''
+                    SELECT *, COUNT(*) OVER () AS total
+                    FROM bans
+                    WHERE active = TRUE AND (expires_at IS NULL OR expires_at > NOW() AT TIME ZONE 'utc')
+                    ORDER BY expires_at NULLS LAST, roblox_user_id
+                    LIMIT %s OFFSET %s
+                ''', (limit, offset))
+            else:
+                cursor.execute('''
+                    SELECT *, COUNT(*) OVER () AS total
+                    FROM bans
+                    WHERE moderator_id = %s
+                      AND active = TRUE AND (expires_at IS NULL OR expires_at > NOW() AT TIME ZONE 'utc')
+                    ORDER BY banned_at DESC, roblox_user_id
+                    LIMIT %s OFFSET %s
+                ''', (moderator_id, limit, offset))
+            
+            rows = [dict(row) for row in cursor.fetchall()]
+            return rows, rows[0]['total'] if rows else 0
+        finally:
+            cursor.close()
+            self.return_connection(conn)
+    
     def save_config(self, key: str, value: str):
         conn = self.get_connection()
         try:
@@ -243,6 +1016,38 @@ class ShiftDatabase:
             cursor.close()
             self.return_connection(conn)
     
+    def get_job_runs(self) -> Dict[str, datetime]:
+        conn = self.get_connection()
+        try:
+            cursor = conn.cursor()
+            cursor.execute('SELECT name, last_run FROM scheduled_jobs')
+            
+            return {row[0]: row[1] for row in cursor.fetchall()}
+        finally:
+            cursor.close()
+            self.return_connection(conn)
+    
+    def claim_job_run(self, name: str, scheduled_for: datetime) -> bool:
+        # Only advances last_run forwards, so exactly one caller wins each
+        # scheduled slot even if several processes try to run it.
+        conn = self.get_connection()
+        try:
+            cursor = conn.cursor()
+            cursor.execute('''
+                INSERT INTO scheduled_jobs (name, last_run)
+                VALUES (%s, %s)
+                ON CONFLICT (name) DO UPDATE SET last_run = EXCLUDED.last_run
+                WHERE scheduled_jobs.last_run < EXCLUDED.last_run
+                RETURNING name
+            ''', (name, scheduled_for))
+            
+            claimed = cursor.fetchone() is not None
+            conn.commit()
+            return claimed
+        finally:
+            cursor.close()
+            self.return_connection(conn)
+    
     def add_warning(self, user_id: str, username: str, moderator_id: str, moderator_name: str, reason: str):
         conn = self.get_connection()
         try:
@@ -294,6 +1099,23 @@ class ShiftDatabase:
             cursor.close()
             self.return_connection(conn)
     
+    def get_warning_counts(self) -> List[Dict]:
+        conn = self.get_connection()
+        try:
+            cursor = conn.cursor(cursor_factory=RealDictCursor)
+            cursor.execute('''
+                SELECT user_id, (ARRAY_AGG(username ORDER BY timestamp DESC))[1] AS username,
+                       COUNT(*) AS warning_count
+                FROM warnings
+                GROUP BY user_id
+                ORDER BY warning_count DESC, user_id
+            ''')
+            
+            return [dict(row) for row in cursor.fetchall()]
+        finally:
+            cursor.close()
+            self.return_connection(conn)
+    
     def clear_warnings(self, user_id: str):
         conn = self.get_connection()
         try:
@@ -306,6 +1128,131 @@ class ShiftDatabase:
             cursor.close()
             self.return_connection(conn)
     
+    def enqueue_moderation_job(self, kind: str, payload: Dict, idempotency_key: str, max_attempts: int) -> Tuple[int, bool]:
+        # (job ID, whether it was new). A key that was already enqueued,
+        # finished or not, returns the existing job instead.
+        conn = self.get_connection()
+        try:
+            cursor = conn.cursor()
+            cursor.execute('''
+                WITH inserted AS (
+                    INSERT INTO moderation_jobs (kind, payload, idempotency_key, max_attempts)
+                    VALUES (%s, %s, %s, %s)
+                    ON CONFLICT (idempotency_key) DO NOTHING
+                    RETURNING id
+                )
+                SELECT id, TRUE FROM inserted
+                UNION ALL
+                SELECT id, FALSE FROM moderation_jobs WHERE idempotency_key = %s
+                LIMIT 1
+            ''', (kind, Json(payload), idempotency_key, max_attempts, idempotency_key))
+
+            row = cursor.fetchone()
+            if row is None:
+                # Lost a race with a concurrent enqueue of the same key, which
+                # committed after this statement's snapshot was taken.
+                cursor.execute('SELECT id, FALSE FROM moderation_jobs WHERE idempotency_key = %s', (idempotency_key,))
+                row = cursor.fetchone()
+            job_id, created = row
+            conn.commit()
+            return job_id, created
+        finally:
+            cursor.close()
+            self.return_connection(conn)
+    
+    def claim_moderation_jobs(self, limit: int, lease_seconds: float) -> List[Dict]:
+        # Leases up to ``limit`` due jobs and counts the attempt. SKIP LOCKED
+        # lets several workers (or processes) claim at once without waiting
+        # on each other; the lease keeps a claimed job from being handed out
+        # again until it runs out.
+        conn = self.get_connection()
+        try:
+            cursor = conn.cursor(cursor_factory=RealDictCursor)
+            cursor.execute('''
+                UPDATE moderation_jobs j
+                SET attempts = j.attempts + 1,
+                    locked_until = NOW() AT TIME ZONE 'utc' + %s * INTERVAL '1 second'
+                FROM (
+                    SELECT id FROM moderation_jobs
+                    WHERE completed_at IS NULL
+                      AND run_after <= NOW() AT TIME ZONE 'utc'
+                      AND (locked_until IS NULL OR locked_until < NOW() AT TIME ZONE 'utc')
+                    ORDER BY run_after, id
+                    LIMIT %s
+                    FOR UPDATE SKIP LOCKED
+                ) due
+                WHERE j.id = due.id
+                RETURNING j.id, j.kind, j.payload, j.idempotency_key, j.attempts, j.max_attempts
+            ''', (lease_seconds, limit))
+            
+            jobs = [dict(row) for row in cursor.fetchall()]
+            conn.commit()
+            return jobs
+        finally:
+            cursor.close()
+            self.return_connection(conn)
+    
+    def complete_moderation_job(self, job_id: int):
+        conn = self.get_connection()
+        try:
+            cursor = conn.cursor()
+            cursor.execute('''
+                UPDATE moderation_jobs
+                SET completed_at = NOW() AT TIME ZONE 'utc', locked_until = NULL, last_error = NULL
+                WHERE id = %s
+            ''', (job_id,))
+            conn.commit()
+        finally:
+            cursor.close()
+            self.return_connection(conn)
+    
+    def retry_moderation_job(self, job_id: int, delay_seconds: float, error: str):
+        conn = self.get_connection()
+        try:
+            cursor = conn.cursor()
+            cursor.execute('''
+                UPDATE moderation_jobs
+                SET run_after = NOW() AT TIME ZONE 'utc' + %s * INTERVAL '1 second',
+                    locked_until = NULL,
+                    last_error = %s
+                WHERE id = %s
+            ''', (delay_seconds, error, job_id))
+            conn.commit()
+        finally:
+            cursor.close()
+            self.return_connection(conn)
+    
+    def dead_letter_moderation_job(self, job_id: int, error: str):
+        conn = self.get_connection()
+        try:
+            cursor = conn.cursor()
+            cursor.execute('''
+                WITH moved AS (
+                    DELETE FROM moderation_jobs WHERE id = %s
+                    RETURNING id, kind, payload, idempotency_key, attempts, created_at
+                )
+                INSERT INTO moderation_dead_letters (id, kind, payload, idempotency_key, attempts, last_error, created_at)
+                SELECT id, kind, payload, idempotency_key, attempts, %s, created_at FROM moved
+            ''', (job_id, error))
+            conn.commit()
+        finally:
+            cursor.close()
+            self.return_connection(conn)
+    
+    def prune_moderation_jobs(self, older_than: datetime) -> int:
+        # Completed jobs only matter while their idempotency key might be reused.
+        conn = self.get_connection()
+        try:
+            cursor = conn.cursor()
+            cursor.execute('''
+                DELETE FROM moderation_jobs WHERE completed_at < %s
+            ''', (older_than,))
+            conn.commit()
+            return cursor.rowcount
+        finally:
+            cursor.close()
+            self.return_connection(conn)
+    
     def close(self):
         if self.connection_pool:
             self.connection_pool.closeall()
@@ -0,0 +1,148 @@
+import asyncio
+import logging
+import time
+from datetime import datetime
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Type, TypeVar
+
+from log_config import correlation_id
+
+logger = logging.getLogger(__name__)
+
+SUBSCRIBER_QUEUE_SIZE = 1000
+
+
+class ShiftClockedIn:
+    __slots__ = ('user_id', 'username', 'member', 'at', 'journaled')
+
+    def __init__(self, user_id: str, username: str, member: Optional[Any], at: datetime, journaled: bool = False):
+        self.user_id = user_id
+        self.username = username
+        # The discord.Member when the bot has one; role and log subscribers need it.
+        self.member = member
+        self.at = at
+        self.journaled = journaled
+
+
+class ShiftClockedOut:
+    __slots__ = ('user_id', 'username', 'member', 'at', 'duration', 'total_time', 'journaled', 'forced_by', 'automatic')
+
+    def __init__(self, user_id: str, username: str, member: Optional[Any], at: datetime,
+                 duration: Optional[int], total_time: Optional[int] = None, journaled: bool = False,
+                 forced_by: Optional[Any] = None, automatic: bool = False):
+        self.user_id = user_id
+        self.username = username
+        self.member = member
+        self.at = at
+        # None while the clock-in time is only known to the journal.
+        self.duration = duration
+        self.total_time = total_time
+        self.journaled = journaled
+        # The admin who ran /force_clockout, or automatic=True for the
+        # stale-shift sweep.
+        self.forced_by = forced_by
+        self.automatic = automatic
+
+
+E = TypeVar('E')
+Handler = Callable[[Any], Awaitable[None]]
+
+
+class _Subscriber:
+    def __init__(self, name: str, coalesce: bool):
+        self.name = name
+        self.coalesce = coalesce
+        self.handlers: Dict[type, Handler] = {}
+        self.queue: asyncio.Queue = asyncio.Queue(SUBSCRIBER_QUEUE_SIZE)
+        self.task: Optional[asyncio.Task] = None
+        self.processed = 0
+        self.failed = 0
+        self.dropped = 0
+        self.max_lag_ms = 0.0
+
+
+class EventBus:
+    """Fans events out to named subscribers, each with its own queue and worker task.
+
+    ``publish`` only enqueues, so the caller (a button handler that has
+    already answered the interaction) never waits on a side effect. A
+    subscriber sees its events in publish order; one that fails or hangs
+    holds up only itself. With ``coalesce=True`` a subscriber that falls
+    behind handles only the newest of its queued events.
+    """
+
+    def __init__(self):
+        self._subscribers: Dict[str, _Subscriber] = {}
+
+    def subscribe(self, event_type: Type[E], name: str, handler: Callable[[E], Awaitable[None]],
+                  coalesce: bool = False):
+        subscriber = self._subscribers.get(name)
+        if subscriber is None:
+            subscriber = self._subscribers[name] = _Subscriber(name, coalesce)
+        subscriber.handlers[event_type] = handler
+
+    def publish(self, event):
+        # The correlation ID travels with the event so the handlers' logs
+        # tie back to the interaction that caused them.
+        envelope = (event, time.monotonic(), correlation_id.get())
+        for subscriber in self._subscribers.values():
+            if type(event) not in subscriber.handlers:
+                continue
+            try:
+                subscriber.queue.put_nowait(envelope)
+            except asyncio.QueueFull:
+                subscriber.dropped += 1
+                logger.warning(f"Event subscriber {subscriber.name} is {SUBSCRIBER_QUEUE_SIZE} events behind, "
+                               f"dropped {type(event).__name__}")
+
+    def start(self):
+        for subscriber in self._subscribers.values():
+            if subscriber.task is None or subscriber.task.done():
+                subscriber.task = asyncio.create_task(self._work(subscriber), name=f"events:{subscriber.name}")
+
+    async def join(self):
+        """Wait until every event published so far has been handled."""
+        await asyncio.gather(*(subscriber.queue.join() for subscriber in self._subscribers.values()
+                               if subscriber.task is not None))
+
+    async def stop(self):
+        for subscriber in self._subscribers.values():
+            if subscriber.task is not None:
+                subscriber.task.cancel()
+        await asyncio.gather(*(subscriber.task for subscriber in self._subscribers.values() if subscriber.task),
+                             return_exceptions=True)
+
+    async def _work(self, subscriber: _Subscriber):
+        while True:
+            envelope = await subscriber.queue.get()
+            handled = 1
+            if subscriber.coalesce:
+                while not subscriber.queue.empty():
+                    envelope = subscriber.queue.get_nowait()
+                    handled += 1
+
+            event, published_at, event_correlation_id = envelope
+            subscriber.max_lag_ms = max(subscriber.max_lag_ms, (time.monotonic() - published_at) * 1000)
+            token = correlation_id.set(event_correlation_id)
+            try:
+                await subscriber.handlers[type(event)](event)
+                subscriber.processed += handled
+            except Exception:
+                subscriber.failed += handled
+                logger.exception(f"Event subscriber {subscriber.name} failed on {type(event).__name__}")
+            finally:
+                correlation_id.reset(token)
+                for _ in range(handled):
+                    subscriber.queue.task_done()
+
+    def summary(self) -> List[Dict]:
+        return [
+            {
+                'name': subscriber.name,
+                'processed': subscriber.processed,
+                'failed': subscriber.failed,
+                'dropped': subscriber.dropped,
+                'queued': subscriber.queue.qsize(),
+                'max_lag_ms': subscriber.max_lag_ms,
+            }
+            for subscriber in self._subscribers.values()
+        ]
@@ -0,0 +1,187 @@
+import asyncio
+import csv
+import gzip
+import io
+import tempfile
+from datetime import datetime, timedelta
+from typing import AsyncIterator, List, Tuple
+
+EXPORT_COLUMNS = [
+    'shift_id', 'user_id', 'username', 'clock_in_time', 'clock_out_time',
+    'duration_seconds', 'is_active'
+]
+EXPORT_FORMATS = ('csv', 'parquet')
+EXPORT_BATCH_SIZE = 2000
+
+CONTENT_TYPES = {
+    'csv': 'text/csv; charset=utf-8',
+    'parquet': 'application/vnd.apache.parquet',
+}
+
+
+def parse_date_range(start: str, end: str) -> Tuple[datetime, datetime]:
+    """Parse inclusive YYYY-MM-DD dates into a half-open UTC range."""
+    start_dt = datetime.strptime(start, '%Y-%m-%d')
+    end_dt = datetime.strptime(end, '%Y-%m-%d') + timedelta(days=1)
+    if end_dt <= start_dt:
+        raise ValueError("End date must not be before start date")
+    return start_dt, end_dt
+
+
+def export_filename(start: datetime, end: datetime, fmt: str) -> str:
+    last_day = end - timedelta(days=1)
+    return f"shifts_{start:%Y%m%d}_{last_day:%Y%m%d}.{fmt}"
+
+
+class CsvChunkWriter:
+    def __init__(self):
+        self._buffer = io.StringIO()
+        self._writer = csv.writer(self._buffer)
+        self._writer.writerow(EXPORT_COLUMNS)
+
+    def write_batch(self, rows: List[tuple]) -> bytes:
+        for row in rows:
+            shift_id, user_id, username, clock_in, clock_out, duration, is_active = row
+            self._writer.writerow([
+                shift_id,
+                user_id,
+                username,
+                clock_in.isoformat(),
+                clock_out.isoformat() if clock_out else '',
+                '' if duration is None else duration,
+                'true' if is_active else 'false',
+            ])
+        return self._drain()
+
+    def close(self) -> bytes:
+        return self._drain()
+
+    def _drain(self) -> bytes:
+        data = self._buffer.getvalue().encode('utf-8')
+        self._buffer.seek(0)
+        self._buffer.truncate()
+        return data
+
+
+class _ChunkSink:
+    # Write-only file object handed to pyarrow so each row group can be
+    # drained and streamed out as soon as it is written.
+    def __init__(self):
+        self._chunks = []
+        self._position = 0
+        self.closed = False
+
+    def write(self, data) -> int:
+        data = bytes(data)
+        self._chunks.append(data)
+        self._position += len(data)
+        return len(data)
+
+    def tell(self) -> int:
+        return self._position
+
+    def flush(self):
+        pass
+
+    def close(self):
+        self.closed = True
+
+    def drain(self) -> bytes:
+        data = b''.join(self._chunks)
+        self._chunks.clear()
+        return data
+
+
+class ParquetChunkWriter:
+    def __init__(self):
+        try:
+            import pyarrow as pa
+            import pyarrow.parquet as pq
+        except ImportError:
+            raise RuntimeError("Parquet export requires the 'pyarrow' package to be installed")
+
+        self._pa = pa
+        self._schema = pa.schema([
+            ('shift_id', pa.int64()),
+            ('user_id', pa.string()),
+            ('username', pa.string()),
+            ('clock_in_time', pa.timestamp('us', tz='UTC')),
+            ('clock_out_time', pa.timestamp('us', tz='UTC')),
+            ('duration_seconds', pa.int32()),
+            ('is_active', pa.bool_()),
+        ])
+        self._sink = _ChunkSink()
+        self._writer = pq.ParquetWriter(
+            pa.PythonFile(self._sink, mode='w'), self._schema, compression='zstd'
+        )
+
+    def write_batch(self, rows: List[tuple]) -> bytes:
+        columns = list(zip(*rows))
+        table = self._pa.Table.from_arrays(
+            [self._pa.array(column, type=field.type) for column, field in zip(columns, self._schema)],
+            schema=self._schema
+        )
+        self._writer.write_table(table)
+        return self._sink.drain()
+
+    def close(self) -> bytes:
+        self._writer.close()
+        return self._sink.drain()
+
+
+def make_writer(fmt: str):
+    if fmt == 'csv':
+        return CsvChunkWriter()
+    if fmt == 'parquet':
+        return ParquetChunkWriter()
+    raise ValueError(f"Unsupported export format: {fmt}")
+
+
+async def stream_export(db, start: datetime, end: datetime, fmt: str = 'csv') -> AsyncIterator[bytes]:
+    """Yield encoded export chunks, one server-side cursor batch at a time.
+
+    The blocking cursor fetches and encoding run in a worker thread so the
+    event loop keeps serving interactions while a large export is running.
+    """
+    writer = make_writer(fmt)
+    batches = db.iter_shifts(start, end, batch_size=EXPORT_BATCH_SIZE)
+
+    def next_chunk():
+        rows = next(batches, None)
+        if rows is None:
+            return None
+        return writer.write_batch(rows)
+
+    try:
+        while True:
+            chunk = await asyncio.to_thread(next_chunk)
+            if chunk is None:
+                break
+            if chunk:
+                yield chunk
+        tail = writer.close()
+        if tail:
+            yield tail
+    finally:
+        await asyncio.to_thread(batches.close)
+
+
+async def export_to_file(db, start: datetime, end: datetime, fmt: str = 'csv'):
+    """Write an export into an anonymous temp file for uploading to Discord.
+
+    CSV is gzip-compressed on the fly; Parquet is already column-compressed
+    (zstd) so it is written as-is. Returns the file rewound to the start.
+    """
+    spool = tempfile.TemporaryFile()
+    out = gzip.GzipFile(fileobj=spool, mode='wb') if fmt == 'csv' else spool
+    try:
+        async for chunk in stream_export(db, start, end, fmt):
+            out.write(chunk)
+        if out is not spool:
+            out.close()
+    except BaseException:
+        spool.close()
+        raise
+
+    spool.seek(0)
+    return spool
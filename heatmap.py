@@ -0,0 +1,176 @@
+import asyncio
+import hashlib
+import multiprocessing
+import struct
+import zlib
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+from typing import Optional
+import numpy as np
+from analytics import HOURS_PER_DAY, SECONDS_PER_HOUR, WEEKDAY_NAMES, hour_segments
+
+CELL = 22
+GAP = 2
+SCALE = 2
+LEFT = 44
+TOP = 26
+BOTTOM = 44
+RIGHT = 12
+
+BACKGROUND = (43, 45, 49)
+TEXT = (219, 222, 225)
+# Empty cells are slightly lighter than the background, busiest cells gold.
+RAMP = np.array([
+    (56, 58, 64),
+    (64, 78, 160),
+    (88, 101, 242),
+    (235, 69, 158),
+    (254, 231, 92),
+], dtype=np.float64)
+
+GLYPHS = {
+    '0': ["111", "101", "101", "101", "111"],
+    '1': ["010", "110", "010", "010", "111"],
+    '2': ["111", "001", "111", "100", "111"],
+    '3': ["111", "001", "111", "001", "111"],
+    '4': ["101", "101", "111", "001", "001"],
+    '5': ["111", "100", "111", "001", "111"],
+    '6': ["111", "100", "111", "101", "111"],
+    '7': ["111", "001", "001", "001", "001"],
+    '8': ["111", "101", "111", "101", "111"],
+    '9': ["111", "101", "111", "001", "111"],
+    '.': ["0", "0", "0", "0", "1"],
+    ' ': ["00", "00", "00", "00", "00"],
+    'A': ["010", "101", "111", "101", "101"],
+    'C': ["111", "100", "100", "100", "111"],
+    'D': ["110", "101", "101", "101", "110"],
+    'E': ["111", "100", "110", "100", "111"],
+    'F': ["111", "100", "110", "100", "100"],
+    'H': ["101", "101", "111", "101", "101"],
+    'I': ["111", "010", "010", "010", "111"],
+    'M': ["10001", "11011", "10101", "10001", "10001"],
+    'N': ["1001", "1101", "1011", "1001", "1001"],
+    'O': ["111", "101", "101", "101", "111"],
+    'R': ["110", "101", "110", "101", "101"],
+    'S': ["111", "100", "111", "001", "111"],
+    'T': ["111", "010", "010", "010", "010"],
+    'U': ["101", "101", "101", "101", "111"],
+    'W': ["10001", "10001", "10101", "11011", "10001"],
+    'X': ["101", "101", "010", "101", "101"],
+}
+
+
+def team_hour_grid(starts, durations, since: int, until: int) -> np.ndarray:
+    """Bin shift time inside [since, until) into a 7x24 weekday/hour grid of hours."""
+    hours, seconds = hour_segments(starts, durations)
+    in_window = (hours >= since // SECONDS_PER_HOUR) & (hours < until // SECONDS_PER_HOUR)
+    hours, seconds = hours[in_window], seconds[in_window]
+
+    weekdays = (hours // HOURS_PER_DAY + 3) % 7
+    cells = weekdays * HOURS_PER_DAY + hours % HOURS_PER_DAY
+    totals = np.bincount(cells, weights=seconds, minlength=7 * HOURS_PER_DAY)
+    return (totals / SECONDS_PER_HOUR).reshape(7, HOURS_PER_DAY)
+
+
+def _draw_text(image: np.ndarray, x: int, y: int, text: str):
+    for char in text.upper():
+        rows = GLYPHS.get(char, GLYPHS[' '])
+        mask = np.array([[bit == '1' for bit in row] for row in rows])
+        mask = np.kron(mask, np.ones((SCALE, SCALE), dtype=bool))
+        image[y:y + mask.shape[0], x:x + mask.shape[1]][mask] = TEXT
+        x += mask.shape[1] + SCALE
+
+
+def _colorize(values: np.ndarray) -> np.ndarray:
+    stops = np.linspace(0.0, 1.0, len(RAMP))
+    channels = [np.interp(values, stops, RAMP[:, channel]) for channel in range(3)]
+    return np.stack(channels, axis=-1).astype(np.uint8)
+
+
+def _encode_png(image: np.ndarray) -> bytes:
+    height, width, _ = image.shape
+    raw = np.hstack([np.zeros((height, 1), dtype=np.uint8), image.reshape(height, width * 3)])
+
+    def chunk(kind: bytes, data: bytes) -> bytes:
+        return struct.pack('>I', len(data)) + kind + data + struct.pack('>I', zlib.crc32(kind + data))
+
+    return (
+        b'\x89PNG\r\n\x1a\n'
+        + chunk(b'IHDR', struct.pack('>IIBBBBB', width, height, 8, 2, 0, 0, 0))
+        + chunk(b'IDAT', zlib.compress(raw.tobytes(), 9))
+        + chunk(b'IEND', b'')
+    )
+
+
+def render_heatmap_png(grid: np.ndarray) -> bytes:
+    """Render a 7x24 grid of hours as a PNG. Runs inside the render process."""
+    pitch = CELL + GAP
+    width = LEFT + HOURS_PER_DAY * pitch + RIGHT
+    height = TOP + 7 * pitch + BOTTOM
+    image = np.empty((height, width, 3), dtype=np.uint8)
+    image[:] = BACKGROUND
+
+    peak = grid.max()
+    colors = _colorize(grid / peak if peak > 0 else grid)
+    cells = np.kron(colors, np.ones((pitch, pitch, 1), dtype=np.uint8))
+    cells[pitch - GAP::pitch, :] = BACKGROUND
+    cells[:, pitch - GAP::pitch] = BACKGROUND
+    image[TOP:TOP + 7 * pitch, LEFT:LEFT + HOURS_PER_DAY * pitch] = cells
+
+    for row, name in enumerate(WEEKDAY_NAMES):
+        _draw_text(image, 6, TOP + row * pitch + (CELL - 5 * SCALE) // 2, name)
+    for hour in range(0, HOURS_PER_DAY, 3):
+        _draw_text(image, LEFT + hour * pitch + 2, 8, f"{hour:02d}")
+
+    legend_top = TOP + 7 * pitch + 10
+    legend_width = 8 * pitch
+    legend = _colorize(np.linspace(0.0, 1.0, legend_width))
+    image[legend_top:legend_top + 10, LEFT:LEFT + legend_width] = legend[np.newaxis, :, :]
+    _draw_text(image, LEFT, legend_top + 16, "0H")
+    _draw_text(image, LEFT + legend_width - 50, legend_top + 16, f"{peak:.1f}H")
+    _draw_text(image, LEFT + legend_width + 16, legend_top, "HOURS UTC")
+
+    return _encode_png(image)
+
+
+class HeatmapRenderer:
+    """Renders heatmaps in a worker process, memoized by grid content hash."""
+
+    def __init__(self, cache_size: int = 16):
+        self.cache_size = cache_size
+        self._cache: "OrderedDict[str, bytes]" = OrderedDict()
+        self._pool: Optional[ProcessPoolExecutor] = None
+
+    def _get_pool(self) -> ProcessPoolExecutor:
+        if self._pool is None:
+            # Not fork: the bot has threads running (log listener, perf
+            # watchdog, to_thread workers), and a child forked while one
+            # holds a lock can deadlock. The forkserver starts clean with
+            # numpy already imported. Workers still import main.py as
+            # __mp_main__; the bot itself only starts under its __name__
+            # guard and the DB pool opens lazily, so that is cheap.
+            context = multiprocessing.get_context('forkserver')
+            context.set_forkserver_preload(['heatmap'])
+            self._pool = ProcessPoolExecutor(max_workers=1, mp_context=context)
+        return self._pool
+
+    async def render(self, grid: np.ndarray) -> bytes:
+        grid = np.round(np.asarray(grid, dtype=np.float64), 3)
+        key = hashlib.sha256(grid.tobytes()).hexdigest()
+        png = self._cache.get(key)
+        if png is not None:
+            self._cache.move_to_end(key)
+            return png
+
+        loop = asyncio.get_running_loop()
+        png = await loop.run_in_executor(self._get_pool(), render_heatmap_png, grid)
+
+        self._cache[key] = png
+        while len(self._cache) > self.cache_size:
+            self._cache.popitem(last=False)
+        return png
+
+    def shutdown(self):
+        if self._pool is not None:
+            self._pool.shutdown(wait=False, cancel_futures=True)
+            self._pool = None
@@ -0,0 +1,131 @@
+import asyncio
+import itertools
+import json
+import logging
+import time
+from collections import deque
+from typing import Dict, List, Optional, Set
+
+logger = logging.getLogger(__name__)
+
+SUBSCRIBER_QUEUE_SIZE = 100
+REPLAY_BUFFER_SIZE = 500
+MAX_SUBSCRIBERS = 1000
+
+# Put on a subscriber's queue to end its stream.
+CLOSE = None
+
+
+class Subscription:
+    __slots__ = ('queue', 'connected_at')
+
+    def __init__(self, queue_size: int):
+        self.queue: asyncio.Queue = asyncio.Queue(queue_size)
+        self.connected_at = time.time()
+
+    async def next_frames(self, timeout: float) -> List[Optional[bytes]]:
+        """Every queued frame (``CLOSE`` ends the stream); waits up to ``timeout`` if none are queued.
+
+        Draining the whole backlog lets the stream write a burst in one go;
+        raises TimeoutError if nothing arrives.
+        """
+        if self.queue.empty():
+            frames = [await asyncio.wait_for(self.queue.get(), timeout)]
+        else:
+            frames = []
+        while not self.queue.empty():
+            frames.append(self.queue.get_nowait())
+        return frames
+
+
+class LiveEventBus:
+    """Fan-out of shift events to server-sent event streams.
+
+    ``publish`` never blocks: each event is encoded once and put on every
+    subscriber's bounded queue. A subscriber whose queue is full is cut
+    off rather than allowed to back up the bot; its client reconnects with
+    ``Last-Event-ID`` and catches up from the replay buffer.
+    """
+
+    def __init__(self, queue_size: int = SUBSCRIBER_QUEUE_SIZE, replay_size: int = REPLAY_BUFFER_SIZE,
+                 max_subscribers: int = MAX_SUBSCRIBERS):
+        self.queue_size = queue_size
+        self.max_subscribers = max_subscribers
+        self.subscribers: Set[Subscription] = set()
+        self._ids = itertools.count(1)
+        self._replay: deque = deque(maxlen=replay_size)
+        self.stats: Dict[str, int] = {
+            'published': 0,
+            'enqueued': 0,
+            'dropped_subscribers': 0,
+            'rejected_subscribers': 0,
+            'max_queue_depth': 0,
+        }
+
+    @staticmethod
+    def encode(event_id: int, event_type: str, data: Dict) -> bytes:
+        payload = json.dumps(data, separators=(',', ':'), default=str)
+        return f"id: {event_id}\nevent: {event_type}\ndata: {payload}\n\n".encode('utf-8')
+
+    def publish(self, event_type: str, data: Dict) -> int:
+        event_id = next(self._ids)
+        frame = self.encode(event_id, event_type, data)
+        self._replay.append((event_id, frame))
+        self.stats['published'] += 1
+
+        for subscription in list(self.subscribers):
+            try:
+                subscription.queue.put_nowait(frame)
+            except asyncio.QueueFull:
+                self._drop(subscription)
+                continue
+            self.stats['enqueued'] += 1
+            depth = subscription.queue.qsize()
+            if depth > self.stats['max_queue_depth']:
+                self.stats['max_queue_depth'] = depth
+        return event_id
+
+    def subscribe(self, last_event_id: Optional[int] = None) -> Optional[Subscription]:
+        """A new subscription, primed with the events after ``last_event_id``; None if at capacity."""
+        if len(self.subscribers) >= self.max_subscribers:
+            self.stats['rejected_subscribers'] += 1
+            return None
+
+        subscription = Subscription(self.queue_size)
+        if last_event_id is not None:
+            missed = [frame for event_id, frame in self._replay if event_id > last_event_id]
+            # More than a queue's worth can't be replayed without overflowing
+            # straight away; the client gets the newest ones.
+            for frame in missed[-self.queue_size:]:
+                subscription.queue.put_nowait(frame)
+        self.subscribers.add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription: Subscription):
+        self.subscribers.discard(subscription)
+
+    def _drop(self, subscription: Subscription):
+        self.subscribers.discard(subscription)
+        self.stats['dropped_subscribers'] += 1
+        # Make room for the close marker; the client replays what it missed.
+        while not subscription.queue.empty():
+            subscription.queue.get_nowait()
+        subscription.queue.put_nowait(CLOSE)
+        logger.warning(f"Dropped a live event subscriber that fell {self.queue_size} events behind")
+
+    def close(self):
+        """End every open stream."""
+        for subscription in list(self.subscribers):
+            self.subscribers.discard(subscription)
+            while not subscription.queue.empty():
+                subscription.queue.get_nowait()
+            subscription.queue.put_nowait(CLOSE)
+
+    def summary(self) -> Dict:
+        depths: List[int] = [subscription.queue.qsize() for subscription in self.subscribers]
+        return {
+            **self.stats,
+            'subscribers': len(depths),
+            'queued': sum(depths),
+            'deepest_queue': max(depths, default=0),
+        }
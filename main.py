@@ -1,33 +1,175 @@
+import time
+
+# Taken before the heavy imports so startup timings cover the whole boot.
+PROCESS_START = time.monotonic()
+
 import discord
-from discord.ext import commands, tasks
+from discord.ext import commands
 from discord import app_commands
 import asyncio
+import hashlib
+import json
 import os
+import signal
 from datetime import datetime, timezone, timedelta
-from database import ShiftDatabase
-from web_server import start_web_server
+from database import CONNECTION_ERRORS, ShiftDatabase
+from web_server import start_draining, start_web_server
+from caches import ApiCache, StatsCache
+from live_events import LiveEventBus
+from event_bus import EventBus, ShiftClockedIn, ShiftClockedOut
+from member_cache import MemberProfileCache
+from memory import LOW_MEMORY, memory_reporter, rss_bytes
+from roblox_presence import BADGES, PRESENCE_URL, PresencePoller
+from roblox_bans import set_game_ban, sync_bans
+from moderation_queue import ModerationQueue, PermanentJobError
+from scheduler import Scheduler
+from journal import EventJournal
+from write_batcher import ShiftWriteBatcher
+from perf import perf_monitor, traced
 from dotenv import load_dotenv
 import aiohttp
+import io
 
 load_dotenv()
 
 # Set up logging (useful for Fly.io logs)
 import logging
-logging.basicConfig(level=logging.INFO)
+from log_config import setup_logging, stop_logging
+setup_logging()
 logger = logging.getLogger(__name__)
+# The shift board is refreshed on every click; sampled via LOG_SAMPLE_RATES.
+embed_logger = logging.getLogger('shift_bot.embed')
+
+# Set by shutdown(): new interactions are turned away while the ones already
+# running finish.
+shutting_down = False
+# Seconds SIGTERM leaves for that and for draining queued work; keep it
+# under kill_timeout in fly.toml, which also has to cover closing up.
+SHUTDOWN_TIMEOUT = float(os.getenv('SHUTDOWN_TIMEOUT', '20'))
 
-intents = discord.Intents.default()
-intents.message_content = True
-intents.members = True
 
-bot = commands.Bot(command_prefix="!", intents=intents)
+async def refuse_during_shutdown(interaction: discord.Interaction) -> bool:
+    if not shutting_down:
+        return False
+    if interaction.type is not discord.InteractionType.autocomplete:
+        try:
+            await interaction.response.send_message(
+                "🔄 The bot is restarting. Please try again in a few seconds.",
+                ephemeral=True
+            )
+        except discord.HTTPException:
+            pass
+    return True
+
+
+class ShiftCommandTree(app_commands.CommandTree):
+    async def interaction_check(self, interaction: discord.Interaction) -> bool:
+        return not await refuse_during_shutdown(interaction)
+
+
+if LOW_MEMORY:
+    # Commands and buttons arrive as interactions whatever the intents;
+    # beyond that the bot only needs channels and roles (guilds) and member
+    # events. Members are fetched when needed instead of all cached at
+    # startup, and nothing reads cached messages.
+    intents = discord.Intents.none()
+    intents.guilds = True
+    intents.members = True
+    bot = commands.Bot(
+        command_prefix="!",
+        intents=intents,
+        tree_cls=ShiftCommandTree,
+        max_messages=None,
+        chunk_guilds_at_startup=False,
+        member_cache_flags=discord.MemberCacheFlags.none(),
+    )
+else:
+    intents = discord.Intents.default()
+    intents.message_content = True
+    intents.members = True
+    bot = commands.Bot(command_prefix="!", intents=intents, tree_cls=ShiftCommandTree)
 db = ShiftDatabase()
+stats_cache = StatsCache()
+# Snapshots behind the web dashboard API; invalidated on every write below.
+api_cache = ApiCache()
+# Clock events pushed to dashboards over /api/events.
+live_events = LiveEventBus()
+# Side effects of clocking in and out; subscribers are registered below.
+shift_events = EventBus()
+# Names and roles of guild members, warmed in on_ready from the gateway's
+# member chunks and kept current by the member events below. Without a
+# member cache (LOW_MEMORY) neither happens; profiles are built and
+# refreshed from the member on each interaction instead. Renames are saved
+# to the users table either way.
+member_profiles = MemberProfileCache(
+    on_rename=lambda user_id, username: run_in_background(persist_usernames({str(user_id): username}))
+)
+# Whether clocked-in staff with a linked Roblox account are in our experience.
+# ROBLOX_PRESENCE_URL points it at a stub for testing.
+presence_poller = PresencePoller(
+    db.get_active_roblox_links,
+    on_change=lambda: update_shift_embed(),
+    presence_url=os.getenv('ROBLOX_PRESENCE_URL', PRESENCE_URL),
+)
+# Kicks, timeouts, warning DMs and Roblox bans; commands enqueue and return.
+moderation_queue = ModerationQueue(db)
+heatmap_renderer = None  # created with the first heatmap; see build_team_heatmap
+scheduler = Scheduler(db)
+journal = EventJournal(os.getenv('JOURNAL_DIR', 'journal'))
+shift_writer = ShiftWriteBatcher(db)
+
+db.statement_hooks.append(perf_monitor.record_db)
+perf_monitor.instrument_http(bot.http)
+
+memory_reporter.register('discord_members', lambda: sum(len(guild.members) for guild in bot.guilds))
+memory_reporter.register('discord_messages', lambda: len(bot.cached_messages))
+memory_reporter.register('member_profiles', lambda: len(member_profiles))
+memory_reporter.register('stats_cache', lambda: len(stats_cache))
+memory_reporter.register('api_cache', lambda: len(api_cache))
+memory_reporter.register('perf_spans', lambda: len(perf_monitor.spans))
 
 SHIFT_ROLE_ID = None
 LOGS_CHANNEL_ID = None
 SHIFT_MESSAGE_ID = None
 SHIFT_CHANNEL_ID = None
 ADMIN_ROLE_IDS = []
+MAX_SHIFT_HOURS = 12
+
+# Team hour goals set with /set_goal, and the period each was last reached in.
+GOAL_PERIODS = ('today', 'week', 'month')
+team_goals = {}
+goals_reached = {}
+
+# Monthly shift partitions older than this are folded into per-user
+# summaries and detached (0 keeps everything live).
+SHIFT_ARCHIVE_MONTHS = int(os.getenv('SHIFT_ARCHIVE_MONTHS', '24'))
+
+# Seconds between role edits during reconciliation; Discord allows roughly
+# ten member edits per ten seconds per guild.
+ROLE_SYNC_INTERVAL = 1.0
+role_sync_lock = asyncio.Lock()
+config_task = None
+
+# Hash of the command tree Discord last accepted (stored in config), and the
+# registered commands as Discord returned them, for /help.
+SYNCED_TREE_HASH = None
+app_commands_cache = None
+role_sync_stats = {
+    'runs': 0,
+    'drift_found': 0,
+    'drift_fixed': 0,
+    'failures': 0,
+    'handler_failures': 0,
+    'last_run': None,
+    'last_drift': 0,
+}
+# Hourly reconciliation of the bans table with Roblox; see ban_sync_job.
+ban_sync_stats = {
+    'runs': 0,
+    'failures': 0,
+    'last_run': None,
+    'last_result': None,
+}
 
 
 def format_duration(seconds):
@@ -56,9 +198,11 @@ async def update_shift_embed():
         if not channel:
             return
         
-        message = await channel.fetch_message(SHIFT_MESSAGE_ID)
+        # Editing needs only the ID; fetching the message first cost a REST
+        # call on every refresh.
+        message = channel.get_partial_message(SHIFT_MESSAGE_ID)
         
-        active_users = db.get_active_users()
+        active_users = await asyncio.to_thread(db.get_active_users)
         
         embed = discord.Embed(
             title="🕐 Shift Clock System",
@@ -72,13 +216,22 @@ async def update_shift_embed():
             for user in active_users:
                 clock_in_dt = datetime.fromisoformat(user['clock_in_time'])
                 duration = int((datetime.utcnow() - clock_in_dt).total_seconds())
-                users_text += f"• <@{user['user_id']}> - {format_duration(duration)}\n"
+                users_text += f"• <@{user['user_id']}> - {format_duration(duration)}{presence_poller.badge(user['user_id'])}\n"
             
             embed.add_field(
                 name=f"✅ Currently Clocked In ({len(active_users)})",
                 value=users_text,
                 inline=False
             )
+            
+            if presence_poller.presence:
+                embed.add_field(
+                    name="🎮 Roblox Presence",
+                    value=f"{BADGES['in_experience']} in our game · {BADGES['in_other_game']} other game · "
+                          f"{BADGES['in_game']} game hidden · {BADGES['in_studio']} Studio · "
+                          f"{BADGES['online']} online · {BADGES['offline']} offline",
+                    inline=False
+                )
         else:
             embed.add_field(
                 name="✅ Currently Clocked In (0)",
@@ -89,11 +242,12 @@ async def update_shift_embed():
         embed.set_footer(text="Shift tracking system")
         
         await message.edit(embed=embed)
+        embed_logger.info(f"Updated shift embed ({len(active_users)} clocked in)")
     except Exception as e:
-        print(f"Error updating shift embed: {e}")
+        embed_logger.error(f"Error updating shift embed: {e}")
 
 
-async def log_shift_action(user, action, duration=None):
+async def log_shift_action(user, action, duration=None, total_time=None):
     if not LOGS_CHANNEL_ID:
         return
     
@@ -116,94 +270,371 @@ async def log_shift_action(user, action, duration=None):
             embed.description = f"{user.mention} has clocked out"
             if duration:
                 embed.add_field(name="Shift Duration", value=format_duration(duration), inline=False)
-                total_time = db.get_user_total_time(str(user.id))
-                embed.add_field(name="Total Time Worked", value=format_duration(total_time), inline=False)
+                try:
+                    if total_time is None and not db_recently_unreachable():
+                        total_time = await asyncio.to_thread(db.get_user_total_time, str(user.id))
+                    if total_time is not None:
+                        embed.add_field(name="Total Time Worked", value=format_duration(total_time), inline=False)
+                except CONNECTION_ERRORS:
+                    mark_db_unreachable()
         
         embed.set_thumbnail(url=user.display_avatar.url)
         embed.set_footer(text=f"User ID: {user.id}")
         
         await channel.send(embed=embed)
     except Exception as e:
-        print(f"Error logging shift action: {e}")
+        logger.error(f"Error logging shift action: {e}")
+
+
+# After a connection error, clicks go straight to the journal for this many
+# seconds instead of each waiting on a fresh connect attempt; the journal
+# replay job keeps retrying in the background.
+DB_PROBE_COOLDOWN = float(os.getenv('DB_PROBE_COOLDOWN', '30'))
+db_unreachable_until = 0.0
+
+
+def mark_db_unreachable():
+    global db_unreachable_until
+    db_unreachable_until = time.monotonic() + DB_PROBE_COOLDOWN
+
+
+def db_recently_unreachable() -> bool:
+    return time.monotonic() < db_unreachable_until
+
+
+async def record_clock_in(user_id, username):
+    """Clock a user in, falling back to the local journal if Postgres is down.
+
+    Returns (clocked_in, journaled). While journaled events are waiting to be
+    replayed, new events go to the journal too so they replay in order.
+    """
+    if not journal.has_pending() and not db_recently_unreachable():
+        try:
+            return await shift_writer.clock_in(user_id, username), False
+        except CONNECTION_ERRORS as e:
+            mark_db_unreachable()
+            logger.warning(f"Database unreachable, journaling clock in: {e}")
+    
+    pending = journal.last_event(user_id)
+    if pending:
+        already_in = pending['type'] == 'clock_in'
+    elif db_recently_unreachable():
+        # Unknown; replay skips the clock in if a shift is already open.
+        already_in = False
+    else:
+        try:
+            already_in = await asyncio.to_thread(db.is_clocked_in, user_id)
+        except CONNECTION_ERRORS:
+            mark_db_unreachable()
+            already_in = False
+    
+    if already_in:
+        return False, False
+    
+    await journal.append('clock_in', user_id, username)
+    return True, True
+
+
+async def record_clock_out(user_id):
+    """Clock a user out, falling back to the local journal if Postgres is down.
+
+    Returns (clocked_out, duration, total_time, journaled). duration is None
+    when the clock-in time is unknown until the journal is replayed;
+    total_time is the user's new total, or None when journaled.
+    """
+    if not journal.has_pending() and not db_recently_unreachable():
+        try:
+            closed = await shift_writer.clock_out(user_id)
+            if closed is None:
+                return False, None, None, False
+            duration, total_time = closed
+            return True, duration, total_time, False
+        except CONNECTION_ERRORS as e:
+            mark_db_unreachable()
+            logger.warning(f"Database unreachable, journaling clock out: {e}")
+    
+    pending = journal.last_event(user_id)
+    if pending:
+        if pending['type'] == 'clock_out':
+            return False, None, None, False
+        clock_in_time = datetime.fromisoformat(pending['at'])
+    elif db_recently_unreachable():
+        clock_in_time = None
+    else:
+        try:
+            clock_in_time = await asyncio.to_thread(db.get_active_clock_in, user_id)
+            if clock_in_time is None:
+                return False, None, None, False
+        except CONNECTION_ERRORS:
+            mark_db_unreachable()
+            clock_in_time = None
+    
+    event = await journal.append('clock_out', user_id)
+    duration = None
+    if clock_in_time is not None:
+        duration = int((datetime.fromisoformat(event['at']) - clock_in_time).total_seconds())
+    return True, duration, None, True
+
+
+async def replay_journal():
+    global db_unreachable_until
+    if not journal.has_pending():
+        return
+    
+    try:
+        applied = await journal.replay(db.apply_journal_event)
+    except CONNECTION_ERRORS as e:
+        mark_db_unreachable()
+        logger.warning(f"Database still unreachable, journal replay deferred: {e}")
+        return
+    
+    # Postgres is back: clicks can write to it again straight away.
+    db_unreachable_until = 0.0
+    if applied:
+        stats_cache.clear()
+        api_cache.invalidate('active', 'totals')
+        await update_shift_embed()
+
+
+# --- Clock event subscribers ---
+# Each runs on its own shift_events worker, after the button has replied,
+# so a slow Discord call or a failing feature never delays the reply.
+
+async def add_shift_role(event: ShiftClockedIn):
+    if not SHIFT_ROLE_ID or event.member is None:
+        return
+    try:
+        role = event.member.guild.get_role(SHIFT_ROLE_ID)
+        if role:
+            await event.member.add_roles(role)
+    except Exception as e:
+        logger.error(f"Error adding role: {e}")
+        role_sync_stats['handler_failures'] += 1
+
+
+async def remove_shift_role(event: ShiftClockedOut):
+    if not SHIFT_ROLE_ID or event.member is None:
+        return
+    try:
+        role = event.member.guild.get_role(SHIFT_ROLE_ID)
+        if role:
+            await event.member.remove_roles(role, reason="Automatic clock-out" if event.automatic else None)
+    except Exception as e:
+        logger.error(f"Error removing role: {e}")
+        role_sync_stats['handler_failures'] += 1
+
+
+async def log_clock_in(event: ShiftClockedIn):
+    if event.member is not None:
+        await log_shift_action(event.member, "clock_in")
+
+
+async def log_clock_out(event: ShiftClockedOut):
+    # The stale-shift sweep posts one summary for the whole batch instead.
+    if event.member is not None and not event.automatic:
+        await log_shift_action(event.member, "clock_out", event.duration, event.total_time)
+
+
+async def refresh_shift_board(event):
+    await update_shift_embed()
+
+
+async def notify_dashboards(event):
+    payload = {
+        'user_id': event.user_id,
+        'username': event.username,
+        'at': event.at.isoformat(),
+    }
+    if isinstance(event, ShiftClockedIn):
+        api_cache.invalidate('active')
+        live_events.publish('clock_in', payload)
+        return
+    
+    api_cache.invalidate('active', 'totals')
+    payload['duration_seconds'] = event.duration
+    if event.forced_by is not None or event.automatic:
+        payload['by'] = str(event.forced_by.id) if event.forced_by is not None else None
+        live_events.publish('force_clockout', payload)
+    else:
+        live_events.publish('clock_out', payload)
+
+
+def goal_period(period, now):
+    """Start and key of the goal period containing ``now`` (UTC; weeks start Monday)."""
+    day = now.replace(hour=0, minute=0, second=0, microsecond=0)
+    if period == 'week':
+        start = day - timedelta(days=day.weekday())
+        return start, start.strftime('%G-W%V')
+    if period == 'month':
+        start = day.replace(day=1)
+        return start, start.strftime('%Y-%m')
+    return day, day.strftime('%Y-%m-%d')
+
+
+async def check_team_goals(event: ShiftClockedOut):
+    # A journaled clock-out isn't in the database yet; the next one counts it.
+    if not team_goals or event.journaled:
+        return
+    
+    now = datetime.utcnow()
+    for period, hours in list(team_goals.items()):
+        start, key = goal_period(period, now)
+        if goals_reached.get(period) == key:
+            continue
+        
+        total = await asyncio.to_thread(db.get_team_total_since, start)
+        if total < hours * 3600:
+            continue
+        
+        goals_reached[period] = key
+        await asyncio.to_thread(db.save_config, f'goal_{period}_reached', key)
+        logger.info(f"Team goal for {period} reached: {hours}h")
+        
+        channel = bot.get_channel(LOGS_CHANNEL_ID) if LOGS_CHANNEL_ID else None
+        if not channel:
+            continue
+        label = {'today': 'today', 'week': 'this week', 'month': 'this month'}[period]
+        embed = discord.Embed(
+            title="🎯 Team Goal Reached!",
+            description=f"The team has logged **{format_duration(total)}** {label}, "
+                        f"passing the **{hours} hour** goal.",
+            color=discord.Color.gold(),
+            timestamp=datetime.now(timezone.utc)
+        )
+        await channel.send(embed=embed)
+
+
+async def wake_presence_poller(event: ShiftClockedIn):
+    presence_poller.wake()
+
+
+shift_event_counts = {
+    'clock_ins': 0,
+    'clock_outs': 0,
+    'forced': 0,
+    'automatic': 0,
+    'journaled': 0,
+    'seconds_logged': 0,
+}
+
+
+async def count_shift_event(event):
+    if event.journaled:
+        shift_event_counts['journaled'] += 1
+    if isinstance(event, ShiftClockedIn):
+        shift_event_counts['clock_ins'] += 1
+        return
+    shift_event_counts['clock_outs'] += 1
+    shift_event_counts['seconds_logged'] += event.duration or 0
+    if event.forced_by is not None:
+        shift_event_counts['forced'] += 1
+    if event.automatic:
+        shift_event_counts['automatic'] += 1
+
+
+shift_events.subscribe(ShiftClockedIn, 'roles', add_shift_role)
+shift_events.subscribe(ShiftClockedOut, 'roles', remove_shift_role)
+shift_events.subscribe(ShiftClockedIn, 'shift_log', log_clock_in)
+shift_events.subscribe(ShiftClockedOut, 'shift_log', log_clock_out)
+# The board shows current state, so a backlog collapses into one refresh.
+shift_events.subscribe(ShiftClockedIn, 'shift_board', refresh_shift_board, coalesce=True)
+shift_events.subscribe(ShiftClockedOut, 'shift_board', refresh_shift_board, coalesce=True)
+shift_events.subscribe(ShiftClockedIn, 'dashboards', notify_dashboards)
+shift_events.subscribe(ShiftClockedOut, 'dashboards', notify_dashboards)
+shift_events.subscribe(ShiftClockedOut, 'goals', check_team_goals)
+shift_events.subscribe(ShiftClockedIn, 'presence', wake_presence_poller)
+shift_events.subscribe(ShiftClockedIn, 'metrics', count_shift_event)
+shift_events.subscribe(ShiftClockedOut, 'metrics', count_shift_event)
+
+
+async def build_team_heatmap(days=7):
+    # numpy and the renderer's process pool are only loaded once a heatmap
+    # is actually needed, which keeps them off the startup path.
+    global heatmap_renderer
+    from heatmap import HeatmapRenderer, team_hour_grid
+    if heatmap_renderer is None:
+        heatmap_renderer = HeatmapRenderer()
+    
+    # Window ends on the last full hour, so repeated requests within the
+    # same hour produce an identical grid and hit the renderer's cache.
+    until = datetime.now(timezone.utc).replace(minute=0, second=0, microsecond=0)
+    since = until - timedelta(days=days)
+    
+    try:
+        starts, durations = await asyncio.to_thread(
+            db.get_team_shift_history, since.replace(tzinfo=None), until.replace(tzinfo=None)
+        )
+        grid = team_hour_grid(starts, durations, int(since.timestamp()), int(until.timestamp()))
+        if not grid.any():
+            return None
+        
+        png = await heatmap_renderer.render(grid)
+        return discord.File(io.BytesIO(png), filename="heatmap.png")
+    except Exception as e:
+        logger.error(f"Error rendering team heatmap: {e}")
+        return None
 
 
 class ShiftButtons(discord.ui.View):
     def __init__(self):
         super().__init__(timeout=None)
     
+    async def interaction_check(self, interaction: discord.Interaction) -> bool:
+        return not await refuse_during_shutdown(interaction)
+    
     @discord.ui.button(label="Clock In", style=discord.ButtonStyle.green, custom_id="clock_in", emoji="⏰")
+    @traced("clock_in")
     async def clock_in_button(self, interaction: discord.Interaction, button: discord.ui.Button):
         user_id = str(interaction.user.id)
-        username = str(interaction.user)
+        username = member_profiles.profile(interaction.user).username
         
-        if db.is_clocked_in(user_id):
+        clocked_in, journaled = await record_clock_in(user_id, username)
+        if not clocked_in:
             await interaction.response.send_message(
                 "❌ You are already clocked in! Clock out first.",
                 ephemeral=True
             )
             return
         
-        success = db.clock_in(user_id, username)
-        if success:
-            if SHIFT_ROLE_ID:
-                try:
-                    role = interaction.guild.get_role(SHIFT_ROLE_ID)
-                    if role:
-                        await interaction.user.add_roles(role)
-                except Exception as e:
-                    print(f"Error adding role: {e}")
-            
-            await interaction.response.send_message(
-                "✅ Successfully clocked in! Your shift has started.",
-                ephemeral=True
-            )
-            
-            await log_shift_action(interaction.user, "clock_in")
-            await update_shift_embed()
-        else:
-            await interaction.response.send_message(
-                "❌ Failed to clock in. Please try again.",
-                ephemeral=True
-            )
+        # Role, logs, shift board and dashboards are updated by the
+        # subscribers after the reply goes out.
+        shift_events.publish(ShiftClockedIn(user_id, username, interaction.user, datetime.utcnow(), journaled))
+        
+        message = "✅ Successfully clocked in! Your shift has started."
+        if journaled:
+            message += "\n⚠️ The database is unreachable right now, so this was saved locally and will sync automatically."
+        await interaction.response.send_message(message, ephemeral=True)
     
     @discord.ui.button(label="Clock Out", style=discord.ButtonStyle.red, custom_id="clock_out", emoji="🏁")
+    @traced("clock_out")
     async def clock_out_button(self, interaction: discord.Interaction, button: discord.ui.Button):
         user_id = str(interaction.user.id)
         
-        if not db.is_clocked_in(user_id):
+        clocked_out, duration, total_time, journaled = await record_clock_out(user_id)
+        if not clocked_out:
             await interaction.response.send_message(
                 "❌ You are not clocked in!",
                 ephemeral=True
             )
             return
         
-        duration = db.clock_out(user_id)
+        stats_cache.invalidate(user_id)
+        shift_events.publish(ShiftClockedOut(
+            user_id, member_profiles.profile(interaction.user).username, interaction.user, datetime.utcnow(),
+            duration, total_time, journaled
+        ))
+        
         if duration is not None:
-            if SHIFT_ROLE_ID:
-                try:
-                    role = interaction.guild.get_role(SHIFT_ROLE_ID)
-                    if role:
-                        await interaction.user.remove_roles(role)
-                except Exception as e:
-                    print(f"Error removing role: {e}")
-            
-            await interaction.response.send_message(
-                f"✅ Successfully clocked out! Shift duration: {format_duration(duration)}",
-                ephemeral=True
-            )
-            
-            await log_shift_action(interaction.user, "clock_out", duration)
-            await update_shift_embed()
+            message = f"✅ Successfully clocked out! Shift duration: {format_duration(duration)}"
         else:
-            await interaction.response.send_message(
-                "❌ Failed to clock out. Please try again.",
-                ephemeral=True
-            )
+            message = "✅ Successfully clocked out! Your shift duration will be calculated once the database is back."
+        if journaled:
+            message += "\n⚠️ The database is unreachable right now, so this was saved locally and will sync automatically."
+        await interaction.response.send_message(message, ephemeral=True)
 
 
-@tasks.loop(hours=168)
 async def weekly_report():
-    reports_channel_id = db.get_config('reports_channel_id')
+    reports_channel_id = await asyncio.to_thread(db.get_config, 'reports_channel_id')
     if not reports_channel_id:
         return
     
@@ -250,59 +681,528 @@ async def weekly_report():
         
         embed.set_footer(text="Automated Weekly Report")
         
-        await channel.send(embed=embed)
-        print("Weekly report sent successfully")
+        heatmap_file = await build_team_heatmap(days=7)
+        if heatmap_file:
+            embed.set_image(url="attachment://heatmap.png")
+            await channel.send(embed=embed, file=heatmap_file)
+        else:
+            await channel.send(embed=embed)
+        logger.info("Weekly report sent successfully")
     except Exception as e:
-        print(f"Error sending weekly report: {e}")
+        logger.error(f"Error sending weekly report: {e}")
 
 
-@bot.event
-async def on_ready():
-    global SHIFT_ROLE_ID, LOGS_CHANNEL_ID, SHIFT_MESSAGE_ID, SHIFT_CHANNEL_ID, ADMIN_ROLE_IDS
+async def stale_shift_sweeper():
+    if MAX_SHIFT_HOURS <= 0:
+        return
+    
+    max_seconds = MAX_SHIFT_HOURS * 3600
+    try:
+        closed = await asyncio.to_thread(db.close_stale_shifts, max_seconds)
+    except Exception as e:
+        logger.error(f"Error sweeping stale shifts: {e}")
+        return
+    
+    if not closed:
+        return
+    
+    logger.info(f"Auto clocked out {len(closed)} stale shift(s)")
+    
+    for shift in closed:
+        stats_cache.invalidate(shift['user_id'])
+        member = None
+        for guild in bot.guilds:
+            member = await find_member(guild, int(shift['user_id']))
+            if member:
+                break
+        
+        shift_events.publish(ShiftClockedOut(
+            shift['user_id'], shift['username'], member, datetime.utcnow(),
+            max_seconds, automatic=True
+        ))
+        if not member:
+            continue
+        
+        try:
+            await member.send(
+                f"⏰ You were automatically clocked out in **{member.guild.name}** because your shift "
+                f"passed the {MAX_SHIFT_HOURS} hour limit. It was recorded as {format_duration(max_seconds)}.\n"
+                f"Please remember to clock out at the end of your shift."
+            )
+        except discord.HTTPException:
+            pass
+    
+    if LOGS_CHANNEL_ID:
+        channel = bot.get_channel(LOGS_CHANNEL_ID)
+        if channel:
+            lines = [
+                f"• <@{shift['user_id']}> - clocked in {discord.utils.format_dt(datetime.fromisoformat(shift['clock_in_time']).replace(tzinfo=timezone.utc), 'R')}"
+                for shift in closed
+            ]
+            description = "\n".join(lines)
+            if len(description) > 4000:
+                description = description[:4000].rsplit("\n", 1)[0] + "\n…"
+            
+            embed = discord.Embed(
+                title=f"🧹 Automatic Clock-Out ({len(closed)})",
+                description=description,
+                color=discord.Color.orange(),
+                timestamp=datetime.now(timezone.utc)
+            )
+            embed.set_footer(text=f"Shifts capped at {MAX_SHIFT_HOURS} hours")
+            
+            try:
+                await channel.send(embed=embed)
+            except Exception as e:
+                logger.error(f"Error logging automatic clock-outs: {e}")
+
+
+async def find_member(guild, user_id):
+    member = guild.get_member(user_id)
+    if member is None and LOW_MEMORY:
+        # Members aren't cached in low-memory mode; ask the gateway for this one.
+        found = await guild.query_members(user_ids=[user_id], cache=False)
+        member = found[0] if found else None
+    return member
+
+
+async def reconcile_shift_roles():
+    """Make the shift role match the set of users with an active shift.
+
+    Returns (drift_found, drift_fixed). Role edits are spaced out by
+    ROLE_SYNC_INTERVAL so a large repair stays inside Discord's limits.
+    """
+    if not SHIFT_ROLE_ID:
+        return 0, 0
+    
+    async with role_sync_lock:
+        active_ids = {int(user['user_id']) for user in await asyncio.to_thread(db.get_active_users)}
+        # Clock events still in the journal are newer than the database.
+        for user_id, event in journal.last_events().items():
+            if event['type'] == 'clock_in':
+                active_ids.add(int(user_id))
+            else:
+                active_ids.discard(int(user_id))
+        found = fixed = 0
+        
+        for guild in bot.guilds:
+            role = guild.get_role(SHIFT_ROLE_ID)
+            if not role:
+                continue
+            
+            if LOW_MEMORY:
+                # Chunk the guild for this pass only; the members are
+                # dropped again when it ends.
+                members = {member.id: member for member in await guild.chunk(cache=False)}
+                holders = {member.id for member in members.values() if member.get_role(SHIFT_ROLE_ID)}
+                get_member = members.get
+            else:
+                holders = {member.id for member in role.members}
+                get_member = guild.get_member
+            to_add = {user_id for user_id in active_ids - holders if get_member(user_id)}
+            to_remove = holders - active_ids
+            found += len(to_add) + len(to_remove)
+            
+            changes = [(user_id, True) for user_id in to_add] + [(user_id, False) for user_id in to_remove]
+            for user_id, should_have in changes:
+                member = get_member(user_id)
+                try:
+                    if should_have:
+                        await member.add_roles(role, reason="Shift role reconciliation")
+                    else:
+                        await member.remove_roles(role, reason="Shift role reconciliation")
+                    fixed += 1
+                except Exception as e:
+                    role_sync_stats['failures'] += 1
+                    logger.error(f"Error reconciling shift role for {user_id}: {e}")
+                await asyncio.sleep(ROLE_SYNC_INTERVAL)
+        
+        role_sync_stats['runs'] += 1
+        role_sync_stats['drift_found'] += found
+        role_sync_stats['drift_fixed'] += fixed
+        role_sync_stats['last_drift'] = found
+        role_sync_stats['last_run'] = datetime.now(timezone.utc)
+        
+        if found:
+            logger.info(f"Shift role reconciliation: {found} drifted, {fixed} fixed")
+        return found, fixed
+
+
+async def role_sync_job():
+    try:
+        await reconcile_shift_roles()
+    except Exception as e:
+        role_sync_stats['failures'] += 1
+        logger.error(f"Error reconciling shift roles: {e}")
+
+
+async def maintain_shift_partitions():
+    try:
+        created = await asyncio.to_thread(db.ensure_shift_partitions)
+        if created:
+            logger.info(f"Created shift partition(s): {', '.join(created)}")
+        
+        if SHIFT_ARCHIVE_MONTHS:
+            archived = await asyncio.to_thread(db.archive_shift_partitions, SHIFT_ARCHIVE_MONTHS)
+            if archived:
+                stats_cache.clear()
+                logger.info(f"Archived shift partition(s): {', '.join(archived)}")
+    except Exception as e:
+        logger.error(f"Error maintaining shift partitions: {e}")
+
+
+async def ban_sync_job():
+    roblox_api_key = os.getenv("ROBLOX_API_KEY")
+    if not roblox_api_key:
+        return
+    
+    try:
+        universe_id = await asyncio.to_thread(db.get_config, 'roblox_universe_id')
+        if not universe_id:
+            return
+        result = await sync_bans(db, universe_id, roblox_api_key)
+    except Exception as e:
+        ban_sync_stats['failures'] += 1
+        logger.error(f"Error syncing bans from Roblox: {e}")
+        return
+    
+    ban_sync_stats['runs'] += 1
+    ban_sync_stats['last_run'] = datetime.now(timezone.utc)
+    ban_sync_stats['last_result'] = result
+    if result['added'] or result['lifted']:
+        logger.info(f"Ban sync: {result['fetched']} restriction(s) on Roblox, "
+                    f"{result['added']} new here, {result['lifted']} lifted")
+
+
+async def kick_job(payload):
+    guild = bot.get_guild(payload['guild_id'])
+    if guild is None:
+        raise PermanentJobError("the bot is no longer in that server")
+    try:
+        await guild.kick(discord.Object(id=payload['user_id']), reason=payload['reason'])
+    except discord.NotFound:
+        logger.info(f"{payload['target']} already left, nothing to kick")
+    except discord.Forbidden:
+        raise PermanentJobError("missing permission to kick this member")
+
+
+async def timeout_job(payload):
+    until = datetime.fromisoformat(payload['until'])
+    if until <= datetime.now(timezone.utc):
+        return
+    guild = bot.get_guild(payload['guild_id'])
+    if guild is None:
+        raise PermanentJobError("the bot is no longer in that server")
+    try:
+        member = guild.get_member(payload['user_id']) or await guild.fetch_member(payload['user_id'])
+        await member.timeout(until, reason=payload['reason'])
+    except discord.NotFound:
+        logger.info(f"{payload['target']} left, nothing to time out")
+    except discord.Forbidden:
+        raise PermanentJobError("missing permission to time out this member")
+
+
+async def warn_dm_job(payload):
+    try:
+        user = bot.get_user(payload['user_id']) or await bot.fetch_user(payload['user_id'])
+        await user.send(payload['message'])
+    except discord.Forbidden:
+        raise PermanentJobError("the member doesn't accept DMs from the bot")
+    except discord.NotFound:
+        raise PermanentJobError("the user no longer exists")
+
+
+async def roblox_ban_job(payload):
+    roblox_api_key = os.getenv("ROBLOX_API_KEY")
+    if not roblox_api_key:
+        raise PermanentJobError("ROBLOX_API_KEY is not set")
+    
+    try:
+        await set_game_ban(payload['universe_id'], roblox_api_key, payload['roblox_user_id'], payload['active'],
+                           payload.get('reason'), payload.get('duration_seconds'))
+    except aiohttp.ClientResponseError as e:
+        # Rate limits and Roblox outages are worth retrying; anything else
+        # the API rejected will be rejected again.
+        if 400 <= e.status < 500 and e.status != 429:
+            raise PermanentJobError(f"Roblox API error {e.status}: {e.message}")
+        raise
+    
+    if payload['active']:
+        await asyncio.to_thread(db.record_ban, payload['roblox_user_id'], payload['roblox_username'],
+                                payload['reason'], payload['moderator_id'], payload['moderator'],
+                                payload['duration_seconds'])
+    else:
+        await asyncio.to_thread(db.record_unban, payload['roblox_user_id'], payload['roblox_username'],
+                                payload['moderator'])
+
+
+MODERATION_JOB_LABELS = {
+    'kick': "Kick",
+    'timeout': "Timeout",
+    'warn_dm': "Warning DM",
+    'roblox_ban': "Roblox ban",
+}
+
+
+async def report_dead_moderation_job(job, error):
+    channel = bot.get_channel(LOGS_CHANNEL_ID) if LOGS_CHANNEL_ID else None
+    if not channel:
+        return
+    
+    payload = job['payload']
+    label = MODERATION_JOB_LABELS.get(job['kind'], job['kind'])
+    if job['kind'] == 'roblox_ban' and not payload['active']:
+        label = "Roblox unban"
+    target = payload.get('target') or payload.get('roblox_username')
+    embed = discord.Embed(
+        title=f"❌ {label} Failed",
+        description=f"**{label}** of **{target}** requested by {payload.get('moderator', 'unknown')} "
+                    f"did not go through after {job['attempts']} attempt(s).",
+        color=discord.Color.red(),
+        timestamp=datetime.now(timezone.utc)
+    )
+    embed.add_field(name="Error", value=error[:1000], inline=False)
+    embed.set_footer(text=f"Job #{job['id']}")
+    await channel.send(embed=embed)
+
+
+moderation_queue.register('kick', kick_job)
+moderation_queue.register('timeout', timeout_job)
+moderation_queue.register('warn_dm', warn_dm_job, max_attempts=3)
+# Open Cloud outages can last a while; keep trying for about 20 minutes.
+moderation_queue.register('roblox_ban', roblox_ban_job, max_attempts=9)
+moderation_queue.on_dead_letter = report_dead_moderation_job
+
+
+async def prune_moderation_jobs():
+    try:
+        pruned = await asyncio.to_thread(db.prune_moderation_jobs, datetime.utcnow() - timedelta(days=7))
+        if pruned:
+            logger.info(f"Pruned {pruned} completed moderation job(s)")
+    except Exception as e:
+        logger.error(f"Error pruning moderation jobs: {e}")
+
+
+# All periodic work runs off the one scheduler loop (cron syntax, UTC).
+scheduler.add_job('weekly_report', '0 0 * * 1', weekly_report, catch_up=True)
+scheduler.add_job('stale_shift_sweep', '*/10 * * * *', stale_shift_sweeper, run_at_start=True)
+scheduler.add_job('shift_role_sync', '*/15 * * * *', role_sync_job, run_at_start=True)
+scheduler.add_job('shift_board_refresh', '*/5 * * * *', update_shift_embed)
+scheduler.add_job('journal_replay', '* * * * *', replay_journal, run_at_start=True)
+scheduler.add_job('shift_partitions', '30 3 * * *', maintain_shift_partitions, run_at_start=True)
+scheduler.add_job('ban_sync', '0 * * * *', ban_sync_job, run_at_start=True)
+scheduler.add_job('moderation_job_prune', '45 3 * * *', prune_moderation_jobs)
+
+
+async def load_config():
+    global SHIFT_ROLE_ID, LOGS_CHANNEL_ID, SHIFT_MESSAGE_ID, SHIFT_CHANNEL_ID, ADMIN_ROLE_IDS, MAX_SHIFT_HOURS, SYNCED_TREE_HASH
     
-    print(f"Bot logged in as {bot.user}")
-    print(f"Bot ID: {bot.user.id}")
+    started = time.monotonic()
+    try:
+        # First DB use: this also opens the pool.
+        config = await asyncio.to_thread(db.get_all_config)
+    except Exception as e:
+        logger.error(f"Error loading config, continuing with defaults: {e}")
+        return
     
-    config = db.get_all_config()
     if 'shift_role_id' in config:
         SHIFT_ROLE_ID = int(config['shift_role_id'])
-        print(f"Loaded shift role ID: {SHIFT_ROLE_ID}")
+        logger.info(f"Loaded shift role ID: {SHIFT_ROLE_ID}")
     
     if 'logs_channel_id' in config:
         LOGS_CHANNEL_ID = int(config['logs_channel_id'])
-        print(f"Loaded logs channel ID: {LOGS_CHANNEL_ID}")
+        logger.info(f"Loaded logs channel ID: {LOGS_CHANNEL_ID}")
     
     if 'shift_message_id' in config:
         SHIFT_MESSAGE_ID = int(config['shift_message_id'])
-        print(f"Loaded shift message ID: {SHIFT_MESSAGE_ID}")
+        logger.info(f"Loaded shift message ID: {SHIFT_MESSAGE_ID}")
     
     if 'shift_channel_id' in config:
         SHIFT_CHANNEL_ID = int(config['shift_channel_id'])
-        print(f"Loaded shift channel ID: {SHIFT_CHANNEL_ID}")
+        logger.info(f"Loaded shift channel ID: {SHIFT_CHANNEL_ID}")
     
     if 'admin_role_ids' in config:
         ADMIN_ROLE_IDS = [int(rid) for rid in config['admin_role_ids'].split(',') if rid]
-        print(f"Loaded admin role IDs: {ADMIN_ROLE_IDS}")
+        logger.info(f"Loaded admin role IDs: {ADMIN_ROLE_IDS}")
     
-    bot.add_view(ShiftButtons())
+    if 'max_shift_hours' in config:
+        MAX_SHIFT_HOURS = int(config['max_shift_hours'])
+        logger.info(f"Loaded max shift length: {MAX_SHIFT_HOURS}h")
+    
+    if config.get('roblox_universe_id'):
+        presence_poller.universe_id = int(config['roblox_universe_id'])
+    
+    for period in GOAL_PERIODS:
+        if int(config.get(f'goal_{period}', 0)) > 0:
+            team_goals[period] = int(config[f'goal_{period}'])
+        if f'goal_{period}_reached' in config:
+            goals_reached[period] = config[f'goal_{period}_reached']
+    
+    SYNCED_TREE_HASH = config.get('command_tree_hash')
+    
+    perf_monitor.startup['config_load'] = time.monotonic() - started
+
+
+def command_tree_hash():
+    # Everything Discord stores about the global commands, in a stable order.
+    # The application ID is included so a different bot token forces a sync.
+    payload = {
+        'application_id': bot.application_id,
+        'commands': sorted((cmd.to_dict(bot.tree) for cmd in bot.tree.get_commands()), key=lambda c: c['name']),
+    }
+    return hashlib.sha256(json.dumps(payload, sort_keys=True, default=str).encode()).hexdigest()
+
+
+async def sync_commands():
+    # tree.sync() is a rate-limited global REST call; skip it unless the
+    # commands changed since Discord last accepted them (FORCE_COMMAND_SYNC=1
+    # overrides, e.g. after editing commands in the developer portal).
+    global SYNCED_TREE_HASH, app_commands_cache
+    
+    tree_hash = command_tree_hash()
+    if tree_hash == SYNCED_TREE_HASH and os.getenv('FORCE_COMMAND_SYNC') != '1':
+        logger.info("Command tree unchanged, skipping sync")
+        return
     
     try:
         synced = await bot.tree.sync()
-        print(f"Synced {len(synced)} command(s)")
+        logger.info(f"Synced {len(synced)} command(s)")
+    except Exception as e:
+        logger.error(f"Error syncing commands: {e}")
+        return
+    
+    app_commands_cache = synced
+    SYNCED_TREE_HASH = tree_hash
+    try:
+        await asyncio.to_thread(db.save_config, 'command_tree_hash', tree_hash)
+    except Exception as e:
+        logger.error(f"Error saving command tree hash: {e}")
+
+
+@bot.event
+async def setup_hook():
+    # Runs once, before the gateway connects. The persistent view must be
+    # registered before any click can arrive; config loading starts here
+    # so the DB connect overlaps the gateway handshake and member chunking.
+    global config_task
+    bot.add_view(ShiftButtons())
+    # Migrations run to completion first, in a worker thread, so a long one
+    # never holds up the loop or the pool. Nothing is connected to the
+    # gateway yet, so nothing times out while they run.
+    try:
+        applied = await asyncio.to_thread(db.apply_migrations)
+        if applied:
+            logger.info(f"Applied {len(applied)} migration(s)")
     except Exception as e:
-        print(f"Error syncing commands: {e}")
+        logger.error(f"Error applying migrations, continuing on the current schema: {e}")
+    config_task = asyncio.create_task(load_config())
+    shift_events.start()
+    perf_monitor.start()
+    perf_monitor.startup['setup_hook_at'] = time.monotonic() - PROCESS_START
+
+
+@bot.event
+async def on_ready():
+    logger.info(f"Bot logged in as {bot.user}")
+    logger.info(f"Bot ID: {bot.user.id}")
     
-    asyncio.create_task(start_web_server(port=8080))
+    await config_task
     
+    warm_member_profiles()
+    
+    # Everything below only needs config, not each other.
+    phases = [sync_commands()]
     if SHIFT_MESSAGE_ID and SHIFT_CHANNEL_ID:
-        await update_shift_embed()
-        print("Updated shift embed with current status")
+        phases.append(update_shift_embed())
+    await asyncio.gather(*phases)
+    
+    if not scheduler.is_running:
+        scheduler.start()
+        logger.info(f"Started scheduler with {len(scheduler.jobs)} job(s)")
+    
+    presence_poller.start()
+    moderation_queue.start()
+    
+    if 'ready_at' not in perf_monitor.startup:
+        perf_monitor.startup['ready_at'] = time.monotonic() - PROCESS_START
+        logger.info(f"Bot is ready! ({perf_monitor.startup['ready_at']:.2f}s after process start)")
+    else:
+        logger.info("Bot is ready! (reconnected)")
+
+
+def warm_member_profiles():
+    # Members arrive in chunks before on_ready; reconnects redo this too, in
+    # case renames were missed while disconnected. In low-memory mode
+    # nothing is chunked or cached, so there is nothing to warm from.
+    if LOW_MEMORY:
+        return
+    usernames = {}
+    for guild in bot.guilds:
+        usernames.update(member_profiles.warm(guild.members))
+    logger.info(f"Cached {len(member_profiles)} member profile(s)")
+    run_in_background(persist_usernames(usernames))
+
+
+# Fire-and-forget writes such as stored usernames. The loop only keeps a
+# weak reference to a task, so they are held here until done.
+background_tasks = set()
+
+
+def run_in_background(coro):
+    task = asyncio.create_task(coro)
+    background_tasks.add(task)
+    task.add_done_callback(background_task_finished)
+    return task
+
+
+def background_task_finished(task):
+    background_tasks.discard(task)
+    if not task.cancelled() and task.exception() is not None:
+        logger.error(f"Background task failed: {task.exception()}", exc_info=task.exception())
+
+
+async def persist_usernames(usernames):
+    try:
+        renamed = await asyncio.to_thread(db.rename_users, usernames)
+    except Exception as e:
+        logger.error(f"Error saving usernames: {e}")
+        return
+    if renamed:
+        logger.info(f"Updated {renamed} stored username(s)")
+        api_cache.invalidate('active', 'totals')
+
+
+# discord.py only dispatches member and user updates for cached members, so
+# with no member cache (LOW_MEMORY) these handlers are left out and
+# member_profiles.profile() catches renames on the next click instead.
+if not LOW_MEMORY:
+    @bot.event
+    async def on_member_join(member: discord.Member):
+        member_profiles.update(member)
+    
+    @bot.event
+    async def on_member_update(before: discord.Member, after: discord.Member):
+        member_profiles.update(after)
     
-    if not weekly_report.is_running():
-        weekly_report.start()
-        print("Started weekly report task")
+    @bot.event
+    async def on_user_update(before: discord.User, after: discord.User):
+        # Username and avatar changes come as user updates, not member
+        # updates. A rename is saved by member_profiles' on_rename.
+        for guild in bot.guilds:
+            member = guild.get_member(after.id)
+            if member is not None:
+                member_profiles.update(member)
     
-    print("Bot is ready!")
+    @bot.event
+    async def on_member_remove(member: discord.Member):
+        member_profiles.remove(member.id)
+
+
+@bot.event
+async def on_interaction(interaction: discord.Interaction):
+    if 'first_interaction_at' not in perf_monitor.startup:
+        perf_monitor.startup['first_interaction_at'] = time.monotonic() - PROCESS_START
+        logger.info(f"First interaction {perf_monitor.startup['first_interaction_at']:.2f}s after process start")
 
 
 @bot.tree.command(name="setup_shift", description="Set up the shift tracking system (Admin only)")
@@ -310,6 +1210,7 @@ async def on_ready():
     shift_role="The role to assign when users clock in",
     logs_channel="The channel where shift logs will be sent"
 )
+@traced("setup_shift")
 async def setup_shift(
     interaction: discord.Interaction,
     shift_role: discord.Role,
@@ -360,7 +1261,7 @@ async def setup_shift(
         ephemeral=True
     )
     
-    print(f"Shift system configured - Role: {shift_role.id}, Logs: {logs_channel.id}")
+    logger.info(f"Shift system configured - Role: {shift_role.id}, Logs: {logs_channel.id}")
 
 
 @bot.tree.command(name="set_admin", description="Set admin roles for the bot (Admin only)")
@@ -371,6 +1272,7 @@ async def setup_shift(
     role4="Fourth admin role (optional)",
     role5="Fifth admin role (optional)"
 )
+@traced("set_admin")
 async def set_admin(
     interaction: discord.Interaction,
     role1: discord.Role,
@@ -402,20 +1304,38 @@ async def set_admin(
 
 
 @bot.tree.command(name="mystats", description="Check your shift statistics")
+@traced("mystats")
 async def mystats(interaction: discord.Interaction):
+    from analytics import WEEKDAY_NAMES, compute_user_stats, sparkline
+    
     user_id = str(interaction.user.id)
-    total_time = db.get_user_total_time(user_id)
-    is_clocked = db.is_clocked_in(user_id)
+    
+    now = datetime.now(timezone.utc)
+    today = now.strftime('%Y-%m-%d')
+    stats = stats_cache.get(user_id, today)
+    if stats is None:
+        history = await asyncio.to_thread(db.get_user_shift_history, user_id)
+        is_clocked = history['clocked_in']
+        stats = compute_user_stats(history['starts'], history['durations'], now)
+        # Archived months only survive as totals: they count towards the
+        # total and average, while streaks and patterns use live history.
+        if history['archived_shifts']:
+            stats['shift_count'] += history['archived_shifts']
+            stats['total_seconds'] += history['archived_seconds']
+            stats['average_seconds'] = stats['total_seconds'] // stats['shift_count']
+        stats_cache.set(user_id, today, stats)
+    else:
+        is_clocked = await asyncio.to_thread(db.is_clocked_in, user_id)
     
     embed = discord.Embed(
         title=f"📊 Shift Stats for {interaction.user.display_name}",
         color=discord.Color.blue(),
-        timestamp=datetime.now(timezone.utc)
+        timestamp=now
     )
     
     embed.add_field(
         name="⏱️ Total Time Worked",
-        value=format_duration(total_time),
+        value=format_duration(stats['total_seconds']),
         inline=False
     )
     
@@ -426,6 +1346,40 @@ async def mystats(interaction: discord.Interaction):
         inline=False
     )
     
+    if stats['shift_count']:
+        embed.add_field(name="Shifts", value=str(stats['shift_count']), inline=True)
+        embed.add_field(name="Average Shift", value=format_duration(stats['average_seconds']), inline=True)
+        embed.add_field(name="Longest Shift", value=format_duration(stats['longest_seconds']), inline=True)
+        embed.add_field(
+            name="🔥 Streaks",
+            value=f"Current: **{stats['current_streak']}** day(s)\nLongest: **{stats['longest_streak']}** day(s)",
+            inline=False
+        )
+        
+        weekday_hours = [seconds / 3600 for seconds in stats['weekday_seconds']]
+        weekday_text = "\n".join(
+            f"`{name}` {hours:5.1f}h" for name, hours in zip(WEEKDAY_NAMES, weekday_hours)
+        )
+        embed.add_field(name="📅 Hours by Weekday", value=weekday_text, inline=True)
+        
+        hour_seconds = stats['hour_seconds']
+        peak_hours = sorted(range(24), key=lambda hour: hour_seconds[hour], reverse=True)[:3]
+        peak_text = "\n".join(
+            f"`{hour:02d}:00` {hour_seconds[hour] / 3600:.1f}h" for hour in peak_hours if hour_seconds[hour]
+        )
+        embed.add_field(
+            name="🕒 Busiest Hours (UTC)",
+            value=f"`{sparkline(hour_seconds)}`\n{peak_text}",
+            inline=True
+        )
+        
+        trend_hours = sum(stats['trend_seconds']) / 3600
+        embed.add_field(
+            name="📈 Last 30 Days",
+            value=f"`{sparkline(stats['trend_seconds'])}`\n{trend_hours:.1f} hours",
+            inline=False
+        )
+    
     embed.set_thumbnail(url=interaction.user.display_avatar.url)
     
     await interaction.response.send_message(embed=embed, ephemeral=True)
@@ -433,6 +1387,7 @@ async def mystats(interaction: discord.Interaction):
 
 @bot.tree.command(name="leaderboard", description="Show the shift time leaderboard (Admin only)")
 @app_commands.describe(top="Number of users to show (default: 10)")
+@traced("leaderboard")
 async def leaderboard(interaction: discord.Interaction, top: int = 10):
     if not is_admin(interaction):
         await interaction.response.send_message(
@@ -478,6 +1433,7 @@ async def leaderboard(interaction: discord.Interaction, top: int = 10):
 
 @bot.tree.command(name="force_clockout", description="Force clock out a user (Admin only)")
 @app_commands.describe(user="The user to force clock out")
+@traced("force_clockout")
 async def force_clockout(interaction: discord.Interaction, user: discord.Member):
     if not is_admin(interaction):
         await interaction.response.send_message(
@@ -488,36 +1444,27 @@ async def force_clockout(interaction: discord.Interaction, user: discord.Member)
     
     user_id = str(user.id)
     
-    if not db.is_clocked_in(user_id):
+    clocked_out, duration, total_time, journaled = await record_clock_out(user_id)
+    if not clocked_out:
         await interaction.response.send_message(
             f"❌ {user.mention} is not clocked in.",
             ephemeral=True
         )
         return
     
-    duration = db.clock_out(user_id)
+    stats_cache.invalidate(user_id)
+    shift_events.publish(ShiftClockedOut(
+        user_id, member_profiles.profile(user).username, user, datetime.utcnow(),
+        duration, total_time, journaled, forced_by=interaction.user
+    ))
     
     if duration is not None:
-        if SHIFT_ROLE_ID:
-            try:
-                role = interaction.guild.get_role(SHIFT_ROLE_ID)
-                if role:
-                    await user.remove_roles(role)
-            except Exception as e:
-                print(f"Error removing role: {e}")
-        
-        await interaction.response.send_message(
-            f"✅ Successfully force clocked out {user.mention}. Duration: {format_duration(duration)}",
-            ephemeral=True
-        )
-        
-        await log_shift_action(user, "clock_out", duration)
-        await update_shift_embed()
+        message = f"✅ Successfully force clocked out {user.mention}. Duration: {format_duration(duration)}"
     else:
-        await interaction.response.send_message(
-            "❌ Failed to clock out user.",
-            ephemeral=True
-        )
+        message = f"✅ Successfully force clocked out {user.mention}. The duration will be calculated once the database is back."
+    if journaled:
+        message += "\n⚠️ The database is unreachable right now, so this was saved locally and will sync automatically."
+    await interaction.response.send_message(message, ephemeral=True)
 
 
 @bot.tree.command(name="send_embed", description="Send a custom embedded message (Admin only)")
@@ -527,6 +1474,7 @@ async def force_clockout(interaction: discord.Interaction, user: discord.Member)
     description="The description/content of the embed",
     color="Hex color code (e.g., #5865F2) or color name (blue, red, green, gold, purple)"
 )
+@traced("send_embed")
 async def send_embed(
     interaction: discord.Interaction,
     channel: discord.TextChannel,
@@ -584,7 +1532,10 @@ async def send_embed(
 
 
 @bot.tree.command(name="help", description="Show all available bot commands (Admin only)")
+@traced("help")
 async def help_command(interaction: discord.Interaction):
+    global app_commands_cache
+    
     if not is_admin(interaction):
         await interaction.response.send_message(
             "❌ You need admin permissions to use this command.",
@@ -599,7 +1550,9 @@ async def help_command(interaction: discord.Interaction):
         timestamp=datetime.now(timezone.utc)
     )
     
-    commands_list = await bot.tree.fetch_commands()
+    if app_commands_cache is None:
+        app_commands_cache = await bot.tree.fetch_commands()
+    commands_list = app_commands_cache
     
     for cmd in sorted(commands_list, key=lambda x: x.name):
         embed.add_field(
@@ -614,6 +1567,7 @@ async def help_command(interaction: discord.Interaction):
 
 
 @bot.tree.command(name="team_status", description="Show current team member shift status (Admin only)")
+@traced("team_status")
 async def team_status(interaction: discord.Interaction):
     if not is_admin(interaction):
         await interaction.response.send_message(
@@ -664,7 +1618,12 @@ async def team_status(interaction: discord.Interaction):
     
     embed.set_footer(text="Keep up the great work!")
     
-    await interaction.response.send_message(embed=embed)
+    heatmap_file = await build_team_heatmap(days=7)
+    if heatmap_file:
+        embed.set_image(url="attachment://heatmap.png")
+        await interaction.response.send_message(embed=embed, file=heatmap_file)
+    else:
+        await interaction.response.send_message(embed=embed)
 
 
 @bot.tree.command(name="set_goal", description="Set a team work goal for the day/week (Admin only)")
@@ -672,6 +1631,7 @@ async def team_status(interaction: discord.Interaction):
     hours="Target hours for the team",
     period="Time period (today, week, month)"
 )
+@traced("set_goal")
 async def set_goal(
     interaction: discord.Interaction,
     hours: int,
@@ -682,26 +1642,242 @@ async def set_goal(
             "❌ You need admin permissions to use this command.",
             ephemeral=True
         )
-        return
+        return
+    
+    db.save_config(f'goal_{period}', str(hours))
+    if period in GOAL_PERIODS:
+        # A new target is tracked afresh, even if the old one was already
+        # reached; 0 stops tracking the period.
+        if hours > 0:
+            team_goals[period] = hours
+        else:
+            team_goals.pop(period, None)
+        goals_reached.pop(period, None)
+        db.save_config(f'goal_{period}_reached', '')
+    
+    embed = discord.Embed(
+        title="🎯 Team Goal Set!",
+        description=f"New goal: **{hours} hours** for **{period}**",
+        color=discord.Color.gold(),
+        timestamp=datetime.now(timezone.utc)
+    )
+    
+    embed.set_footer(text=f"Set by {interaction.user.display_name}")
+    
+    await interaction.response.send_message(embed=embed)
+
+
+@bot.tree.command(name="set_max_shift_length", description="Automatically clock out shifts longer than this (Admin only)")
+@app_commands.describe(
+    hours="Maximum shift length in hours (0 to disable automatic clock-out)"
+)
+@traced("set_max_shift_length")
+async def set_max_shift_length(
+    interaction: discord.Interaction,
+    hours: int
+):
+    global MAX_SHIFT_HOURS
+    
+    if not is_admin(interaction):
+        await interaction.response.send_message(
+            "❌ You need admin permissions to use this command.",
+            ephemeral=True
+        )
+        return
+    
+    if hours < 0:
+        await interaction.response.send_message(
+            "❌ Hours must be 0 or more.",
+            ephemeral=True
+        )
+        return
+    
+    MAX_SHIFT_HOURS = hours
+    db.save_config('max_shift_hours', str(hours))
+    
+    if hours == 0:
+        message = "✅ Automatic clock-out disabled."
+    else:
+        message = (
+            f"✅ Shifts longer than **{hours} hours** will be automatically clocked out "
+            f"and recorded as {hours} hours."
+        )
+    
+    await interaction.response.send_message(message, ephemeral=True)
+
+
+@bot.tree.command(name="sync_shift_roles", description="Repair shift roles that don't match active shifts (Admin only)")
+@traced("sync_shift_roles")
+async def sync_shift_roles(interaction: discord.Interaction):
+    if not is_admin(interaction):
+        await interaction.response.send_message(
+            "❌ You need admin permissions to use this command.",
+            ephemeral=True
+        )
+        return
+    
+    if not SHIFT_ROLE_ID:
+        await interaction.response.send_message(
+            "❌ The shift system isn't set up yet. Use `/setup_shift` first.",
+            ephemeral=True
+        )
+        return
+    
+    await interaction.response.defer(ephemeral=True)
+    
+    found, fixed = await reconcile_shift_roles()
+    
+    embed = discord.Embed(
+        title="🔄 Shift Role Sync",
+        description=f"Found **{found}** mismatched role(s), fixed **{fixed}**.",
+        color=discord.Color.green() if found == fixed else discord.Color.orange(),
+        timestamp=datetime.now(timezone.utc)
+    )
+    embed.add_field(name="Runs", value=str(role_sync_stats['runs']), inline=True)
+    embed.add_field(name="Total Drift Found", value=str(role_sync_stats['drift_found']), inline=True)
+    embed.add_field(name="Total Drift Fixed", value=str(role_sync_stats['drift_fixed']), inline=True)
+    embed.add_field(
+        name="Failed Role Updates",
+        value=f"{role_sync_stats['failures']} during sync, {role_sync_stats['handler_failures']} on clock in/out",
+        inline=False
+    )
+    
+    await interaction.followup.send(embed=embed, ephemeral=True)
+
+
+@bot.tree.command(name="perf", description="Show the slowest commands and event loop lag over the last hour (Admin only)")
+@traced("perf")
+async def perf(interaction: discord.Interaction):
+    if not is_admin(interaction):
+        await interaction.response.send_message(
+            "❌ You need admin permissions to use this command.",
+            ephemeral=True
+        )
+        return
+    
+    summary = perf_monitor.command_summary()
+    lag = perf_monitor.lag_summary()
+    
+    embed = discord.Embed(
+        title="⏱️ Performance (last hour)",
+        color=discord.Color.blue(),
+        timestamp=datetime.now(timezone.utc)
+    )
+    
+    if summary:
+        rows = [
+            f"`/{entry['name']}` ×{entry['count']} · p50 {entry['p50_ms']:.0f}ms · "
+            f"p95 {entry['p95_ms']:.0f}ms · max {entry['max_ms']:.0f}ms\n"
+            f"└ avg db {entry['db_ms']:.0f}ms · rest {entry['rest_ms']:.0f}ms"
+            + (f" · {entry['errors']} error(s)" if entry['errors'] else "")
+            for entry in summary[:10]
+        ]
+        embed.description = "\n".join(rows)
+    else:
+        embed.description = "No commands traced in the last hour."
+    
+    embed.add_field(
+        name="Event Loop Lag",
+        value=f"p50 {lag['p50_ms']:.1f}ms · p99 {lag['p99_ms']:.1f}ms · max {lag['max_ms']:.1f}ms",
+        inline=False
+    )
+    
+    startup = perf_monitor.startup
+    if 'ready_at' in startup:
+        startup_text = f"Ready {startup['ready_at']:.2f}s after start"
+        if 'config_load' in startup:
+            startup_text += f" · config/DB {startup['config_load']:.2f}s"
+        if 'first_interaction_at' in startup:
+            startup_text += f" · first interaction at {startup['first_interaction_at']:.2f}s"
+        embed.add_field(name="Startup", value=startup_text, inline=False)
+    
+    subscribers = shift_events.summary()
+    if any(entry['processed'] or entry['failed'] for entry in subscribers):
+        counts = shift_event_counts
+        lines = [
+            f"{counts['clock_ins']} in · {counts['clock_outs']} out ({counts['forced']} forced, "
+            f"{counts['automatic']} automatic) · {counts['journaled']} journaled · "
+            f"{format_duration(counts['seconds_logged'])} logged since start"
+        ]
+        lines += [
+            f"`{entry['name']}` {entry['processed']} handled · {entry['failed']} failed · "
+            f"{entry['queued']} queued · max lag {entry['max_lag_ms']:.0f}ms"
+            + (f" · {entry['dropped']} dropped" if entry['dropped'] else "")
+            for entry in subscribers
+        ]
+        embed.add_field(name="Clock Events", value="\n".join(lines), inline=False)
+    
+    presence = presence_poller.summary()
+    if presence['polls']:
+        states = ", ".join(f"{count} {state.replace('_', ' ')}" for state, count in presence['states'].items())
+        embed.add_field(
+            name="Roblox Presence",
+            value=f"{presence['polls']} polls · {presence['requests']} requests · "
+                  f"{presence['rate_limited']} rate limited · {presence['errors']} errors · "
+                  f"next in {presence['backoff'] or presence['interval']:.0f}s"
+                  + (f"\n{states}" if states else ""),
+            inline=False
+        )
     
-    db.save_config(f'goal_{period}', str(hours))
+    moderation = moderation_queue.summary()
+    if moderation['enqueued'] or moderation['completed'] or moderation['dead_lettered']:
+        embed.add_field(
+            name="Moderation Queue",
+            value=f"{moderation['enqueued']} queued · {moderation['completed']} done · "
+                  f"{moderation['running']} running · {moderation['retried']} retried · "
+                  f"{moderation['dead_lettered']} dead-lettered"
+                  + (f" · {moderation['duplicates']} duplicate(s)" if moderation['duplicates'] else ""),
+            inline=False
+        )
     
-    embed = discord.Embed(
-        title="🎯 Team Goal Set!",
-        description=f"New goal: **{hours} hours** for **{period}**",
-        color=discord.Color.gold(),
-        timestamp=datetime.now(timezone.utc)
+    profiles = member_profiles.summary()
+    embed.add_field(
+        name="Member Cache",
+        value=f"{profiles['size']} profile(s) · {profiles['hits']} hits · {profiles['misses']} misses · "
+              f"{profiles['updates']} updates · {profiles['renames']} renames · {profiles['evictions']} evicted",
+        inline=False
     )
     
-    embed.set_footer(text=f"Set by {interaction.user.display_name}")
+    rss = rss_bytes()
+    if rss:
+        embed.add_field(
+            name="Memory",
+            value=f"{rss / 1024 / 1024:.0f} MB RSS"
+                  + (" · low-memory mode" if LOW_MEMORY else "")
+                  + f" · {len(bot.cached_messages)} cached messages · "
+                  f"{sum(len(guild.members) for guild in bot.guilds)} cached members",
+            inline=False
+        )
     
-    await interaction.response.send_message(embed=embed)
+    stream = live_events.summary()
+    if stream['published'] or stream['subscribers']:
+        embed.add_field(
+            name="Live Event Stream",
+            value=f"{stream['subscribers']} subscriber(s) · {stream['published']} published · "
+                  f"deepest queue {stream['deepest_queue']} (peak {stream['max_queue_depth']}) · "
+                  f"{stream['dropped_subscribers']} dropped for lag · {stream['rejected_subscribers']} rejected",
+            inline=False
+        )
+    
+    cutoff = datetime.now(timezone.utc).timestamp() - 3600
+    stalls = [stall for stall in perf_monitor.slow_callbacks if stall['at'] >= cutoff]
+    if stalls:
+        worst = max(stalls, key=lambda stall: stall['blocked_ms'])
+        stack_tail = worst['stack'][-900:]
+        embed.add_field(
+            name=f"Loop Stalls: {len(stalls)} (worst {worst['blocked_ms']:.0f}ms)",
+            value=f"```{stack_tail}```",
+            inline=False
+        )
+    
+    await interaction.response.send_message(embed=embed, ephemeral=True)
 
 
 @bot.tree.command(name="setup_weekly_reports", description="Set up automated weekly team reports (Admin only)")
 @app_commands.describe(
     channel="The channel where weekly reports will be sent"
 )
+@traced("setup_weekly_reports")
 async def setup_weekly_reports(
     interaction: discord.Interaction,
     channel: discord.TextChannel
@@ -730,6 +1906,7 @@ async def setup_weekly_reports(
 @app_commands.describe(
     group_id="Your Roblox group ID (found in the group URL)"
 )
+@traced("link_roblox_group")
 async def link_roblox_group(
     interaction: discord.Interaction,
     group_id: str
@@ -772,6 +1949,7 @@ async def link_roblox_group(
 
 
 @bot.tree.command(name="roblox_group_info", description="Display information about the linked Roblox group (Admin only)")
+@traced("roblox_group_info")
 async def roblox_group_info(interaction: discord.Interaction):
     if not is_admin(interaction):
         await interaction.response.send_message(
@@ -780,7 +1958,7 @@ async def roblox_group_info(interaction: discord.Interaction):
         )
         return
     
-    group_id = db.get_config('roblox_group_id')
+    group_id = await asyncio.to_thread(db.get_config, 'roblox_group_id')
     if not group_id:
         await interaction.response.send_message(
             "❌ No Roblox group linked! Use `/link_roblox_group` first.",
@@ -829,12 +2007,89 @@ async def roblox_group_info(interaction: discord.Interaction):
         )
 
 
+@bot.tree.command(name="link_roblox", description="Link your Roblox account so the shift board can show if you're in game")
+@app_commands.describe(
+    roblox_username="Your Roblox username",
+    member="Link this member instead of yourself (Admin only)"
+)
+@traced("link_roblox")
+async def link_roblox(
+    interaction: discord.Interaction,
+    roblox_username: str,
+    member: discord.Member = None
+):
+    if member is not None and member.id != interaction.user.id and not is_admin(interaction):
+        await interaction.response.send_message(
+            "❌ You need admin permissions to link someone else's account.",
+            ephemeral=True
+        )
+        return
+    target = member or interaction.user
+    
+    await interaction.response.defer(ephemeral=True)
+    
+    try:
+        async with aiohttp.ClientSession() as session:
+            async with session.post(
+                "https://users.roblox.com/v1/usernames/users",
+                json={"usernames": [roblox_username], "excludeBannedUsers": True}
+            ) as resp:
+                user_data = await resp.json() if resp.status == 200 else {}
+    except Exception as e:
+        await interaction.followup.send(f"❌ Error looking up Roblox user: {str(e)}", ephemeral=True)
+        return
+    
+    if not user_data.get('data'):
+        await interaction.followup.send(f"❌ Could not find Roblox user '{roblox_username}'", ephemeral=True)
+        return
+    
+    roblox_user = user_data['data'][0]
+    linked = await asyncio.to_thread(db.link_roblox_account, str(target.id), roblox_user['id'], roblox_user['name'])
+    if not linked:
+        await interaction.followup.send(
+            f"❌ **{roblox_user['name']}** is already linked to another Discord account.",
+            ephemeral=True
+        )
+        return
+    
+    presence_poller.wake()
+    await interaction.followup.send(
+        f"✅ Linked {target.mention} to Roblox account **{roblox_user['name']}** (ID: {roblox_user['id']}).",
+        ephemeral=True
+    )
+
+
+@bot.tree.command(name="unlink_roblox", description="Unlink your Roblox account")
+@app_commands.describe(
+    member="Unlink this member instead of yourself (Admin only)"
+)
+@traced("unlink_roblox")
+async def unlink_roblox(
+    interaction: discord.Interaction,
+    member: discord.Member = None
+):
+    if member is not None and member.id != interaction.user.id and not is_admin(interaction):
+        await interaction.response.send_message(
+            "❌ You need admin permissions to unlink someone else's account.",
+            ephemeral=True
+        )
+        return
+    target = member or interaction.user
+    
+    if await asyncio.to_thread(db.unlink_roblox_account, str(target.id)):
+        presence_poller.wake()
+        await interaction.response.send_message(f"✅ Unlinked {target.mention}'s Roblox account.", ephemeral=True)
+    else:
+        await interaction.response.send_message(f"{target.mention} has no linked Roblox account.", ephemeral=True)
+
+
 @bot.tree.command(name="ban_player", description="Ban a player from your Roblox game (Admin only)")
 @app_commands.describe(
     roblox_username="The Roblox username to ban",
     duration_days="Ban duration in days (0 for permanent)",
     reason="Reason for the ban (shown to player)"
 )
+@traced("ban_player")
 async def ban_player(
     interaction: discord.Interaction,
     roblox_username: str,
@@ -849,7 +2104,7 @@ async def ban_player(
         return
     
     roblox_api_key = os.getenv("ROBLOX_API_KEY")
-    universe_id = db.get_config('roblox_universe_id')
+    universe_id = await asyncio.to_thread(db.get_config, 'roblox_universe_id')
     
     if not roblox_api_key:
         await interaction.response.send_message(
@@ -893,41 +2148,27 @@ async def ban_player(
                     return
                 
                 user_id = user_data['data'][0]['id']
+                roblox_name = user_data['data'][0]['name']
             
-            ban_payload = {
-                "gameJoinRestriction": {
-                    "active": True,
-                    "displayReason": reason
-                }
-            }
-            
-            if duration_days > 0:
-                ban_payload["gameJoinRestriction"]["duration"] = f"{duration_days * 86400}s"
+            await moderation_queue.enqueue('roblox_ban', {
+                'universe_id': universe_id,
+                'roblox_user_id': user_id,
+                'roblox_username': roblox_name,
+                'active': True,
+                'reason': reason,
+                'duration_seconds': duration_days * 86400 if duration_days > 0 else None,
+                'moderator_id': str(interaction.user.id),
+                'moderator': str(interaction.user),
+            }, f"roblox_ban:{interaction.id}")
             
-            headers = {
-                "x-api-key": roblox_api_key,
-                "Content-Type": "application/json"
-            }
-            
-            async with session.patch(
-                f"https://apis.roblox.com/cloud/v2/universes/{universe_id}/user-restrictions/{user_id}",
-                headers=headers,
-                json=ban_payload
-            ) as resp:
-                if resp.status in [200, 201]:
-                    duration_text = f"{duration_days} days" if duration_days > 0 else "permanent"
-                    await interaction.followup.send(
-                        f"✅ Successfully banned **{roblox_username}** (ID: {user_id})\n"
-                        f"**Duration:** {duration_text}\n"
-                        f"**Reason:** {reason}",
-                        ephemeral=True
-                    )
-                else:
-                    error_text = await resp.text()
-                    await interaction.followup.send(
-                        f"❌ Failed to ban user. API Error: {error_text}",
-                        ephemeral=True
-                    )
+            duration_text = f"{duration_days} days" if duration_days > 0 else "permanent"
+            await interaction.followup.send(
+                f"🔨 Banning **{roblox_name}** (ID: {user_id})\n"
+                f"**Duration:** {duration_text}\n"
+                f"**Reason:** {reason}\n"
+                f"Failures are reported in the logs channel.",
+                ephemeral=True
+            )
     except Exception as e:
         await interaction.followup.send(
             f"❌ Error banning player: {str(e)}",
@@ -939,6 +2180,7 @@ async def ban_player(
 @app_commands.describe(
     roblox_username="The Roblox username to unban"
 )
+@traced("unban_player")
 async def unban_player(
     interaction: discord.Interaction,
     roblox_username: str
@@ -951,7 +2193,7 @@ async def unban_player(
         return
     
     roblox_api_key = os.getenv("ROBLOX_API_KEY")
-    universe_id = db.get_config('roblox_universe_id')
+    universe_id = await asyncio.to_thread(db.get_config, 'roblox_universe_id')
     
     if not roblox_api_key or not universe_id:
         await interaction.response.send_message(
@@ -984,34 +2226,21 @@ async def unban_player(
                     return
                 
                 user_id = user_data['data'][0]['id']
+                roblox_name = user_data['data'][0]['name']
             
-            headers = {
-                "x-api-key": roblox_api_key,
-                "Content-Type": "application/json"
-            }
-            
-            unban_payload = {
-                "gameJoinRestriction": {
-                    "active": False
-                }
-            }
+            await moderation_queue.enqueue('roblox_ban', {
+                'universe_id': universe_id,
+                'roblox_user_id': user_id,
+                'roblox_username': roblox_name,
+                'active': False,
+                'moderator_id': str(interaction.user.id),
+                'moderator': str(interaction.user),
+            }, f"roblox_unban:{interaction.id}")
             
-            async with session.patch(
-                f"https://apis.roblox.com/cloud/v2/universes/{universe_id}/user-restrictions/{user_id}",
-                headers=headers,
-                json=unban_payload
-            ) as resp:
-                if resp.status in [200, 201]:
-                    await interaction.followup.send(
-                        f"✅ Successfully unbanned **{roblox_username}** (ID: {user_id})",
-                        ephemeral=True
-                    )
-                else:
-                    error_text = await resp.text()
-                    await interaction.followup.send(
-                        f"❌ Failed to unban user. API Error: {error_text}",
-                        ephemeral=True
-                    )
+            await interaction.followup.send(
+                f"✅ Unbanning **{roblox_name}** (ID: {user_id}). Failures are reported in the logs channel.",
+                ephemeral=True
+            )
     except Exception as e:
         await interaction.followup.send(
             f"❌ Error unbanning player: {str(e)}",
@@ -1019,11 +2248,142 @@ async def unban_player(
         )
 
 
+def format_ban_expiry(ban):
+    if ban['expires_at'] is None:
+        return "permanent"
+    return f"until {ban['expires_at'].strftime('%Y-%m-%d %H:%M UTC')}"
+
+
+@bot.tree.command(name="ban_status", description="Check whether a player is banned from your Roblox game (Admin only)")
+@app_commands.describe(
+    roblox_user="Roblox username or user ID"
+)
+@traced("ban_status")
+async def ban_status(
+    interaction: discord.Interaction,
+    roblox_user: str
+):
+    if not is_admin(interaction):
+        await interaction.response.send_message(
+            "❌ You need admin permissions to use this command.",
+            ephemeral=True
+        )
+        return
+    
+    if roblox_user.isdigit():
+        ban = await asyncio.to_thread(db.get_ban, roblox_user_id=int(roblox_user))
+    else:
+        ban = await asyncio.to_thread(db.get_ban, roblox_username=roblox_user)
+    
+    if not ban:
+        await interaction.response.send_message(
+            f"✅ No ban on record for **{roblox_user}**.\n"
+            f"Bans made outside the bot show up here after the next hourly sync with Roblox.",
+            ephemeral=True
+        )
+        return
+    
+    name = ban['roblox_username'] or str(ban['roblox_user_id'])
+    expired = ban['expires_at'] is not None and ban['expires_at'] <= datetime.utcnow()
+    in_force = ban['active'] and not expired
+    
+    if in_force:
+        status = f"🔨 Banned, {format_ban_expiry(ban)}"
+    elif ban['active']:
+        status = f"⌛ Ban expired {ban['expires_at'].strftime('%Y-%m-%d %H:%M UTC')}"
+    elif ban['unbanned_at']:
+        status = f"✅ Unbanned {ban['unbanned_at'].strftime('%Y-%m-%d %H:%M UTC')} by {ban['unbanned_by'] or 'unknown'}"
+    else:
+        status = "✅ Not banned"
+    
+    embed = discord.Embed(
+        title=f"Ban status: {name}",
+        description=status,
+        color=discord.Color.red() if in_force else discord.Color.green(),
+        timestamp=datetime.now(timezone.utc)
+    )
+    
+    if ban['banned_at']:
+        embed.add_field(
+            name="Banned",
+            value=f"**By:** {ban['moderator_name'] or 'outside the bot'}\n"
+                  f"**Date:** {ban['banned_at'].strftime('%Y-%m-%d %H:%M UTC')}\n"
+                  f"**Reason:** {ban['reason'] or 'not given'}",
+            inline=False
+        )
+    
+    synced = f" · synced {ban['synced_at'].strftime('%Y-%m-%d %H:%M UTC')}" if ban['synced_at'] else ""
+    embed.set_footer(text=f"Roblox ID: {ban['roblox_user_id']}{synced}")
+    
+    await interaction.response.send_message(embed=embed, ephemeral=True)
+
+
+@bot.tree.command(name="bans", description="List players currently banned from your Roblox game (Admin only)")
+@app_commands.describe(
+    moderator="Only bans made by this member",
+    page="Page number (default: 1)"
+)
+@traced("bans")
+async def list_bans(
+    interaction: discord.Interaction,
+    moderator: discord.Member = None,
+    page: int = 1
+):
+    if not is_admin(interaction):
+        await interaction.response.send_message(
+            "❌ You need admin permissions to use this command.",
+            ephemeral=True
+        )
+        return
+    
+    page_size = 15
+    page = max(1, page)
+    bans, total = await asyncio.to_thread(
+        db.get_active_bans, str(moderator.id) if moderator else None, page_size, (page - 1) * page_size
+    )
+    
+    if not bans:
+        if total or page > 1:
+            message = f"❌ There is no page {page}."
+        elif moderator:
+            message = f"✅ No bans by {moderator.mention} are in force."
+        else:
+            message = "✅ No bans are in force."
+        await interaction.response.send_message(message, ephemeral=True)
+        return
+    
+    pages = (total + page_size - 1) // page_size
+    embed = discord.Embed(
+        title=f"🔨 Active Bans ({total})" + (f" by {moderator.display_name}" if moderator else ""),
+        color=discord.Color.red(),
+        timestamp=datetime.now(timezone.utc)
+    )
+    
+    lines = []
+    for ban in bans:
+        reason = ban['reason'] or 'no reason given'
+        if len(reason) > 60:
+            reason = reason[:57] + "..."
+        by = "" if moderator else f" · by {ban['moderator_name'] or 'outside the bot'}"
+        lines.append(
+            f"**{ban['roblox_username'] or ban['roblox_user_id']}** · {format_ban_expiry(ban)}{by}\n└ {reason}"
+        )
+    embed.description = "\n".join(lines)
+    
+    footer = f"Page {page} of {pages}"
+    if ban_sync_stats['last_run']:
+        footer += f" · synced with Roblox {ban_sync_stats['last_run'].strftime('%H:%M UTC')}"
+    embed.set_footer(text=footer)
+    
+    await interaction.response.send_message(embed=embed, ephemeral=True)
+
+
 @bot.tree.command(name="kick_member", description="Kick a member from the Discord server (Admin only)")
 @app_commands.describe(
     member="The member to kick",
     reason="Reason for kicking the member"
 )
+@traced("kick_member")
 async def kick_member(
     interaction: discord.Interaction,
     member: discord.Member,
@@ -1044,29 +2404,31 @@ async def kick_member(
         return
     
     try:
-        await member.kick(reason=f"{reason} (by {interaction.user})")
-        
-        embed = discord.Embed(
-            title="👢 Member Kicked",
-            description=f"**{member.mention}** has been kicked from the server.",
-            color=discord.Color.orange(),
-            timestamp=datetime.now(timezone.utc)
-        )
-        embed.add_field(name="Reason", value=reason, inline=False)
-        embed.add_field(name="Moderator", value=interaction.user.mention, inline=True)
-        embed.set_footer(text=f"User ID: {member.id}")
-        
-        await interaction.response.send_message(embed=embed)
-    except discord.Forbidden:
-        await interaction.response.send_message(
-            "❌ I don't have permission to kick this member.",
-            ephemeral=True
-        )
+        await moderation_queue.enqueue('kick', {
+            'guild_id': interaction.guild.id,
+            'user_id': member.id,
+            'reason': f"{reason} (by {interaction.user})",
+            'target': str(member),
+            'moderator': str(interaction.user),
+        }, f"kick:{interaction.id}")
     except Exception as e:
         await interaction.response.send_message(
             f"❌ Error kicking member: {str(e)}",
             ephemeral=True
         )
+        return
+    
+    embed = discord.Embed(
+        title="👢 Kicking Member",
+        description=f"**{member.mention}** is being kicked from the server.",
+        color=discord.Color.orange(),
+        timestamp=datetime.now(timezone.utc)
+    )
+    embed.add_field(name="Reason", value=reason, inline=False)
+    embed.add_field(name="Moderator", value=interaction.user.mention, inline=True)
+    embed.set_footer(text=f"User ID: {member.id} · failures are reported in the logs channel")
+    
+    await interaction.response.send_message(embed=embed)
 
 
 @bot.tree.command(name="timeout_member", description="Timeout a member (Admin only)")
@@ -1075,6 +2437,7 @@ async def kick_member(
     duration="Duration in minutes",
     reason="Reason for the timeout"
 )
+@traced("timeout_member")
 async def timeout_member(
     interaction: discord.Interaction,
     member: discord.Member,
@@ -1095,32 +2458,44 @@ async def timeout_member(
         )
         return
     
-    try:
-        timeout_duration = timedelta(minutes=duration)
-        await member.timeout(timeout_duration, reason=f"{reason} (by {interaction.user})")
-        
-        embed = discord.Embed(
-            title="⏱️ Member Timed Out",
-            description=f"**{member.mention}** has been timed out.",
-            color=discord.Color.yellow(),
-            timestamp=datetime.now(timezone.utc)
-        )
-        embed.add_field(name="Duration", value=f"{duration} minutes", inline=True)
-        embed.add_field(name="Reason", value=reason, inline=False)
-        embed.add_field(name="Moderator", value=interaction.user.mention, inline=True)
-        embed.set_footer(text=f"User ID: {member.id}")
-        
-        await interaction.response.send_message(embed=embed)
-    except discord.Forbidden:
+    # Discord caps timeouts at 28 days.
+    if not 1 <= duration <= 28 * 24 * 60:
         await interaction.response.send_message(
-            "❌ I don't have permission to timeout this member.",
+            "❌ Timeout duration must be between 1 minute and 28 days.",
             ephemeral=True
         )
+        return
+    
+    try:
+        # An absolute end time, so a retried job doesn't extend the timeout.
+        until = datetime.now(timezone.utc) + timedelta(minutes=duration)
+        await moderation_queue.enqueue('timeout', {
+            'guild_id': interaction.guild.id,
+            'user_id': member.id,
+            'until': until.isoformat(),
+            'reason': f"{reason} (by {interaction.user})",
+            'target': str(member),
+            'moderator': str(interaction.user),
+        }, f"timeout:{interaction.id}")
     except Exception as e:
         await interaction.response.send_message(
             f"❌ Error timing out member: {str(e)}",
             ephemeral=True
         )
+        return
+    
+    embed = discord.Embed(
+        title="⏱️ Timing Out Member",
+        description=f"**{member.mention}** is being timed out.",
+        color=discord.Color.yellow(),
+        timestamp=datetime.now(timezone.utc)
+    )
+    embed.add_field(name="Duration", value=f"{duration} minutes", inline=True)
+    embed.add_field(name="Reason", value=reason, inline=False)
+    embed.add_field(name="Moderator", value=interaction.user.mention, inline=True)
+    embed.set_footer(text=f"User ID: {member.id} · failures are reported in the logs channel")
+    
+    await interaction.response.send_message(embed=embed)
 
 
 @bot.tree.command(name="warn_member", description="Warn a member (Admin only)")
@@ -1128,6 +2503,7 @@ async def timeout_member(
     member="The member to warn",
     reason="Reason for the warning"
 )
+@traced("warn_member")
 async def warn_member(
     interaction: discord.Interaction,
     member: discord.Member,
@@ -1148,6 +2524,7 @@ async def warn_member(
             str(interaction.user),
             reason
         )
+        api_cache.invalidate('warnings')
         
         warning_count = db.get_warning_count(str(member.id))
         
@@ -1164,15 +2541,19 @@ async def warn_member(
         
         await interaction.response.send_message(embed=embed)
         
+        # The warning is recorded either way; the DM is retried if Discord is down.
         try:
-            await member.send(
-                f"⚠️ You have been warned in **{interaction.guild.name}**\n"
-                f"**Reason:** {reason}\n"
-                f"**Total Warnings:** {warning_count}\n\n"
-                f"Please review the server rules to avoid further action."
-            )
-        except:
-            pass
+            await moderation_queue.enqueue('warn_dm', {
+                'user_id': member.id,
+                'message': f"⚠️ You have been warned in **{interaction.guild.name}**\n"
+                           f"**Reason:** {reason}\n"
+                           f"**Total Warnings:** {warning_count}\n\n"
+                           f"Please review the server rules to avoid further action.",
+                'target': str(member),
+                'moderator': str(interaction.user),
+            }, f"warn_dm:{interaction.id}")
+        except Exception as e:
+            logger.error(f"Error queueing warning DM for {member}: {e}")
     except Exception as e:
         await interaction.response.send_message(
             f"❌ Error warning member: {str(e)}",
@@ -1184,6 +2565,7 @@ async def warn_member(
 @app_commands.describe(
     member="The member to check warnings for"
 )
+@traced("warnings")
 async def view_warnings(
     interaction: discord.Interaction,
     member: discord.Member
@@ -1233,6 +2615,7 @@ async def view_warnings(
 @app_commands.describe(
     member="The member to clear warnings for"
 )
+@traced("clear_warnings")
 async def clear_warnings_cmd(
     interaction: discord.Interaction,
     member: discord.Member
@@ -1254,6 +2637,7 @@ async def clear_warnings_cmd(
         return
     
     db.clear_warnings(str(member.id))
+    api_cache.invalidate('warnings')
     
     await interaction.response.send_message(
         f"✅ Cleared **{warning_count}** warning(s) for {member.mention}.",
@@ -1261,40 +2645,196 @@ async def clear_warnings_cmd(
     )
 
 
+@bot.tree.command(name="export_shifts", description="Export shift history for a date range (Admin only)")
+@app_commands.describe(
+    start="First day to include (YYYY-MM-DD, UTC)",
+    end="Last day to include (YYYY-MM-DD, UTC)",
+    file_format="File format (default: csv)"
+)
+@app_commands.choices(file_format=[
+    app_commands.Choice(name="CSV (gzip)", value="csv"),
+    app_commands.Choice(name="Parquet", value="parquet"),
+])
+@traced("export_shifts")
+async def export_shifts(
+    interaction: discord.Interaction,
+    start: str,
+    end: str,
+    file_format: str = "csv"
+):
+    if not is_admin(interaction):
+        await interaction.response.send_message(
+            "❌ You need admin permissions to use this command.",
+            ephemeral=True
+        )
+        return
+    
+    from exporter import export_filename, export_to_file, parse_date_range
+    
+    try:
+        start_dt, end_dt = parse_date_range(start, end)
+    except ValueError:
+        await interaction.response.send_message(
+            "❌ Invalid dates. Use the format YYYY-MM-DD, with the end date on or after the start date.",
+            ephemeral=True
+        )
+        return
+    
+    await interaction.response.defer(ephemeral=True)
+    
+    try:
+        export_file = await export_to_file(db, start_dt, end_dt, file_format)
+    except Exception as e:
+        await interaction.followup.send(
+            f"❌ Error exporting shifts: {str(e)}",
+            ephemeral=True
+        )
+        return
+    
+    with export_file:
+        filename = export_filename(start_dt, end_dt, file_format)
+        if file_format == "csv":
+            filename += ".gz"
+        
+        size = export_file.seek(0, os.SEEK_END)
+        export_file.seek(0)
+        if size > interaction.guild.filesize_limit:
+            await interaction.followup.send(
+                f"❌ The export is too large to upload to Discord ({size / 1024 / 1024:.1f} MB). "
+                f"Use the `/export/shifts` HTTP endpoint instead.",
+                ephemeral=True
+            )
+            return
+        
+        await interaction.followup.send(
+            f"✅ Shift export for **{start}** to **{end}**",
+            file=discord.File(export_file, filename=filename),
+            ephemeral=True
+        )
+
+
+
+async def shutdown(web_task):
+    """Turn away new interactions, finish the work already accepted, then close everything.
+
+    Draining shares SHUTDOWN_TIMEOUT: a step that runs out of time is
+    logged and the next one still runs, and the closing steps always get a
+    few seconds, so the database pool and web server are closed either way.
+    Journaled clock events are replayed into Postgres before exit, since
+    the journal directory doesn't outlive the machine on a redeploy.
+    """
+    global shutting_down
+    shutting_down = True
+    started = time.monotonic()
+    deadline = started + SHUTDOWN_TIMEOUT
+    timings = {}
+    logger.info(f"Shutting down, draining for up to {SHUTDOWN_TIMEOUT:.0f}s")
+    
+    async def step(name, awaitable, timeout=None):
+        step_started = time.monotonic()
+        if timeout is None:
+            timeout = max(0.0, deadline - step_started)
+        try:
+            await asyncio.wait_for(awaitable, timeout)
+        except asyncio.TimeoutError:
+            logger.warning(f"Shutdown: {name} did not finish in time")
+        except Exception as e:
+            logger.error(f"Shutdown: {name} failed: {e}")
+        timings[name] = (time.monotonic() - step_started) * 1000
+    
+    async def interactions_finished():
+        while perf_monitor.in_flight:
+            await asyncio.sleep(0.05)
+    
+    runner = None
+    if web_task.done() and not web_task.cancelled() and web_task.exception() is None:
+        runner = web_task.result()
+        start_draining(runner)
+    
+    await step('interactions', interactions_finished())
+    await step('scheduler', scheduler.stop())
+    await step('shift writes', shift_writer.drain())
+    # Shift roles, log channel posts and the shift board.
+    await step('clock events', shift_events.join())
+    await step('journal', replay_journal())
+    await step('journal fsync', journal.flush())
+    await step('moderation queue', moderation_queue.stop(timeout=max(0.0, deadline - time.monotonic())))
+    await step('presence', presence_poller.stop())
+    if background_tasks:
+        # Stored usernames.
+        await step('background writes', asyncio.gather(*background_tasks, return_exceptions=True))
+    drained_ms = (time.monotonic() - started) * 1000
+    
+    await shift_events.stop()
+    live_events.close()
+    await step('discord', bot.close(), timeout=5)
+    if heatmap_renderer is not None:
+        heatmap_renderer.shutdown()
+    if runner is not None:
+        await step('web server', runner.cleanup(), timeout=5)
+    else:
+        web_task.cancel()
+    perf_monitor.stop()
+    # Before close(): has_pending() on a closed journal reopens it.
+    pending = " · journal still has events, they replay on the next start" if journal.has_pending() else ""
+    journal.close()
+    db.close()
+    
+    logger.info(
+        f"Shutdown complete: drained in {drained_ms:.0f}ms, closed in "
+        f"{(time.monotonic() - started) * 1000 - drained_ms:.0f}ms ("
+        + ", ".join(f"{name} {ms:.0f}ms" for name, ms in timings.items()) + ")" + pending
+    )
+    stop_logging()
+
 
 # --- KEEP-ALIVE + DISCORD BOT STARTUP ---
 async def main():
     """
     Entry point for the bot and web server (for Fly.io + UptimeRobot).
-    Runs both concurrently using asyncio.
+    Runs both concurrently using asyncio, until the bot stops or SIGTERM
+    (Fly's kill_signal) / SIGINT asks for a graceful shutdown.
     """
     # Start aiohttp web server for UptimeRobot ping (non-blocking)
-    asyncio.create_task(start_web_server())
+    web_task = asyncio.create_task(
+        start_web_server(db=db, api_cache=api_cache, live_events=live_events, memory=memory_reporter)
+    )
 
     # Accept either DISCORD_BOT_TOKEN (existing in your code) or DISCORD_TOKEN
     discord_token = os.getenv('DISCORD_BOT_TOKEN') or os.getenv('DISCORD_TOKEN')
 
     if not discord_token:
-        print('ERROR: Discord token not found in environment variables!')
-        print('Please set DISCORD_BOT_TOKEN or DISCORD_TOKEN in your environment (Fly secrets / .env).')
+        logger.error('Discord token not found in environment variables! '
+                     'Please set DISCORD_BOT_TOKEN or DISCORD_TOKEN in your environment (Fly secrets / .env).')
         return
 
     database_url = os.getenv('DATABASE_URL')
     if not database_url:
-        print('WARNING: DATABASE_URL not found! Database operations will fail.')
-        print('Please set DATABASE_URL in your environment.')
+        logger.warning('DATABASE_URL not found! Database operations will fail. '
+                       'Please set DATABASE_URL in your environment.')
 
-    try:
-        await bot.start(discord_token)
-    except Exception as e:
-        print(f'Error starting bot: {e}')
+    stop_requested = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGTERM, signal.SIGINT):
+        loop.add_signal_handler(sig, stop_requested.set)
+
+    bot_task = asyncio.create_task(bot.start(discord_token))
+    stop_task = asyncio.create_task(stop_requested.wait())
+    await asyncio.wait({bot_task, stop_task}, return_when=asyncio.FIRST_COMPLETED)
+    stop_task.cancel()
+    if bot_task.done() and not bot_task.cancelled() and bot_task.exception() is not None:
+        e = bot_task.exception()
+        logger.error(f'Error starting bot: {e}', exc_info=e)
+
+    await shutdown(web_task)
+    # bot.close() in shutdown() makes bot.start() return; don't hang on it if not.
+    await asyncio.wait({bot_task}, timeout=5)
+    bot_task.cancel()
+    await asyncio.gather(bot_task, return_exceptions=True)
 
 
 if __name__ == '__main__':
     try:
         asyncio.run(main())
     except KeyboardInterrupt:
-        try:
-            logger.info('Bot stopped manually.')
-        except Exception:
-            print('Bot stopped manually.')
+        logger.info('Bot stopped manually.')
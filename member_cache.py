@@ -0,0 +1,114 @@
+import logging
+from typing import Any, Callable, Dict, Iterable, Optional, Tuple
+
+from caches import LRUCache
+from memory import cache_entries
+
+logger = logging.getLogger(__name__)
+
+# A profile with typical name lengths and a CDN avatar URL, measured with
+# benchmarks/bench_memory.py.
+PROFILE_BYTES = 320
+MAX_PROFILES = cache_entries(0.5, PROFILE_BYTES)
+
+
+class MemberProfile:
+    """What handlers need to know about a member, without holding the discord.py object."""
+
+    __slots__ = ('user_id', 'username', 'display_name', 'avatar_url', 'role_ids')
+
+    def __init__(self, user_id: int, username: str, display_name: str, avatar_url: str, role_ids: Tuple[int, ...]):
+        self.user_id = user_id
+        self.username = username
+        self.display_name = display_name
+        self.avatar_url = avatar_url
+        self.role_ids = role_ids
+
+    @classmethod
+    def from_member(cls, member: Any) -> 'MemberProfile':
+        # Also accepts a plain User (e.g. from a DM), which has no roles.
+        roles = getattr(member, 'roles', ())
+        return cls(
+            member.id,
+            str(member),
+            member.display_name,
+            member.display_avatar.url,
+            tuple(role.id for role in roles if not role.is_default()),
+        )
+
+
+class MemberProfileCache:
+    """Member profiles keyed by user ID, built from gateway data only.
+
+    ``warm`` loads the members discord.py chunked at startup and the
+    member/user update events keep them current through ``update``, so
+    handlers read names and roles without a REST fetch. ``profile``
+    falls back to building one from the member at hand for anyone the
+    cache hasn't seen yet, and refreshes a cached one whose username no
+    longer matches that member; in low-memory mode there is no member
+    cache, so no update events arrive and this is how renames are noticed.
+    ``on_rename(user_id, username)`` is called for every rename seen. At
+    most ``maxsize`` profiles are kept, least recently used out first.
+    """
+
+    def __init__(self, maxsize: int = MAX_PROFILES, on_rename: Optional[Callable[[int, str], None]] = None):
+        self._profiles = LRUCache(maxsize)
+        self.on_rename = on_rename
+        self.stats = {
+            'warmed': 0,
+            'hits': 0,
+            'misses': 0,
+            'updates': 0,
+            'renames': 0,
+        }
+
+    def __len__(self):
+        return len(self._profiles)
+
+    def warm(self, members: Iterable[Any]) -> Dict[str, str]:
+        """Load ``members``; returns {user_id: username} for ``ShiftDatabase.rename_users``."""
+        usernames = {}
+        for member in members:
+            if getattr(member, 'bot', False):
+                continue
+            profile = MemberProfile.from_member(member)
+            self._profiles.set(member.id, profile)
+            usernames[str(member.id)] = profile.username
+        self.stats['warmed'] = len(self._profiles)
+        return usernames
+
+    def get(self, user_id: int) -> Optional[MemberProfile]:
+        return self._profiles.get(user_id)
+
+    def profile(self, member: Any) -> MemberProfile:
+        profile = self._profiles.get(member.id)
+        if profile is not None and profile.username == str(member):
+            self.stats['hits'] += 1
+            return profile
+        if profile is not None:
+            self.update(member)
+            return self._profiles.get(member.id)
+        self.stats['misses'] += 1
+        profile = MemberProfile.from_member(member)
+        self._profiles.set(member.id, profile)
+        return profile
+
+    def update(self, member: Any) -> Optional[str]:
+        """Refresh ``member``'s profile; returns their previous username if it changed."""
+        previous = self._profiles.get(member.id)
+        profile = MemberProfile.from_member(member)
+        self._profiles.set(member.id, profile)
+        self.stats['updates'] += 1
+        if previous is not None and previous.username != profile.username:
+            self.stats['renames'] += 1
+            logger.info(f"Member {member.id} renamed from {previous.username} to {profile.username}")
+            if self.on_rename is not None:
+                self.on_rename(member.id, profile.username)
+            return previous.username
+        return None
+
+    def remove(self, user_id: int):
+        self._profiles.pop(user_id, None)
+
+    def summary(self) -> Dict:
+        return {**self.stats, 'size': len(self._profiles), 'evictions': self._profiles.evictions}
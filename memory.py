@@ -0,0 +1,132 @@
+import gc
+import logging
+import os
+import resource
+import sys
+import sysconfig
+import time
+import tracemalloc
+from typing import Callable, Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+# LOW_MEMORY=1 trims discord.py's caches and intents (see main.py) and
+# shrinks our own; meant for the 256 MB VM in fly.toml.
+LOW_MEMORY = os.getenv('LOW_MEMORY', '').lower() in ('1', 'true', 'yes')
+# Memory the process may use, in MB. The bot's own caches get CACHE_SHARE of
+# it, split between them by cache_entries().
+MEMORY_BUDGET_MB = int(os.getenv('MEMORY_BUDGET_MB', '256'))
+CACHE_SHARE = 0.08 if LOW_MEMORY else 0.25
+
+_REPO_DIR = os.path.dirname(os.path.abspath(__file__))
+_STDLIB_DIR = sysconfig.get_paths()['stdlib']
+
+
+def cache_entries(share: float, entry_bytes: int, minimum: int = 100) -> int:
+    """How many ``entry_bytes`` records fit in ``share`` of the cache budget."""
+    budget = MEMORY_BUDGET_MB * 1024 * 1024 * CACHE_SHARE * share
+    return max(minimum, int(budget // entry_bytes))
+
+
+def rss_bytes() -> Optional[int]:
+    # Current RSS from /proc on Linux (Fly); elsewhere only the peak is known.
+    try:
+        with open('/proc/self/status') as status:
+            for line in status:
+                if line.startswith('VmRSS:'):
+                    return int(line.split()[1]) * 1024
+    except OSError:
+        pass
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak if sys.platform == 'darwin' else peak * 1024
+
+
+def subsystem(filename: str) -> str:
+    """The part of the process a traced allocation belongs to: one of our
+    modules, a third-party package, or the standard library."""
+    if filename.startswith('<frozen importlib'):
+        # Code objects and module dicts, allocated while importing.
+        return 'imports'
+    if filename.startswith('<'):
+        return 'other'
+    path = os.path.abspath(filename)
+    if 'site-packages' in path:
+        package = path.split('site-packages' + os.sep, 1)[1].split(os.sep, 1)[0]
+        return package.removesuffix('.py').split('-', 1)[0]
+    if path.startswith(_REPO_DIR + os.sep):
+        return os.path.relpath(path, _REPO_DIR).removesuffix('.py').replace(os.sep, '.')
+    if path.startswith(_STDLIB_DIR):
+        return 'stdlib'
+    return 'other'
+
+
+class MemoryReporter:
+    """RSS and tracemalloc allocations grouped by subsystem, for /debug/memory.
+
+    tracemalloc only sees allocations made while it is tracing, so start the
+    process with PYTHONTRACEMALLOC=1 to attribute everything; it adds some
+    memory and CPU per allocation, so leave it off normally. Without it the
+    report still has RSS, GC object counts and the registered cache sizes.
+    Allocations are charged to the frame that made them, so objects
+    discord.py builds from gateway events count as ``discord``.
+    """
+
+    def __init__(self):
+        self._sizes: Dict[str, Callable[[], int]] = {}
+
+    def register(self, name: str, size: Callable[[], int]):
+        """Report ``size()`` (an entry count) as the size of cache ``name``."""
+        self._sizes[name] = size
+
+    def cache_sizes(self) -> Dict[str, int]:
+        sizes = {}
+        for name, size in self._sizes.items():
+            try:
+                sizes[name] = size()
+            except Exception as e:
+                logger.warning(f"Could not size cache {name}: {e}")
+        return sizes
+
+    def report(self, top: int = 10) -> Dict:
+        rss = rss_bytes()
+        report = {
+            'low_memory': LOW_MEMORY,
+            'budget_mb': MEMORY_BUDGET_MB,
+            'rss_mb': round(rss / 1024 / 1024, 1) if rss else None,
+            'gc_objects': len(gc.get_objects()),
+            'caches': self.cache_sizes(),
+            'tracing': tracemalloc.is_tracing(),
+        }
+        if not report['tracing']:
+            return report
+
+        started = time.perf_counter()
+        snapshot = tracemalloc.take_snapshot().filter_traces((
+            tracemalloc.Filter(False, tracemalloc.__file__),
+        ))
+        by_subsystem: Dict[str, int] = {}
+        for stat in snapshot.statistics('filename'):
+            name = subsystem(stat.traceback[0].filename)
+            by_subsystem[name] = by_subsystem.get(name, 0) + stat.size
+        traced = sum(by_subsystem.values())
+
+        subsystems: List[Dict] = [
+            {'name': name, 'mb': round(size / 1024 / 1024, 2), 'share': round(size / traced, 3) if traced else 0}
+            for name, size in sorted(by_subsystem.items(), key=lambda item: item[1], reverse=True)
+        ]
+        report.update({
+            'traced_mb': round(traced / 1024 / 1024, 1),
+            # Interpreter, C extension and allocator memory tracemalloc can't see.
+            'untraced_mb': round((rss - traced) / 1024 / 1024, 1) if rss else None,
+            'subsystems': subsystems,
+            'top_lines': [
+                {'where': f"{stat.traceback[0].filename}:{stat.traceback[0].lineno}",
+                 'kb': round(stat.size / 1024, 1), 'blocks': stat.count}
+                for stat in snapshot.statistics('lineno')[:top]
+            ],
+            'snapshot_ms': round((time.perf_counter() - started) * 1000, 1),
+        })
+        return report
+
+
+memory_reporter = MemoryReporter()
@@ -0,0 +1,169 @@
+"""Versioned schema migrations.
+
+Migrations are ``migrations/NNNN_description.sql`` files applied in version
+order; each applied version is recorded in the ``schema_version`` table.
+A file runs in a single transaction unless its first line is
+``-- migrate: no-transaction``, in which case its statements run one at a
+time in autocommit mode. That is what ``CREATE INDEX CONCURRENTLY``
+needs. Statements in such files are split on ``;``, so keep semicolons
+out of their string literals.
+
+Run ``python migrate.py`` to apply pending migrations by hand; the bot
+also applies them at startup (``ShiftDatabase.apply_migrations``).
+"""
+import logging
+import os
+import re
+from typing import List, Optional
+
+import psycopg2
+
+logger = logging.getLogger(__name__)
+
+MIGRATIONS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'migrations')
+NO_TRANSACTION_MARKER = '-- migrate: no-transaction'
+# Arbitrary key for pg_advisory_lock so two instances booting at once
+# don't apply the same migration twice.
+MIGRATION_LOCK_ID = 7_311_042_017
+
+_FILENAME_RE = re.compile(r'^(\d{4})_(\w+)\.sql$')
+
+
+class Migration:
+    def __init__(self, version: int, name: str, path: str):
+        self.version = version
+        self.name = name
+        self.path = path
+
+    @property
+    def sql(self) -> str:
+        with open(self.path, 'r', encoding='utf-8') as f:
+            return f.read()
+
+    @property
+    def no_transaction(self) -> bool:
+        return self.sql.lstrip().startswith(NO_TRANSACTION_MARKER)
+
+    def statements(self) -> List[str]:
+        lines = [line for line in self.sql.splitlines() if not line.strip().startswith('--')]
+        return [statement.strip() for statement in '\n'.join(lines).split(';') if statement.strip()]
+
+
+def load_migrations(directory: str = MIGRATIONS_DIR) -> List[Migration]:
+    migrations = {}
+    for filename in os.listdir(directory):
+        match = _FILENAME_RE.match(filename)
+        if not match:
+            continue
+        version = int(match.group(1))
+        if version in migrations:
+            raise ValueError(f"Duplicate migration version {version}: {filename}")
+        migrations[version] = Migration(version, match.group(2), os.path.join(directory, filename))
+    return [migrations[version] for version in sorted(migrations)]
+
+
+def latest_version(directory: str = MIGRATIONS_DIR) -> int:
+    migrations = load_migrations(directory)
+    return migrations[-1].version if migrations else 0
+
+
+def current_version(conn) -> int:
+    """Highest applied version, or 0 for a database that predates migrations."""
+    cursor = conn.cursor()
+    try:
+        cursor.execute('SELECT COALESCE(MAX(version), 0) FROM schema_version')
+        return cursor.fetchone()[0]
+    except psycopg2.errors.UndefinedTable:
+        return 0
+    finally:
+        cursor.close()
+        if not conn.autocommit:
+            conn.rollback()
+
+
+def run_migrations(conn, directory: str = MIGRATIONS_DIR, target: Optional[int] = None) -> List[Migration]:
+    """Apply pending migrations in order, up to ``target`` if given; returns the ones applied.
+
+    ``conn`` is switched to autocommit for the duration and restored
+    afterwards.
+    """
+    migrations = load_migrations(directory)
+    if target is not None:
+        migrations = [migration for migration in migrations if migration.version <= target]
+    previous_autocommit = conn.autocommit
+    conn.autocommit = True
+    cursor = conn.cursor()
+    applied: List[Migration] = []
+    try:
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS schema_version (
+                version INTEGER PRIMARY KEY,
+                name TEXT NOT NULL,
+                applied_at TIMESTAMP NOT NULL DEFAULT (NOW() AT TIME ZONE 'utc')
+            )
+        ''')
+        cursor.execute('SELECT pg_advisory_lock(%s)', (MIGRATION_LOCK_ID,))
+        try:
+            cursor.execute('SELECT version FROM schema_version')
+            done = {row[0] for row in cursor.fetchall()}
+
+            for migration in migrations:
+                if migration.version in done:
+                    continue
+                logger.info(f"Applying migration {migration.version:04d}_{migration.name}")
+                _apply(cursor, migration)
+                applied.append(migration)
+        finally:
+            cursor.execute('SELECT pg_advisory_unlock(%s)', (MIGRATION_LOCK_ID,))
+    finally:
+        cursor.close()
+        conn.autocommit = previous_autocommit
+
+    if target is None and migrations and migrations[-1].version < max(done | {0}):
+        logger.warning(
+            f"Database schema is at version {max(done)}, newer than this build's "
+            f"latest migration ({migrations[-1].version})"
+        )
+    return applied
+
+
+def _apply(cursor, migration: Migration):
+    record = 'INSERT INTO schema_version (version, name) VALUES (%s, %s)'
+    if migration.no_transaction:
+        # A failure part-way leaves the earlier statements applied; these
+        # migrations are written to be safe to re-run from the top.
+        for statement in migration.statements():
+            cursor.execute(statement)
+        cursor.execute(record, (migration.version, migration.name))
+        return
+
+    cursor.execute('BEGIN')
+    try:
+        cursor.execute(migration.sql)
+        cursor.execute(record, (migration.version, migration.name))
+        cursor.execute('COMMIT')
+    except Exception:
+        cursor.execute('ROLLBACK')
+        raise
+
+
+def ensure_schema(conn, directory: str = MIGRATIONS_DIR) -> Optional[List[Migration]]:
+    # One cheap read on a normal boot; migrations only run when this build
+    # has versions the database hasn't seen.
+    if current_version(conn) >= latest_version(directory):
+        return None
+    return run_migrations(conn, directory)
+
+
+if __name__ == '__main__':
+    from dotenv import load_dotenv
+    from log_config import setup_logging
+
+    load_dotenv()
+    setup_logging()
+    connection = psycopg2.connect(os.environ['DATABASE_URL'])
+    try:
+        applied_migrations = run_migrations(connection)
+        logger.info(f"Applied {len(applied_migrations)} migration(s); schema is at version {current_version(connection)}")
+    finally:
+        connection.close()
@@ -0,0 +1,45 @@
+-- The schema as it stood before versioned migrations. Every statement is
+-- idempotent so databases created by the old boot-time DDL adopt it as-is.
+
+CREATE TABLE IF NOT EXISTS shifts (
+    id SERIAL PRIMARY KEY,
+    user_id TEXT NOT NULL,
+    username TEXT NOT NULL,
+    clock_in_time TIMESTAMP NOT NULL,
+    clock_out_time TIMESTAMP,
+    duration_seconds INTEGER,
+    is_active BOOLEAN DEFAULT TRUE
+);
+
+CREATE INDEX IF NOT EXISTS idx_user_id ON shifts(user_id);
+
+-- (is_active, clock_in_time) serves both active-shift lookups and the
+-- oldest-first stale scan without a separate sort.
+CREATE INDEX IF NOT EXISTS idx_active_clock_in ON shifts(is_active, clock_in_time);
+
+DROP INDEX IF EXISTS idx_is_active;
+
+CREATE TABLE IF NOT EXISTS config (
+    key TEXT PRIMARY KEY,
+    value TEXT NOT NULL
+);
+
+CREATE TABLE IF NOT EXISTS warnings (
+    id SERIAL PRIMARY KEY,
+    user_id TEXT NOT NULL,
+    username TEXT NOT NULL,
+    moderator_id TEXT NOT NULL,
+    moderator_name TEXT NOT NULL,
+    reason TEXT NOT NULL,
+    timestamp TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP
+);
+
+CREATE INDEX IF NOT EXISTS idx_warnings_user_id ON warnings(user_id);
+
+CREATE TABLE IF NOT EXISTS scheduled_jobs (
+    name TEXT PRIMARY KEY,
+    last_run TIMESTAMP NOT NULL
+);
+
+-- Marker left by the boot-time DDL check this engine replaces.
+DELETE FROM config WHERE key = 'schema_version';
@@ -0,0 +1,17 @@
+-- migrate: no-transaction
+--
+-- Only a handful of shifts are ever active, so indexes restricted to them
+-- stay tiny no matter how much history accumulates. They replace
+-- idx_active_clock_in, which indexed every completed shift as well.
+-- Each CREATE is preceded by a DROP so a build that failed half-way (and
+-- left an INVALID index behind) is rebuilt on the next attempt.
+
+DROP INDEX CONCURRENTLY IF EXISTS idx_shifts_active_user;
+CREATE INDEX CONCURRENTLY idx_shifts_active_user
+    ON shifts (user_id) WHERE is_active = TRUE;
+
+DROP INDEX CONCURRENTLY IF EXISTS idx_shifts_active_clock_in;
+CREATE INDEX CONCURRENTLY idx_shifts_active_clock_in
+    ON shifts (clock_in_time) WHERE is_active = TRUE;
+
+DROP INDEX CONCURRENTLY IF EXISTS idx_active_clock_in;
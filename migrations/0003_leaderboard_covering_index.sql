@@ -0,0 +1,11 @@
+-- migrate: no-transaction
+--
+-- Covers the per-user total over completed shifts (also computed on every
+-- clock out) as an index-only scan. It also covers the leaderboard's
+-- GROUP BY user_id, username, which the planner switches to once reading
+-- this narrow index beats a sequential scan of the whole table.
+
+DROP INDEX CONCURRENTLY IF EXISTS idx_shifts_completed_totals;
+CREATE INDEX CONCURRENTLY idx_shifts_completed_totals
+    ON shifts (user_id, username) INCLUDE (duration_seconds)
+    WHERE is_active = FALSE AND duration_seconds IS NOT NULL;
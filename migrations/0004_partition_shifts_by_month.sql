@@ -0,0 +1,71 @@
+-- Monthly range partitions on clock_in_time, plus per-month summaries for
+-- partitions that have been archived.
+--
+-- This rewrites shifts once: the existing rows are copied into the new
+-- partitions inside this transaction, so shifts is locked until it commits.
+-- Partitions from the oldest shift through three months ahead are created
+-- here; the bot's shift_partitions job keeps creating them after that.
+-- Timestamps are naive UTC, hence NOW() AT TIME ZONE 'utc'.
+
+ALTER TABLE shifts RENAME TO shifts_unpartitioned;
+ALTER SEQUENCE shifts_id_seq OWNED BY NONE;
+
+CREATE TABLE shifts (
+    id INTEGER NOT NULL DEFAULT nextval('shifts_id_seq'),
+    user_id TEXT NOT NULL,
+    username TEXT NOT NULL,
+    clock_in_time TIMESTAMP NOT NULL,
+    clock_out_time TIMESTAMP,
+    duration_seconds INTEGER,
+    is_active BOOLEAN DEFAULT TRUE,
+    PRIMARY KEY (id, clock_in_time)
+) PARTITION BY RANGE (clock_in_time);
+
+ALTER SEQUENCE shifts_id_seq OWNED BY shifts.id;
+
+-- Catches anything outside the monthly partitions so a clock in can never
+-- fail for want of a partition. It should stay empty.
+CREATE TABLE shifts_default PARTITION OF shifts DEFAULT;
+
+DO $$
+DECLARE
+    month DATE;
+    last_month DATE := date_trunc('month', (NOW() AT TIME ZONE 'utc') + INTERVAL '3 months')::DATE;
+BEGIN
+    month := date_trunc('month', LEAST(
+        COALESCE((SELECT MIN(clock_in_time) FROM shifts_unpartitioned), NOW() AT TIME ZONE 'utc'),
+        NOW() AT TIME ZONE 'utc'
+    ))::DATE;
+    WHILE month <= last_month LOOP
+        EXECUTE format(
+            'CREATE TABLE %I PARTITION OF shifts FOR VALUES FROM (%L) TO (%L)',
+            'shifts_' || to_char(month, 'YYYY_MM'), month, (month + INTERVAL '1 month')::DATE
+        );
+        month := (month + INTERVAL '1 month')::DATE;
+    END LOOP;
+END $$;
+
+INSERT INTO shifts (id, user_id, username, clock_in_time, clock_out_time, duration_seconds, is_active)
+SELECT id, user_id, username, clock_in_time, clock_out_time, duration_seconds, is_active
+FROM shifts_unpartitioned;
+
+DROP TABLE shifts_unpartitioned;
+
+-- Indexes on the parent are created on every partition, present and future.
+CREATE INDEX idx_user_id ON shifts (user_id);
+CREATE INDEX idx_shifts_active_user ON shifts (user_id) WHERE is_active = TRUE;
+CREATE INDEX idx_shifts_active_clock_in ON shifts (clock_in_time) WHERE is_active = TRUE;
+CREATE INDEX idx_shifts_completed_totals ON shifts (user_id, username) INCLUDE (duration_seconds)
+    WHERE is_active = FALSE AND duration_seconds IS NOT NULL;
+
+-- Completed shifts from detached partitions, one row per user per month.
+CREATE TABLE shift_archive_totals (
+    month DATE NOT NULL,
+    user_id TEXT NOT NULL,
+    username TEXT NOT NULL,
+    shift_count INTEGER NOT NULL,
+    total_seconds BIGINT NOT NULL,
+    PRIMARY KEY (month, user_id, username)
+);
+
+CREATE INDEX idx_shift_archive_totals_user_id ON shift_archive_totals (user_id);
@@ -0,0 +1,8 @@
+-- Which Roblox account each Discord user plays on, for the presence poller.
+
+CREATE TABLE roblox_links (
+    discord_user_id TEXT PRIMARY KEY,
+    roblox_user_id BIGINT NOT NULL UNIQUE,
+    roblox_username TEXT NOT NULL,
+    linked_at TIMESTAMP NOT NULL DEFAULT (NOW() AT TIME ZONE 'utc')
+);
@@ -0,0 +1,30 @@
+-- Local ledger of Roblox game bans, one row per Roblox user: written by
+-- /ban_player and /unban_player and reconciled against the universe's
+-- Open Cloud user-restrictions list, so /ban_status and /bans never have
+-- to call Roblox. moderator_* is NULL for bans made outside the bot
+-- (Creator Hub, in-game) that only the sync knows about.
+
+CREATE TABLE bans (
+    roblox_user_id BIGINT PRIMARY KEY,
+    roblox_username TEXT,
+    active BOOLEAN NOT NULL,
+    reason TEXT,
+    moderator_id TEXT,
+    moderator_name TEXT,
+    -- NULL if the ledger only ever saw the unban.
+    banned_at TIMESTAMP,
+    -- NULL for a permanent ban.
+    expires_at TIMESTAMP,
+    unbanned_at TIMESTAMP,
+    unbanned_by TEXT,
+    -- 'bot' or 'sync': who wrote the current state.
+    source TEXT NOT NULL,
+    synced_at TIMESTAMP
+);
+
+-- /bans lists active bans soonest-expiring first.
+CREATE INDEX idx_bans_active_expiry ON bans (expires_at) WHERE active = TRUE;
+-- /bans moderator:<member>, newest first.
+CREATE INDEX idx_bans_moderator ON bans (moderator_id, banned_at DESC) WHERE moderator_id IS NOT NULL;
+-- /ban_status by username.
+CREATE INDEX idx_bans_username ON bans (LOWER(roblox_username));
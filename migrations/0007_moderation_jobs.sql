@@ -0,0 +1,35 @@
+-- Durable queue for moderation side effects (kicks, timeouts, warning
+-- DMs, Roblox bans). Commands enqueue; ModerationQueue workers claim due
+-- jobs with FOR UPDATE SKIP LOCKED and hold them by lease (locked_until),
+-- so a job whose worker died is picked up again once the lease runs out.
+-- Completed jobs are kept for a while so a repeated idempotency_key is
+-- still recognised; jobs out of attempts move to moderation_dead_letters.
+
+CREATE TABLE moderation_jobs (
+    id BIGSERIAL PRIMARY KEY,
+    kind TEXT NOT NULL,
+    payload JSONB NOT NULL,
+    idempotency_key TEXT NOT NULL UNIQUE,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    max_attempts INTEGER NOT NULL,
+    run_after TIMESTAMP NOT NULL DEFAULT (NOW() AT TIME ZONE 'utc'),
+    locked_until TIMESTAMP,
+    last_error TEXT,
+    created_at TIMESTAMP NOT NULL DEFAULT (NOW() AT TIME ZONE 'utc'),
+    completed_at TIMESTAMP
+);
+
+-- Workers only ever look at unfinished jobs, oldest due first.
+CREATE INDEX idx_moderation_jobs_due ON moderation_jobs (run_after, id) WHERE completed_at IS NULL;
+CREATE INDEX idx_moderation_jobs_completed ON moderation_jobs (completed_at) WHERE completed_at IS NOT NULL;
+
+CREATE TABLE moderation_dead_letters (
+    id BIGINT PRIMARY KEY,
+    kind TEXT NOT NULL,
+    payload JSONB NOT NULL,
+    idempotency_key TEXT NOT NULL,
+    attempts INTEGER NOT NULL,
+    last_error TEXT,
+    created_at TIMESTAMP NOT NULL,
+    failed_at TIMESTAMP NOT NULL DEFAULT (NOW() AT TIME ZONE 'utc')
+);
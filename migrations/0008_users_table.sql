@@ -0,0 +1,50 @@
+-- Usernames move out of every shift row into one row per Discord user.
+-- The bot writes a user's row when they clock in (with the name from its
+-- member cache) and renames it when Discord reports a username change.
+--
+-- Dropping shifts.username is a catalog change on the parent and every
+-- partition, not a rewrite. The covering index for per-user totals is
+-- rebuilt without it, and archived monthly totals are merged across
+-- usernames, since they no longer tell them apart.
+
+CREATE TABLE users (
+    user_id TEXT PRIMARY KEY,
+    username TEXT NOT NULL,
+    updated_at TIMESTAMP NOT NULL DEFAULT (NOW() AT TIME ZONE 'utc')
+);
+
+-- Each user's most recent name, from their newest shift or archived month.
+INSERT INTO users (user_id, username)
+SELECT DISTINCT ON (user_id) user_id, username
+FROM (
+    SELECT user_id, username, clock_in_time AS seen FROM shifts
+    UNION ALL
+    SELECT user_id, username, month FROM shift_archive_totals
+) names
+ORDER BY user_id, seen DESC;
+
+DROP INDEX idx_shifts_completed_totals;
+ALTER TABLE shifts DROP COLUMN username;
+CREATE INDEX idx_shifts_completed_totals ON shifts (user_id) INCLUDE (duration_seconds)
+    WHERE is_active = FALSE AND duration_seconds IS NOT NULL;
+
+ALTER TABLE shift_archive_totals RENAME TO shift_archive_totals_by_name;
+ALTER TABLE shift_archive_totals_by_name RENAME CONSTRAINT shift_archive_totals_pkey TO shift_archive_totals_by_name_pkey;
+DROP INDEX idx_shift_archive_totals_user_id;
+
+CREATE TABLE shift_archive_totals (
+    month DATE NOT NULL,
+    user_id TEXT NOT NULL,
+    shift_count INTEGER NOT NULL,
+    total_seconds BIGINT NOT NULL,
+    PRIMARY KEY (month, user_id)
+);
+
+INSERT INTO shift_archive_totals (month, user_id, shift_count, total_seconds)
+SELECT month, user_id, SUM(shift_count), SUM(total_seconds)
+FROM shift_archive_totals_by_name
+GROUP BY month, user_id;
+
+DROP TABLE shift_archive_totals_by_name;
+
+CREATE INDEX idx_shift_archive_totals_user_id ON shift_archive_totals (user_id);
@@ -0,0 +1,180 @@
+import asyncio
+import logging
+import random
+from typing import Awaitable, Callable, Dict, Optional, Set
+
+from log_config import correlation_id
+
+logger = logging.getLogger(__name__)
+
+CONCURRENCY = 4
+# A claimed job is handed out again if its worker hasn't finished it by
+# then; handlers are cut off at half of this.
+LEASE_SECONDS = 120.0
+# How often to look for jobs nobody woke us for: retries due from another
+# process, or jobs whose worker died mid-lease.
+POLL_INTERVAL = 30.0
+DEFAULT_MAX_ATTEMPTS = 6
+RETRY_BASE = 5.0
+RETRY_MAX = 900.0
+
+Handler = Callable[[Dict], Awaitable[None]]
+
+
+class PermanentJobError(Exception):
+    """Raised by a handler when retrying can't help, e.g. missing permissions."""
+
+
+class ModerationQueue:
+    """Runs moderation side effects from the Postgres-backed moderation_jobs table.
+
+    Commands ``enqueue`` a job and return; the dispatcher claims due jobs
+    (``ShiftDatabase.claim_moderation_jobs``) and runs up to
+    ``concurrency`` of them at a time. A failed job is retried with
+    exponential backoff and jitter; one that runs out of attempts, or
+    raises ``PermanentJobError``, moves to moderation_dead_letters and is
+    passed to ``on_dead_letter``.
+
+    Delivery is at least once: a worker that dies after the side effect but
+    before recording it leaves the job to run again when its lease ends, so
+    handlers should tolerate repeats (a kick of someone already gone is a
+    success).
+    """
+
+    def __init__(self, db, concurrency: int = CONCURRENCY, lease_seconds: float = LEASE_SECONDS,
+                 poll_interval: float = POLL_INTERVAL):
+        self.db = db
+        self.concurrency = concurrency
+        self.lease_seconds = lease_seconds
+        self.poll_interval = poll_interval
+        self.on_dead_letter: Optional[Callable[[Dict, str], Awaitable[None]]] = None
+        self._handlers: Dict[str, Handler] = {}
+        self._max_attempts: Dict[str, int] = {}
+        self._running: Set[asyncio.Task] = set()
+        self._wake = asyncio.Event()
+        self._task: Optional[asyncio.Task] = None
+        self.stats = {
+            'enqueued': 0,
+            'duplicates': 0,
+            'completed': 0,
+            'retried': 0,
+            'dead_lettered': 0,
+            'claim_errors': 0,
+        }
+
+    def register(self, kind: str, handler: Handler, max_attempts: int = DEFAULT_MAX_ATTEMPTS):
+        self._handlers[kind] = handler
+        self._max_attempts[kind] = max_attempts
+
+    async def enqueue(self, kind: str, payload: Dict, idempotency_key: str) -> bool:
+        """Queue a job; False if ``idempotency_key`` was already used."""
+        if kind not in self._handlers:
+            raise ValueError(f"No handler registered for moderation job '{kind}'")
+        _, created = await asyncio.to_thread(
+            self.db.enqueue_moderation_job, kind, payload, idempotency_key, self._max_attempts[kind]
+        )
+        self.stats['enqueued' if created else 'duplicates'] += 1
+        self._wake.set()
+        return created
+
+    def start(self):
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._run(), name='moderation-queue')
+
+    async def stop(self, timeout: Optional[float] = None):
+        """Stop claiming jobs and wait up to ``timeout`` for the ones in flight.
+
+        Jobs still running after that are cancelled; their leases run out
+        and they are claimed again after the restart.
+        """
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+        if self._running:
+            await asyncio.wait(set(self._running), timeout=timeout)
+        for task in list(self._running):
+            task.cancel()
+        await asyncio.gather(*self._running, return_exceptions=True)
+
+    async def _run(self):
+        while True:
+            # Cleared before looking, so a wake-up (a new job, a finished
+            # one) that lands while claiming isn't lost.
+            self._wake.clear()
+            free = self.concurrency - len(self._running)
+            jobs = []
+            if free > 0:
+                try:
+                    jobs = await asyncio.to_thread(self.db.claim_moderation_jobs, free, self.lease_seconds)
+                except Exception as e:
+                    self.stats['claim_errors'] += 1
+                    logger.error(f"Error claiming moderation jobs: {e}")
+                for job in jobs:
+                    task = asyncio.create_task(self._execute(job), name=f"moderation-job:{job['id']}")
+                    self._running.add(task)
+                    task.add_done_callback(self._job_finished)
+            # With every slot taken, or a full batch claimed, go again as
+            # soon as a job finishes; otherwise when woken or on the poll.
+            if free > 0 and len(jobs) < free:
+                timeout = self.poll_interval
+            else:
+                timeout = None
+            try:
+                await asyncio.wait_for(self._wake.wait(), timeout)
+            except asyncio.TimeoutError:
+                pass
+
+    def _job_finished(self, task: asyncio.Task):
+        self._running.discard(task)
+        self._wake.set()
+
+    async def _execute(self, job: Dict):
+        correlation_id.set(f"moderation:{job['id']}")
+        handler = self._handlers.get(job['kind'])
+        try:
+            if handler is None:
+                raise PermanentJobError(f"no handler for '{job['kind']}'")
+            async with asyncio.timeout(self.lease_seconds / 2):
+                await handler(job['payload'])
+        except PermanentJobError as e:
+            await self._dead_letter(job, str(e))
+            return
+        except Exception as e:
+            error = f"{type(e).__name__}: {e}"
+            if job['attempts'] >= job['max_attempts']:
+                await self._dead_letter(job, error)
+                return
+            delay = min(RETRY_BASE * 2 ** (job['attempts'] - 1), RETRY_MAX) * random.uniform(0.8, 1.2)
+            logger.warning(f"Moderation job {job['kind']} #{job['id']} failed (attempt {job['attempts']}/"
+                           f"{job['max_attempts']}), retrying in {delay:.0f}s: {error}")
+            try:
+                await asyncio.to_thread(self.db.retry_moderation_job, job['id'], delay, error)
+            except Exception as db_error:
+                # The lease runs out and the job is claimed again anyway.
+                logger.error(f"Error rescheduling moderation job #{job['id']}: {db_error}")
+            self.stats['retried'] += 1
+            asyncio.get_running_loop().call_later(delay, self._wake.set)
+            return
+
+        try:
+            await asyncio.to_thread(self.db.complete_moderation_job, job['id'])
+        except Exception as e:
+            logger.error(f"Error completing moderation job #{job['id']}, it may run again: {e}")
+        self.stats['completed'] += 1
+
+    async def _dead_letter(self, job: Dict, error: str):
+        logger.error(f"Moderation job {job['kind']} #{job['id']} failed after {job['attempts']} attempt(s): {error}")
+        try:
+            await asyncio.to_thread(self.db.dead_letter_moderation_job, job['id'], error)
+        except Exception as e:
+            logger.error(f"Error dead-lettering moderation job #{job['id']}: {e}")
+        self.stats['dead_lettered'] += 1
+        if self.on_dead_letter:
+            try:
+                await self.on_dead_letter(job, error)
+            except Exception as e:
+                logger.error(f"Error reporting dead moderation job #{job['id']}: {e}")
+
+    def summary(self) -> Dict:
+        return {**self.stats, 'running': len(self._running)}
@@ -0,0 +1,219 @@
+import asyncio
+import contextvars
+import functools
+import logging
+import sys
+import threading
+import time
+import traceback
+from collections import deque
+from typing import Dict, List, Optional
+
+import discord
+
+from log_config import correlation_id
+
+logger = logging.getLogger(__name__)
+
+SPAN_BUFFER_SIZE = 5000
+LAG_SAMPLE_INTERVAL = 0.5
+SLOW_CALLBACK_THRESHOLD = 0.25
+WINDOW_SECONDS = 3600
+
+current_span: contextvars.ContextVar[Optional["Span"]] = contextvars.ContextVar('current_span', default=None)
+
+
+class Span:
+    __slots__ = ('name', 'interaction_id', 'started', 'total_ms', 'db_ms', 'db_statements', 'rest_ms', 'rest_calls', 'error')
+
+    def __init__(self, name: str, interaction_id: Optional[int] = None):
+        self.name = name
+        self.interaction_id = interaction_id
+        self.started = time.time()
+        self.total_ms = 0.0
+        self.db_ms = 0.0
+        self.db_statements = 0
+        self.rest_ms = 0.0
+        self.rest_calls = 0
+        self.error = False
+
+
+class PerfMonitor:
+    """Per-command spans, event-loop lag samples and slow-callback stacks.
+
+    Everything is kept in fixed-size in-memory ring buffers; ``/perf``
+    summarizes the last hour.
+    """
+
+    def __init__(self):
+        self.spans: deque = deque(maxlen=SPAN_BUFFER_SIZE)
+        self.lag_samples: deque = deque(maxlen=int(WINDOW_SECONDS / LAG_SAMPLE_INTERVAL))
+        self.slow_callbacks: deque = deque(maxlen=50)
+        self._due = time.monotonic()
+        self._lag_task: Optional[asyncio.Task] = None
+        self._watchdog: Optional[threading.Thread] = None
+        self._stop = threading.Event()
+        self._loop_thread_id: Optional[int] = None
+        # Seconds since process start (``*_at``) or durations of startup phases.
+        self.startup: Dict[str, float] = {}
+        # Traced handlers running right now; shutdown waits for this to reach 0.
+        self.in_flight = 0
+
+    # --- spans ---
+
+    def traced(self, name: str):
+        """Wrap a command or button callback in a span named ``name``."""
+        def decorator(func):
+            @functools.wraps(func)
+            async def wrapper(*args, **kwargs):
+                interaction = next((arg for arg in args if isinstance(arg, discord.Interaction)), None)
+                span = Span(name, interaction.id if interaction else None)
+                token = current_span.set(span)
+                log_token = correlation_id.set(str(span.interaction_id) if span.interaction_id else None)
+                start = time.perf_counter()
+                self.in_flight += 1
+                try:
+                    return await func(*args, **kwargs)
+                except Exception:
+                    span.error = True
+                    raise
+                finally:
+                    self.in_flight -= 1
+                    span.total_ms = (time.perf_counter() - start) * 1000
+                    current_span.reset(token)
+                    correlation_id.reset(log_token)
+                    self.spans.append(span)
+            return wrapper
+        return decorator
+
+    @staticmethod
+    def record_db(query, seconds: float):
+        span = current_span.get()
+        if span is not None:
+            span.db_ms += seconds * 1000
+            if query not in ('COMMIT', 'ROLLBACK'):
+                span.db_statements += 1
+
+    @staticmethod
+    def record_rest(seconds: float):
+        span = current_span.get()
+        if span is not None:
+            span.rest_ms += seconds * 1000
+            span.rest_calls += 1
+
+    def instrument_http(self, http: discord.http.HTTPClient):
+        # Bot REST calls go through HTTPClient.request; interaction responses
+        # and followups go through the webhook adapter, so time both.
+        original = http.request
+
+        async def request(route, **kwargs):
+            start = time.perf_counter()
+            try:
+                return await original(route, **kwargs)
+            finally:
+                self.record_rest(time.perf_counter() - start)
+
+        http.request = request
+
+        adapter_cls = discord.webhook.async_.AsyncWebhookAdapter
+        if not getattr(adapter_cls.request, '_perf_wrapped', False):
+            original_adapter_request = adapter_cls.request
+
+            async def adapter_request(adapter, *args, **kwargs):
+                start = time.perf_counter()
+                try:
+                    return await original_adapter_request(adapter, *args, **kwargs)
+                finally:
+                    self.record_rest(time.perf_counter() - start)
+
+            adapter_request._perf_wrapped = True
+            adapter_cls.request = adapter_request
+
+    def recent_spans(self, window: float = WINDOW_SECONDS) -> List[Span]:
+        cutoff = time.time() - window
+        return [span for span in self.spans if span.started >= cutoff]
+
+    def command_summary(self, window: float = WINDOW_SECONDS) -> List[Dict]:
+        by_name: Dict[str, List[Span]] = {}
+        for span in self.recent_spans(window):
+            by_name.setdefault(span.name, []).append(span)
+
+        summary = []
+        for name, spans in by_name.items():
+            totals = sorted(span.total_ms for span in spans)
+            summary.append({
+                'name': name,
+                'count': len(spans),
+                'p50_ms': totals[len(totals) // 2],
+                'p95_ms': totals[min(len(totals) - 1, int(len(totals) * 0.95))],
+                'max_ms': totals[-1],
+                'db_ms': sum(span.db_ms for span in spans) / len(spans),
+                'rest_ms': sum(span.rest_ms for span in spans) / len(spans),
+                'errors': sum(1 for span in spans if span.error),
+            })
+        summary.sort(key=lambda entry: entry['p95_ms'], reverse=True)
+        return summary
+
+    # --- event loop lag and slow callbacks ---
+
+    def start(self):
+        if self._lag_task and not self._lag_task.done():
+            return
+        self._loop_thread_id = threading.get_ident()
+        self._due = time.monotonic()
+        self._lag_task = asyncio.create_task(self._sample_lag())
+        self._stop.clear()
+        self._watchdog = threading.Thread(target=self._watch_loop, name='perf-watchdog', daemon=True)
+        self._watchdog.start()
+
+    def stop(self):
+        self._stop.set()
+        if self._lag_task:
+            self._lag_task.cancel()
+
+    async def _sample_lag(self):
+        while True:
+            self._due = time.monotonic() + LAG_SAMPLE_INTERVAL
+            await asyncio.sleep(LAG_SAMPLE_INTERVAL)
+            self.lag_samples.append((time.time(), max(0.0, time.monotonic() - self._due) * 1000))
+
+    def _watch_loop(self):
+        # Runs in its own thread. If the lag sampler is overdue by more than
+        # the threshold, a callback is blocking the loop: grab its stack.
+        stalled_since = None
+        while not self._stop.wait(0.05):
+            due = self._due
+            late = time.monotonic() - due
+            if late < SLOW_CALLBACK_THRESHOLD:
+                stalled_since = None
+                continue
+            if stalled_since == due:
+                # Same stall as last time round; just extend its duration.
+                self.slow_callbacks[-1]['blocked_ms'] = late * 1000
+                continue
+
+            stalled_since = due
+            frame = sys._current_frames().get(self._loop_thread_id)
+            stack = ''.join(traceback.format_stack(frame)) if frame else ''
+            self.slow_callbacks.append({
+                'at': time.time(),
+                'blocked_ms': late * 1000,
+                'stack': stack,
+            })
+            logger.warning(f"Event loop blocked for over {SLOW_CALLBACK_THRESHOLD * 1000:.0f} ms:\n{stack}")
+
+    def lag_summary(self, window: float = WINDOW_SECONDS) -> Dict:
+        cutoff = time.time() - window
+        lags = sorted(lag for at, lag in self.lag_samples if at >= cutoff)
+        if not lags:
+            return {'samples': 0, 'p50_ms': 0.0, 'p99_ms': 0.0, 'max_ms': 0.0}
+        return {
+            'samples': len(lags),
+            'p50_ms': lags[len(lags) // 2],
+            'p99_ms': lags[min(len(lags) - 1, int(len(lags) * 0.99))],
+            'max_ms': lags[-1],
+        }
+
+
+perf_monitor = PerfMonitor()
+traced = perf_monitor.traced
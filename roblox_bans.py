@@ -0,0 +1,142 @@
+import asyncio
+import logging
+from datetime import datetime, timedelta, timezone
+from typing import Dict, List, Optional, Tuple
+
+import aiohttp
+
+logger = logging.getLogger(__name__)
+
+OPEN_CLOUD_URL = 'https://apis.roblox.com/cloud/v2'
+USERS_URL = 'https://users.roblox.com/v1/users'
+# Largest page the user-restrictions list serves.
+RESTRICTIONS_PAGE_SIZE = 100
+# Most user IDs the users endpoint resolves per request.
+USERNAME_BATCH_SIZE = 100
+# Attempts per request when Roblox answers 429.
+MAX_ATTEMPTS = 4
+MAX_RETRY_AFTER = 60.0
+
+
+def restrictions_url(universe_id: str, roblox_user_id: Optional[int] = None) -> str:
+    url = f"{OPEN_CLOUD_URL}/universes/{universe_id}/user-restrictions"
+    return f"{url}/{roblox_user_id}" if roblox_user_id is not None else url
+
+
+def _parse_time(value: Optional[str]) -> Optional[datetime]:
+    # Open Cloud timestamps are RFC 3339 with up to nanosecond precision;
+    # returned as naive UTC like the rest of the database.
+    if not value:
+        return None
+    value = value.replace('Z', '+00:00')
+    if '.' in value:
+        head, _, rest = value.partition('.')
+        digits = len(rest) - len(rest.lstrip('0123456789'))
+        value = f"{head}.{rest[:min(digits, 6)].ljust(6, '0')}{rest[digits:]}"
+    parsed = datetime.fromisoformat(value)
+    if parsed.tzinfo is not None:
+        parsed = parsed.astimezone(timezone.utc).replace(tzinfo=None)
+    return parsed
+
+
+def _parse_duration(value: Optional[str]) -> Optional[timedelta]:
+    # Protobuf durations, e.g. "86400s".
+    if not value or not value.endswith('s'):
+        return None
+    return timedelta(seconds=float(value[:-1]))
+
+
+def parse_restriction(entry: Dict) -> Optional[Tuple[int, bool, Optional[str], Optional[datetime], Optional[datetime]]]:
+    """One user-restrictions entry as a ``ShiftDatabase.sync_bans`` row, or None if it names no user."""
+    user = entry.get('user') or entry.get('path', '')
+    user_id = user.rsplit('/', 1)[-1]
+    if not user_id.isdigit():
+        return None
+
+    restriction = entry.get('gameJoinRestriction') or {}
+    banned_at = _parse_time(restriction.get('startTime'))
+    duration = _parse_duration(restriction.get('duration'))
+    expires_at = banned_at + duration if banned_at and duration else None
+    return int(user_id), bool(restriction.get('active')), restriction.get('displayReason') or None, banned_at, expires_at
+
+
+async def _request(session: aiohttp.ClientSession, method: str, url: str, **kwargs) -> Dict:
+    for attempt in range(1, MAX_ATTEMPTS + 1):
+        async with session.request(method, url, **kwargs) as resp:
+            if resp.status == 429 and attempt < MAX_ATTEMPTS:
+                try:
+                    retry_after = float(resp.headers.get('Retry-After', 0))
+                except ValueError:
+                    retry_after = 0.0
+                delay = min(max(retry_after, 2.0 ** attempt), MAX_RETRY_AFTER)
+                logger.warning(f"Roblox rate limited {url}, retrying in {delay:.0f}s")
+                await asyncio.sleep(delay)
+                continue
+            resp.raise_for_status()
+            return await resp.json()
+
+
+async def set_game_ban(universe_id: str, api_key: str, roblox_user_id: int, active: bool,
+                       reason: Optional[str] = None, duration_seconds: Optional[int] = None):
+    """Ban (or with ``active=False`` unban) a user from the universe.
+
+    Raises aiohttp.ClientResponseError if Roblox refuses. Setting the same
+    state twice is harmless, so a retried job can't double-ban.
+    """
+    restriction = {'active': active}
+    if active:
+        restriction['displayReason'] = reason
+        if duration_seconds:
+            restriction['duration'] = f"{duration_seconds}s"
+
+    async with aiohttp.ClientSession(timeout=aiohttp.ClientTimeout(total=30)) as session:
+        async with session.patch(
+            restrictions_url(universe_id, roblox_user_id),
+            headers={'x-api-key': api_key},
+            json={'gameJoinRestriction': restriction},
+        ) as resp:
+            resp.raise_for_status()
+
+
+async def fetch_restrictions(session: aiohttp.ClientSession, universe_id: str, api_key: str) -> List[Dict]:
+    """Every entry of the universe's user-restrictions list, following page tokens."""
+    entries = []
+    params = {'maxPageSize': str(RESTRICTIONS_PAGE_SIZE)}
+    while True:
+        data = await _request(session, 'GET', restrictions_url(universe_id),
+                              headers={'x-api-key': api_key}, params=params)
+        entries.extend(data.get('userRestrictions', []))
+        if not data.get('nextPageToken'):
+            return entries
+        params['pageToken'] = data['nextPageToken']
+
+
+async def fetch_usernames(session: aiohttp.ClientSession, roblox_user_ids: List[int]) -> Dict[int, str]:
+    batches = [roblox_user_ids[i:i + USERNAME_BATCH_SIZE] for i in range(0, len(roblox_user_ids), USERNAME_BATCH_SIZE)]
+    results = await asyncio.gather(*(
+        _request(session, 'POST', USERS_URL, json={'userIds': batch, 'excludeBannedUsers': False})
+        for batch in batches
+    ))
+    return {user['id']: user['name'] for data in results for user in data.get('data', [])}
+
+
+async def sync_bans(db, universe_id: str, api_key: str) -> Dict:
+    """Reconcile the bans table with Roblox; returns ``ShiftDatabase.sync_bans``'s counts.
+
+    Nothing is written unless the whole list was read, so a failed page
+    can't make every ban after it look lifted.
+    """
+    started_at = datetime.now(timezone.utc).replace(tzinfo=None)
+    async with aiohttp.ClientSession(timeout=aiohttp.ClientTimeout(total=120)) as session:
+        entries = await fetch_restrictions(session, universe_id, api_key)
+        restrictions = [row for row in map(parse_restriction, entries) if row is not None]
+        result = await asyncio.to_thread(db.sync_bans, restrictions, started_at)
+
+        if result['unnamed']:
+            try:
+                usernames = await fetch_usernames(session, result['unnamed'])
+                await asyncio.to_thread(db.set_ban_usernames, usernames)
+            except aiohttp.ClientError as e:
+                # Only cosmetic; the next sync tries again.
+                logger.warning(f"Could not look up usernames for {len(result['unnamed'])} banned user(s): {e}")
+    return result
@@ -0,0 +1,198 @@
+import asyncio
+import logging
+import time
+from typing import Awaitable, Callable, Dict, List, Optional
+
+import aiohttp
+
+logger = logging.getLogger(__name__)
+
+PRESENCE_URL = 'https://presence.roblox.com/v1/presence/users'
+# Most user IDs the presence endpoint accepts per request.
+PRESENCE_BATCH_SIZE = 50
+
+# Seconds between polls: back to MIN_INTERVAL whenever someone's presence
+# changes, stretching towards MAX_INTERVAL while nothing does.
+MIN_INTERVAL = 30.0
+MAX_INTERVAL = 180.0
+INTERVAL_GROWTH = 1.5
+# Nobody linked is clocked in; a clock-in wakes the poller early anyway.
+IDLE_INTERVAL = 600.0
+MAX_BACKOFF = 900.0
+
+# userPresenceType values from the presence API.
+_PRESENCE_TYPES = {0: 'offline', 1: 'online', 2: 'in_game', 3: 'in_studio', 4: 'offline'}
+
+BADGES = {
+    'in_experience': '🎮',
+    'in_other_game': '🕹️',
+    'in_game': '🎮?',
+    'in_studio': '🛠️',
+    'online': '🌐',
+    'offline': '💤',
+}
+
+
+class PresenceStatus:
+    __slots__ = ('state', 'universe_id', 'location', 'checked_at')
+
+    def __init__(self, state: str, universe_id: Optional[int], location: Optional[str], checked_at: float):
+        self.state = state
+        self.universe_id = universe_id
+        self.location = location
+        self.checked_at = checked_at
+
+
+class PresencePoller:
+    """Checks whether clocked-in staff are actually in our Roblox experience.
+
+    Each cycle loads the Roblox IDs of everyone clocked in with a linked
+    account (``load_links``, a blocking DB read run in a thread) and asks
+    the presence endpoint about them in batches of ``batch_size``. Results
+    are kept in ``presence`` for the shift board; ``on_change`` is awaited
+    when anyone's state changes. ``presence_url`` can point at a local
+    stub for testing.
+    """
+
+    def __init__(self, load_links: Callable[[], Dict[str, int]],
+                 on_change: Optional[Callable[[], Awaitable[None]]] = None,
+                 presence_url: str = PRESENCE_URL, batch_size: int = PRESENCE_BATCH_SIZE):
+        self.load_links = load_links
+        self.on_change = on_change
+        self.presence_url = presence_url
+        self.batch_size = batch_size
+        # Set from config; None means any game counts as "in_game".
+        self.universe_id: Optional[int] = None
+        self.presence: Dict[str, PresenceStatus] = {}
+        self.interval = MIN_INTERVAL
+        self.stats = {'polls': 0, 'requests': 0, 'errors': 0, 'rate_limited': 0}
+        self._backoff = 0.0
+        self._wake = asyncio.Event()
+        self._task: Optional[asyncio.Task] = None
+        self._session: Optional[aiohttp.ClientSession] = None
+
+    def badge(self, discord_user_id: str) -> str:
+        status = self.presence.get(discord_user_id)
+        return f" {BADGES[status.state]}" if status else ""
+
+    def wake(self):
+        """Poll now instead of waiting out the interval, e.g. after a clock-in."""
+        self._wake.set()
+
+    def start(self):
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._run(), name='roblox-presence')
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+        if self._session is not None:
+            await self._session.close()
+            self._session = None
+
+    async def _run(self):
+        while True:
+            try:
+                delay = await self.poll()
+            except Exception as e:
+                logger.error(f"Error polling Roblox presence: {e}")
+                delay = MAX_INTERVAL
+            try:
+                await asyncio.wait_for(self._wake.wait(), delay)
+            except asyncio.TimeoutError:
+                pass
+            self._wake.clear()
+
+    async def poll(self) -> float:
+        """Run one cycle; returns the seconds to wait before the next."""
+        links = await asyncio.to_thread(self.load_links)
+        if not links:
+            changed = bool(self.presence)
+            self.presence.clear()
+            if changed and self.on_change:
+                await self.on_change()
+            return IDLE_INTERVAL
+
+        self.stats['polls'] += 1
+        roblox_ids = sorted(set(links.values()))
+        try:
+            presences = await self._fetch(roblox_ids)
+        except _RateLimited as e:
+            self.stats['rate_limited'] += 1
+            self._backoff = max(e.retry_after, min(max(self._backoff * 2, MIN_INTERVAL), MAX_BACKOFF))
+            logger.warning(f"Roblox presence rate limited, next poll in {self._backoff:.0f}s")
+            return self._backoff
+        except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+            self.stats['errors'] += 1
+            self._backoff = min(max(self._backoff * 2, MIN_INTERVAL), MAX_BACKOFF)
+            logger.warning(f"Roblox presence request failed, next poll in {self._backoff:.0f}s: {e}")
+            return self._backoff
+        self._backoff = 0.0
+
+        now = time.time()
+        updated = {}
+        for discord_user_id, roblox_user_id in links.items():
+            entry = presences.get(roblox_user_id)
+            if entry is None:
+                continue
+            updated[discord_user_id] = PresenceStatus(
+                self._state(entry), entry.get('universeId'), entry.get('lastLocation'), now
+            )
+
+        changed = (
+            updated.keys() != self.presence.keys()
+            or any(status.state != self.presence[user_id].state for user_id, status in updated.items())
+        )
+        self.presence = updated
+        if changed:
+            self.interval = MIN_INTERVAL
+            if self.on_change:
+                await self.on_change()
+        else:
+            self.interval = min(self.interval * INTERVAL_GROWTH, MAX_INTERVAL)
+        return self.interval
+
+    def _state(self, entry: Dict) -> str:
+        state = _PRESENCE_TYPES.get(entry.get('userPresenceType'), 'offline')
+        if state != 'in_game':
+            return state
+        universe_id = entry.get('universeId')
+        # Without a configured universe, or when the player's privacy
+        # settings hide which game it is, all we know is "in a game".
+        if self.universe_id is None or universe_id is None:
+            return 'in_game'
+        return 'in_experience' if universe_id == self.universe_id else 'in_other_game'
+
+    async def _fetch(self, roblox_ids: List[int]) -> Dict[int, Dict]:
+        if self._session is None:
+            self._session = aiohttp.ClientSession(timeout=aiohttp.ClientTimeout(total=15))
+
+        batches = [roblox_ids[i:i + self.batch_size] for i in range(0, len(roblox_ids), self.batch_size)]
+        results = await asyncio.gather(*(self._fetch_batch(batch) for batch in batches))
+        return {entry['userId']: entry for batch in results for entry in batch}
+
+    async def _fetch_batch(self, roblox_ids: List[int]) -> List[Dict]:
+        self.stats['requests'] += 1
+        async with self._session.post(self.presence_url, json={'userIds': roblox_ids}) as resp:
+            if resp.status == 429:
+                try:
+                    retry_after = float(resp.headers.get('Retry-After', 0))
+                except ValueError:
+                    retry_after = 0.0
+                raise _RateLimited(retry_after)
+            resp.raise_for_status()
+            data = await resp.json()
+            return data.get('userPresences', [])
+
+    def summary(self) -> Dict:
+        counts: Dict[str, int] = {}
+        for status in self.presence.values():
+            counts[status.state] = counts.get(status.state, 0) + 1
+        return {**self.stats, 'interval': self.interval, 'backoff': self._backoff, 'states': counts}
+
+
+class _RateLimited(Exception):
+    def __init__(self, retry_after: float):
+        super().__init__(f"rate limited, retry after {retry_after}s")
+        self.retry_after = retry_after
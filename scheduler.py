@@ -0,0 +1,236 @@
+import asyncio
+import heapq
+import logging
+from datetime import datetime, timedelta, timezone
+from typing import Awaitable, Callable, Dict, List, Optional, Set
+
+from log_config import correlation_id
+
+logger = logging.getLogger(__name__)
+
+FIELD_RANGES = [
+    (0, 59),   # minute
+    (0, 23),   # hour
+    (1, 31),   # day of month
+    (1, 12),   # month
+    (0, 6),    # day of week, 0 = Sunday
+]
+MAX_CATCH_UP_SLOTS = 100000
+
+
+def _parse_field(field: str, low: int, high: int, is_weekday: bool = False) -> Set[int]:
+    # Day of week also accepts 7 for Sunday, as most crons do.
+    top = 7 if is_weekday else high
+    values = set()
+    for part in field.split(','):
+        step = 1
+        if '/' in part:
+            part, step_text = part.split('/', 1)
+            step = int(step_text)
+            if step <= 0:
+                raise ValueError(f"Invalid step in cron field '{field}'")
+
+        if part == '*':
+            start, end = low, high
+        elif '-' in part:
+            start_text, end_text = part.split('-', 1)
+            start, end = int(start_text), int(end_text)
+        else:
+            start = int(part)
+            end = high if step > 1 else start
+
+        if start < low or end > top or start > end:
+            raise ValueError(f"Cron field '{field}' out of range {low}-{top}")
+
+        values.update(value % 7 if is_weekday else value for value in range(start, end + 1, step))
+    return values
+
+
+class CronExpression:
+    """Standard five-field cron expression, evaluated in UTC."""
+
+    def __init__(self, expression: str):
+        fields = expression.split()
+        if len(fields) != 5:
+            raise ValueError(f"Cron expression '{expression}' must have five fields")
+
+        self.expression = expression
+        self.minutes = _parse_field(fields[0], *FIELD_RANGES[0])
+        self.hours = _parse_field(fields[1], *FIELD_RANGES[1])
+        self.days = _parse_field(fields[2], *FIELD_RANGES[2])
+        self.months = _parse_field(fields[3], *FIELD_RANGES[3])
+        self.weekdays = _parse_field(fields[4], *FIELD_RANGES[4], is_weekday=True)
+        # Like cron, when both day fields are restricted either one matching
+        # is enough. As in Vixie cron, a field starting with '*' (so '*/2'
+        # too) counts as unrestricted.
+        self._day_or = not fields[2].startswith('*') and not fields[4].startswith('*')
+
+    def _day_matches(self, dt: datetime) -> bool:
+        day_ok = dt.day in self.days
+        weekday_ok = (dt.weekday() + 1) % 7 in self.weekdays
+        if self._day_or:
+            return day_ok or weekday_ok
+        return day_ok and weekday_ok
+
+    def next_after(self, dt: datetime) -> datetime:
+        dt = dt.astimezone(timezone.utc).replace(second=0, microsecond=0) + timedelta(minutes=1)
+        limit = dt + timedelta(days=366 * 5)
+
+        while dt < limit:
+            if dt.month not in self.months:
+                year, month = (dt.year + 1, 1) if dt.month == 12 else (dt.year, dt.month + 1)
+                dt = dt.replace(year=year, month=month, day=1, hour=0, minute=0)
+                continue
+            if not self._day_matches(dt):
+                dt = (dt + timedelta(days=1)).replace(hour=0, minute=0)
+                continue
+            if dt.hour not in self.hours:
+                dt = (dt + timedelta(hours=1)).replace(minute=0)
+                continue
+            if dt.minute not in self.minutes:
+                dt += timedelta(minutes=1)
+                continue
+            return dt
+
+        raise ValueError(f"Cron expression '{self.expression}' never fires")
+
+
+class ScheduledJob:
+    def __init__(self, name: str, cron: CronExpression, func: Callable[[], Awaitable[None]],
+                 catch_up: bool = False, run_at_start: bool = False):
+        self.name = name
+        self.cron = cron
+        self.func = func
+        self.catch_up = catch_up
+        self.run_at_start = run_at_start
+        self.task: Optional[asyncio.Task] = None
+        self.last_run: Optional[datetime] = None
+        self.next_run: Optional[datetime] = None
+
+
+class Scheduler:
+    """Single timer-heap loop that drives every periodic job.
+
+    Last-run times live in Postgres. Before a scheduled run starts it is
+    claimed with a conditional upsert, so a slot runs at most once even
+    across reconnects, restarts or two overlapping deploys. Jobs marked
+    ``catch_up`` run once on startup if a slot was missed while offline.
+    """
+
+    def __init__(self, db):
+        self.db = db
+        self.jobs: Dict[str, ScheduledJob] = {}
+        self._heap: List[tuple] = []
+        self._wakeup = asyncio.Event()
+        self._task: Optional[asyncio.Task] = None
+
+    @property
+    def is_running(self) -> bool:
+        return self._task is not None and not self._task.done()
+
+    def add_job(self, name: str, cron: str, func: Callable[[], Awaitable[None]],
+                catch_up: bool = False, run_at_start: bool = False):
+        self.jobs[name] = ScheduledJob(name, CronExpression(cron), func, catch_up, run_at_start)
+
+    def start(self):
+        if self.is_running:
+            return
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+        running = [job.task for job in self.jobs.values() if job.task and not job.task.done()]
+        if running:
+            await asyncio.gather(*running, return_exceptions=True)
+
+    def _push(self, job: ScheduledJob, when: datetime, slot: Optional[datetime]):
+        job.next_run = when
+        heapq.heappush(self._heap, (when, job.name, slot))
+        self._wakeup.set()
+
+    async def _load_schedule(self):
+        now = datetime.now(timezone.utc)
+        try:
+            last_runs = await asyncio.to_thread(self.db.get_job_runs)
+        except Exception as e:
+            logger.error(f"Could not load job history, scheduling from now: {e}")
+            last_runs = {}
+
+        self._heap.clear()
+        for job in self.jobs.values():
+            last = last_runs.get(job.name)
+            job.last_run = last.replace(tzinfo=timezone.utc) if last else None
+
+            if job.run_at_start:
+                self._start_job(job)
+
+            if job.catch_up and job.last_run:
+                missed = None
+                slot = job.cron.next_after(job.last_run)
+                for _ in range(MAX_CATCH_UP_SLOTS):
+                    if slot > now:
+                        break
+                    missed = slot
+                    slot = job.cron.next_after(slot)
+                if missed:
+                    logger.info(f"Catching up missed run of '{job.name}' scheduled for {missed.isoformat()}")
+                    self._push(job, now, missed)
+
+            next_slot = job.cron.next_after(now)
+            self._push(job, next_slot, next_slot)
+
+    async def _run(self):
+        await self._load_schedule()
+
+        while True:
+            self._wakeup.clear()
+            if not self._heap:
+                await self._wakeup.wait()
+                continue
+
+            when, name, slot = self._heap[0]
+            delay = (when - datetime.now(timezone.utc)).total_seconds()
+            if delay > 0:
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), timeout=min(delay, 3600))
+                except asyncio.TimeoutError:
+                    pass
+                continue
+
+            heapq.heappop(self._heap)
+            job = self.jobs[name]
+
+            try:
+                claimed = await asyncio.to_thread(self.db.claim_job_run, name, slot.replace(tzinfo=None))
+            except Exception as e:
+                # Another instance may have claimed it; better to miss a
+                # slot than to run it twice.
+                logger.error(f"Could not claim run of '{name}' for {slot.isoformat()}, skipping it: {e}")
+                claimed = None
+
+            if claimed:
+                job.last_run = slot
+                self._start_job(job)
+            elif claimed is not None:
+                logger.info(f"Skipping '{name}' for {slot.isoformat()}: already ran")
+
+            if when == slot:
+                next_slot = job.cron.next_after(slot)
+                self._push(job, next_slot, next_slot)
+
+    def _start_job(self, job: ScheduledJob):
+        if job.task and not job.task.done():
+            logger.warning(f"Job '{job.name}' is still running, skipping this run")
+            return
+        job.task = asyncio.create_task(self._run_job(job))
+
+    async def _run_job(self, job: ScheduledJob):
+        # Each run is its own task, so this only tags this run's log records.
+        correlation_id.set(f"job:{job.name}")
+        try:
+            await job.func()
+        except Exception as e:
+            logger.exception(f"Scheduled job '{job.name}' failed: {e}")
@@ -1,21 +1,270 @@
 from aiohttp import web
+import asyncio
+import hmac
 import logging
+import os
+
+from live_events import CLOSE
 
-logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+SSE_HEARTBEAT_SECONDS = 15
+# A stream whose socket hasn't accepted a write in this long is given up on.
+SSE_WRITE_TIMEOUT = 30
+
 async def health_check(request):
+    if request.app['health']['draining']:
+        # Fails the Fly health check so traffic moves to the new machine.
+        return web.Response(text="Shutting down", status=503)
     return web.Response(text="Bot is alive!", status=200)
 
-async def start_web_server(port=8080):
+def is_authorized(request, token):
+    supplied = request.headers.get('Authorization', '')
+    # As bytes: compare_digest rejects str with non-ASCII characters, and
+    # aiohttp keeps undecodable header bytes as surrogates.
+    return hmac.compare_digest(supplied.encode(errors='surrogateescape'), f"Bearer {token}".encode())
+
+async def export_shifts(request):
+    from exporter import CONTENT_TYPES, EXPORT_FORMATS, export_filename, parse_date_range, stream_export
+
+    token = os.getenv("EXPORT_API_TOKEN")
+    if not token:
+        raise web.HTTPNotFound(text="Shift export is disabled (EXPORT_API_TOKEN not set)")
+    if not is_authorized(request, token):
+        raise web.HTTPUnauthorized(text="Missing or invalid bearer token")
+
+    fmt = request.query.get('format', 'csv').lower()
+    if fmt not in EXPORT_FORMATS:
+        raise web.HTTPBadRequest(text=f"format must be one of: {', '.join(EXPORT_FORMATS)}")
+
+    try:
+        start, end = parse_date_range(request.query['start'], request.query['end'])
+    except KeyError:
+        raise web.HTTPBadRequest(text="start and end query parameters are required (YYYY-MM-DD)")
+    except ValueError as e:
+        raise web.HTTPBadRequest(text=f"Invalid date range: {e}")
+
+    response = web.StreamResponse(headers={
+        'Content-Type': CONTENT_TYPES[fmt],
+        'Content-Disposition': f'attachment; filename="{export_filename(start, end, fmt)}"',
+    })
+    if fmt == 'csv':
+        response.enable_compression()
+    await response.prepare(request)
+
+    async for chunk in stream_export(request.app['db'], start, end, fmt):
+        await response.write(chunk)
+
+    await response.write_eof()
+    return response
+
+def authorize_dashboard(request):
+    # The dashboard API is open unless DASHBOARD_API_TOKEN is set.
+    token = os.getenv("DASHBOARD_API_TOKEN")
+    if token and not is_authorized(request, token):
+        raise web.HTTPUnauthorized(text="Missing or invalid bearer token")
+
+def etag_matches(if_none_match, entry):
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == '*':
+        return True
+    # Either encoding's tag will do: the content behind them is the same.
+    tags = {tag.strip().removeprefix('W/') for tag in if_none_match.split(',')}
+    return entry.etag in tags or entry.gzip_etag in tags
+
+def accepts_gzip(accept_encoding):
+    # gzip is acceptable if listed, or covered by *, with a q-value above 0.
+    qualities = {}
+    for item in accept_encoding.lower().split(','):
+        coding, *params = [part.strip() for part in item.split(';')]
+        quality = 1.0
+        for param in params:
+            name, _, value = param.partition('=')
+            if name.strip() == 'q':
+                try:
+                    quality = float(value)
+                except ValueError:
+                    quality = 0.0
+        if coding:
+            qualities[coding] = quality
+    return qualities.get('gzip', qualities.get('x-gzip', qualities.get('*', 0.0))) > 0
+
+def cached_json_response(request, entry):
+    use_gzip = accepts_gzip(request.headers.get('Accept-Encoding', ''))
+    headers = {
+        'ETag': entry.gzip_etag if use_gzip else entry.etag,
+        'Cache-Control': 'no-cache',
+        'Vary': 'Accept-Encoding, Authorization',
+    }
+    if etag_matches(request.headers.get('If-None-Match'), entry):
+        return web.Response(status=304, headers=headers)
+    if use_gzip:
+        headers['Content-Encoding'] = 'gzip'
+        return web.Response(body=entry.gzipped, content_type='application/json', headers=headers)
+    return web.Response(body=entry.body, content_type='application/json', headers=headers)
+
+async def load_snapshot(request, name):
+    try:
+        return await request.app['api_cache'].get(name)
+    except Exception as e:
+        logger.error(f"Error loading {name} for the dashboard API: {e}")
+        raise web.HTTPServiceUnavailable(text="Data temporarily unavailable")
+
+async def api_active_shifts(request):
+    authorize_dashboard(request)
+    return cached_json_response(request, await load_snapshot(request, 'active'))
+
+async def api_totals(request):
+    authorize_dashboard(request)
+    return cached_json_response(request, await load_snapshot(request, 'totals'))
+
+async def api_warnings(request):
+    authorize_dashboard(request)
+    return cached_json_response(request, await load_snapshot(request, 'warnings'))
+
+async def api_leaderboard(request):
+    authorize_dashboard(request)
+    try:
+        limit = int(request.query.get('limit', '10'))
+    except ValueError:
+        raise web.HTTPBadRequest(text="limit must be a number")
+    if not 1 <= limit <= 100:
+        raise web.HTTPBadRequest(text="limit must be between 1 and 100")
+
+    totals = await load_snapshot(request, 'totals')
+    entry = request.app['api_cache'].derive(
+        f'leaderboard:{limit}', [totals],
+        lambda payload: {'leaderboard': payload['users'][:limit]},
+    )
+    return cached_json_response(request, entry)
+
+async def api_user(request):
+    authorize_dashboard(request)
+    user_id = request.match_info['user_id']
+    sources = [await load_snapshot(request, name) for name in ('totals', 'active', 'warnings')]
+
+    def build(totals, active, warnings):
+        total = next((row for row in totals['users'] if row['user_id'] == user_id), None)
+        shift = next((row for row in active['shifts'] if row['user_id'] == user_id), None)
+        warning = next((row for row in warnings['users'] if row['user_id'] == user_id), None)
+        if total is None and shift is None and warning is None:
+            return None
+        username = next(row['username'] for row in (shift, total, warning) if row is not None)
+        return {
+            'user_id': user_id,
+            'username': username,
+            'total_seconds': total['total_seconds'] if total else 0,
+            'clocked_in_since': shift['clock_in_time'] if shift else None,
+            'warning_count': warning['warning_count'] if warning else 0,
+        }
+
+    entry = request.app['api_cache'].derive(f'user:{user_id}', sources, build)
+    if entry.payload is None:
+        raise web.HTTPNotFound(text="Unknown user")
+    return cached_json_response(request, entry)
+
+async def api_event_stream(request):
+    authorize_dashboard(request)
+    bus = request.app['live_events']
+    try:
+        last_event_id = int(request.headers['Last-Event-ID'])
+    except (KeyError, ValueError):
+        last_event_id = None
+
+    subscription = bus.subscribe(last_event_id)
+    if subscription is None:
+        raise web.HTTPServiceUnavailable(text="Too many live event subscribers", headers={'Retry-After': '30'})
+
+    response = web.StreamResponse(headers={
+        'Content-Type': 'text/event-stream',
+        'Cache-Control': 'no-cache',
+        'X-Accel-Buffering': 'no',
+    })
+    try:
+        await response.prepare(request)
+        # Tells EventSource how long to wait before reconnecting after a drop.
+        await response.write(b"retry: 3000\n\n")
+        while True:
+            try:
+                frames = await subscription.next_frames(SSE_HEARTBEAT_SECONDS)
+            except asyncio.TimeoutError:
+                # Comment line: keeps idle connections open through proxies.
+                async with asyncio.timeout(SSE_WRITE_TIMEOUT):
+                    await response.write(b": keep-alive\n\n")
+                continue
+            closing = CLOSE in frames
+            if closing:
+                frames = frames[:frames.index(CLOSE)]
+            if frames:
+                async with asyncio.timeout(SSE_WRITE_TIMEOUT):
+                    await response.write(b"".join(frames))
+            if closing:
+                break
+    except ConnectionError:
+        pass
+    except TimeoutError:
+        # The client stopped reading; drop the connection rather than wait
+        # on it again to finish the response.
+        if request.transport is not None:
+            request.transport.abort()
+    finally:
+        bus.unsubscribe(subscription)
+    return response
+
+async def debug_memory(request):
+    token = os.getenv("DEBUG_API_TOKEN")
+    if not token:
+        raise web.HTTPNotFound(text="Memory report is disabled (DEBUG_API_TOKEN not set)")
+    if not is_authorized(request, token):
+        raise web.HTTPUnauthorized(text="Missing or invalid bearer token")
+    try:
+        top = int(request.query.get('top', '10'))
+    except ValueError:
+        raise web.HTTPBadRequest(text="top must be a number")
+
+    # Snapshotting walks every traced allocation; keep it off the event loop.
+    report = await asyncio.to_thread(request.app['memory'].report, max(0, min(top, 100)))
+    return web.json_response(report)
+
+def register_dashboard_api(app, api_cache, db):
+    # Served from api_cache: a poll only reaches Postgres after the bot has
+    # invalidated the snapshot it reads.
+    api_cache.register('active', lambda: {'shifts': db.get_active_users()})
+    api_cache.register('totals', lambda: {'users': db.get_leaderboard(None)})
+    api_cache.register('warnings', lambda: {'users': db.get_warning_counts()})
+    app['api_cache'] = api_cache
+    app.router.add_get('/api/shifts/active', api_active_shifts)
+    app.router.add_get('/api/leaderboard', api_leaderboard)
+    app.router.add_get('/api/totals', api_totals)
+    app.router.add_get('/api/users/{user_id}', api_user)
+    app.router.add_get('/api/warnings', api_warnings)
+
+def start_draining(runner):
+    # The app is frozen once started, so the flag lives in a mutable dict.
+    runner.app['health']['draining'] = True
+
+async def start_web_server(port=8080, db=None, api_cache=None, live_events=None, memory=None):
     app = web.Application()
+    app['db'] = db
+    app['health'] = {'draining': False}
     app.router.add_get('/', health_check)
     app.router.add_get('/health', health_check)
-    
+    if db is not None:
+        app.router.add_get('/export/shifts', export_shifts)
+        if api_cache is not None:
+            register_dashboard_api(app, api_cache, db)
+    if live_events is not None:
+        app['live_events'] = live_events
+        app.router.add_get('/api/events', api_event_stream)
+    if memory is not None:
+        app['memory'] = memory
+        app.router.add_get('/debug/memory', debug_memory)
+
     runner = web.AppRunner(app)
     await runner.setup()
     site = web.TCPSite(runner, '0.0.0.0', port)
     await site.start()
-    
+
     logger.info(f"Web server started on port {port} for UptimeRobot")
     return runner
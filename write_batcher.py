@@ -0,0 +1,72 @@
+import asyncio
+import contextvars
+from datetime import datetime
+from typing import List, Optional, Tuple
+
+
+class ShiftWriteBatcher:
+    """Group-commits clock in/out writes that arrive within a few milliseconds.
+
+    Each caller awaits its own future; the first write of a batch arms a
+    short timer, and everything queued by then is applied by
+    ``ShiftDatabase.apply_shift_batch`` in a single transaction. Only one
+    batch is in flight at a time, so writes are applied in arrival order.
+    """
+
+    def __init__(self, db, window: float = 0.005, max_batch: int = 200):
+        self.db = db
+        self.window = window
+        self.max_batch = max_batch
+        self._queue: List[tuple] = []
+        self._flush_task: Optional[asyncio.Task] = None
+        self._lock = asyncio.Lock()
+        self.stats = {'batches': 0, 'writes': 0, 'largest_batch': 0}
+
+    async def clock_in(self, user_id: str, username: str) -> bool:
+        return await self._submit(('clock_in', user_id, username, datetime.utcnow()))
+
+    async def clock_out(self, user_id: str) -> Optional[Tuple[int, int]]:
+        # (shift duration, user's new total seconds), or None if not clocked in.
+        return await self._submit(('clock_out', user_id, None, datetime.utcnow()))
+
+    async def _submit(self, op: tuple):
+        future = asyncio.get_running_loop().create_future()
+        self._queue.append((op, future, contextvars.copy_context()))
+        if self._flush_task is None or self._flush_task.done():
+            self._flush_task = asyncio.create_task(self._flush_after_window())
+        return await future
+
+    async def _flush_after_window(self):
+        await asyncio.sleep(self.window)
+        while self._queue:
+            # Run each batch in its first writer's context, so tracing and
+            # query counts charge the batch to one handler that waited on it
+            # rather than to whichever handler started this task.
+            await asyncio.create_task(self.flush(), context=self._queue[0][2])
+
+    async def drain(self):
+        """Wait until every write submitted so far has been applied."""
+        while self._flush_task is not None and not self._flush_task.done():
+            await asyncio.gather(self._flush_task, return_exceptions=True)
+
+    async def flush(self):
+        async with self._lock:
+            batch, self._queue = self._queue[:self.max_batch], self._queue[self.max_batch:]
+            if not batch:
+                return
+
+            ops = [op for op, _, _ in batch]
+            try:
+                results = await asyncio.to_thread(self.db.apply_shift_batch, ops)
+            except Exception as e:
+                for _, future, _ in batch:
+                    if not future.done():
+                        future.set_exception(e)
+                return
+
+            self.stats['batches'] += 1
+            self.stats['writes'] += len(batch)
+            self.stats['largest_batch'] = max(self.stats['largest_batch'], len(batch))
+            for (_, future, _), result in zip(batch, results):
+                if not future.done():
+                    future.set_result(result)